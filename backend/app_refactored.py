@@ -8,6 +8,11 @@ import os
 from flask import Flask
 from config import get_config
 from extensions import init_extensions
+from json_provider import FastJSONProvider
+from compression import init_compression
+from services.recommendation_engine import start_periodic_rebuild
+from services.permission_matrix import start_periodic_reload
+from services import cache_invalidation
 from routes.auth import auth_bp
 from routes.content import content_api_bp, content_page_bp
 from routes.ai import ai_bp
@@ -19,6 +24,9 @@ def create_app(config_name=None):
     """应用工厂函数"""
     app = Flask(__name__)
     
+    # 使用快速 JSON 序列化（UTF-8 输出，安装了 orjson 时使用 orjson）
+    app.json = FastJSONProvider(app)
+    
     # 配置应用
     if config_name:
         app.config.from_object(config_name)
@@ -31,6 +39,9 @@ def create_app(config_name=None):
     # 初始化扩展
     init_extensions(app)
     
+    # 启用响应压缩（gzip/brotli）
+    init_compression(app)
+    
     # 注册蓝图
     app.register_blueprint(auth_bp)
     app.register_blueprint(content_api_bp)
@@ -48,7 +59,21 @@ def create_app(config_name=None):
     # 创建数据库表
     with app.app_context():
         from extensions import db
+        from migrations import run_migrations
         db.create_all()
+        run_migrations(db.engine)
+    
+    # 定期批量重建学习路径推荐
+    if app.config.get('RECOMMENDATION_REBUILD_INTERVAL'):
+        start_periodic_rebuild(app, app.config['RECOMMENDATION_REBUILD_INTERVAL'])
+    
+    # 定期重新加载权限矩阵，使其他进程上的权限变化生效
+    if app.config.get('PERMISSION_MATRIX_RELOAD_INTERVAL'):
+        start_periodic_reload(app, app.config['PERMISSION_MATRIX_RELOAD_INTERVAL'])
+    
+    # 多进程部署时通过 Redis 向其他进程广播权限和模块内容缓存的失效
+    if app.config.get('CACHE_INVALIDATION_URL'):
+        cache_invalidation.start_listener(app.config['CACHE_INVALIDATION_URL'])
     
     return app
 
@@ -97,8 +122,8 @@ def init_sample_data():
         {'username': 'admin', 'nickname': '系统管理员', 'user_type': 'admin'},
         {'username': 'teacher1', 'nickname': '李老师', 'user_type': 'teacher'},
         {'username': 'teacher2', 'nickname': '王老师', 'user_type': 'teacher'},
-        {'username': 'student1', 'nickname': '张小明', 'user_type': 'student'},
-        {'username': 'student2', 'nickname': '王小红', 'user_type': 'student'}
+        {'username': 'student1', 'nickname': '张小明', 'user_type': 'student', 'grade': '初一', 'class_name': '初一(1)班'},
+        {'username': 'student2', 'nickname': '王小红', 'user_type': 'student', 'grade': '初一', 'class_name': '初一(2)班'}
     ]
     
     for user_data in sample_users:
@@ -5,16 +5,23 @@
 集成学员端学习模块和陪练端上课界面
 """
 
+# 协作式异步模式（SYNC_ASYNC_MODE=gevent/eventlet）需要在导入其他模块之前打补丁
+import async_support
+async_support.apply_async_mode()
+
 from flask import Flask, render_template, request
 from flask_socketio import SocketIO
 from flask_cors import CORS
 import logging
 from datetime import datetime
+from sqlalchemy import text
 
 # 导入现有模块
 from extensions import db
 from models import *
 from config import Config
+from json_provider import FastJSONProvider
+from compression import init_compression
 
 # 导入路由模块
 from routes.auth import auth_bp
@@ -22,11 +29,16 @@ from routes.admin import admin_bp
 from routes.teacher import teacher_bp
 from routes.student import student_bp
 from routes.ai import ai_bp
-from routes.content import content_bp
+from routes.content import content_api_bp, content_page_bp
 
 # 导入新的统一系统模块
 from routes.content_permission import content_permission_bp
 from services.sync_service import init_sync_service
+from services.sync_store import create_session_store
+from services.recommendation_engine import start_periodic_rebuild
+from services.permission_matrix import start_periodic_reload
+from services import cache_invalidation
+from migrations import run_migrations
 
 # 配置日志
 logging.basicConfig(
@@ -40,9 +52,18 @@ def create_unified_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # 设置数据库URI
+    app.config['SQLALCHEMY_DATABASE_URI'] = app.config['DATABASE_URL']
+    
+    # 使用快速 JSON 序列化（UTF-8 输出，安装了 orjson 时使用 orjson）
+    app.json = FastJSONProvider(app)
+    
     # 初始化扩展
     db.init_app(app)
     
+    # 启用响应压缩（gzip/brotli）
+    init_compression(app)
+    
     # 配置CORS，允许跨域请求
     CORS(app, resources={
         r"/api/*": {
@@ -57,17 +78,23 @@ def create_unified_app(config_class=Config):
         r"/socket.io/*": {"origins": "*"}
     })
     
-    # 初始化SocketIO
+    # 初始化SocketIO（配置了消息队列时，房间广播经消息队列转发到所有进程；
+    # 异步模式由 SYNC_ASYNC_MODE 决定，gevent/eventlet 下每个连接是一个协程而不是一个线程）
     socketio = SocketIO(
         app, 
         cors_allowed_origins="*",
-        async_mode='threading',
+        async_mode=async_support.active_mode(),
+        message_queue=app.config.get('SYNC_MESSAGE_QUEUE'),
         logger=True,
         engineio_logger=True
     )
     
-    # 初始化同步服务
-    sync_service = init_sync_service(socketio)
+    # 初始化同步服务（会话状态保存在共享存储中）
+    session_store = create_session_store(
+        app.config.get('SYNC_SESSION_STORE'),
+        delta_log_size=app.config.get('SYNC_DELTA_LOG_SIZE', 500)
+    )
+    sync_service = init_sync_service(socketio, session_store, app)
     logger.info("同步服务初始化完成")
     
     # 注册蓝图
@@ -76,7 +103,8 @@ def create_unified_app(config_class=Config):
     app.register_blueprint(teacher_bp)
     app.register_blueprint(student_bp)
     app.register_blueprint(ai_bp)
-    app.register_blueprint(content_bp)
+    app.register_blueprint(content_api_bp)
+    app.register_blueprint(content_page_bp)
     app.register_blueprint(content_permission_bp)  # 新增权限管理
     
     logger.info("所有路由蓝图注册完成")
@@ -87,12 +115,27 @@ def create_unified_app(config_class=Config):
             db.create_all()
             logger.info("数据库表创建完成")
             
+            # 为已有数据库补齐索引等结构变更
+            run_migrations(db.engine)
+            
             # 初始化默认数据
             init_default_data()
             
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
     
+    # 定期批量重建学习路径推荐
+    if app.config.get('RECOMMENDATION_REBUILD_INTERVAL'):
+        start_periodic_rebuild(app, app.config['RECOMMENDATION_REBUILD_INTERVAL'])
+    
+    # 定期重新加载权限矩阵，使其他进程上的权限变化生效
+    if app.config.get('PERMISSION_MATRIX_RELOAD_INTERVAL'):
+        start_periodic_reload(app, app.config['PERMISSION_MATRIX_RELOAD_INTERVAL'])
+    
+    # 多进程部署时通过 Redis 向其他进程广播权限和模块内容缓存的失效
+    if app.config.get('CACHE_INVALIDATION_URL'):
+        cache_invalidation.start_listener(app.config['CACHE_INVALIDATION_URL'])
+    
     # 添加统一系统的路由
     @app.route('/')
     def index():
@@ -109,7 +152,7 @@ def create_unified_app(config_class=Config):
         """系统状态检查"""
         try:
             # 检查数据库连接
-            db.session.execute('SELECT 1')
+            db.session.execute(text('SELECT 1'))
             db_status = 'connected'
         except:
             db_status = 'disconnected'
@@ -118,7 +161,7 @@ def create_unified_app(config_class=Config):
         sync_status = 'active' if sync_service else 'inactive'
         
         # 获取活跃会话数
-        active_sessions = len(sync_service.get_active_sessions()) if sync_service else 0
+        active_sessions = sync_service.count_active_sessions() if sync_service else 0
         
         return {
             'success': True,
@@ -128,7 +171,9 @@ def create_unified_app(config_class=Config):
                 'sync_service': sync_status,
                 'active_sessions': active_sessions,
                 'websocket': 'enabled'
-            }
+            },
+            # 会话生命周期、缓存和进程内存等同步服务指标
+            'sync': sync_service.get_metrics() if sync_service else None
         }
     
     @app.route('/api/unified/config')
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SocketIO 异步模式
+threading 模式下每个 WebSocket 连接占用一个系统线程，课堂连接多时内存和调度开销
+都很大；gevent/eventlet 协作式模式下每个连接只是一个协程，单进程可以保持数千个空闲连接。
+
+通过环境变量 SYNC_ASYNC_MODE 选择（threading / gevent / eventlet，默认 threading），
+协作式模式需要在导入其他模块之前打猴子补丁，因此由入口模块最先调用 apply_async_mode()；
+对应的库未安装时退回 threading。
+
+协作式模式下数据库驱动（sqlite3、psycopg2、PyMySQL 的部分操作）仍会阻塞整个事件循环，
+事件处理器中的数据库访问通过 run_blocking() 放到线程池执行
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_ASYNC_MODES = ('threading', 'gevent', 'eventlet')
+
+# 实际生效的模式
+_active_mode = 'threading'
+
+def apply_async_mode(mode: str = None) -> str:
+    """按配置打猴子补丁，返回实际生效的模式（必须在导入 Flask、数据库驱动等模块之前调用）"""
+    global _active_mode
+    mode = (mode or os.getenv('SYNC_ASYNC_MODE', 'threading')).lower()
+    if mode not in SUPPORTED_ASYNC_MODES:
+        logger.warning(f"不支持的异步模式 {mode}，使用 threading")
+        mode = 'threading'
+
+    try:
+        if mode == 'gevent':
+            from gevent import monkey
+            monkey.patch_all()
+        elif mode == 'eventlet':
+            import eventlet
+            eventlet.monkey_patch()
+    except ImportError:
+        logger.warning(f"未安装 {mode}，使用 threading")
+        mode = 'threading'
+
+    _active_mode = mode
+    return mode
+
+def active_mode() -> str:
+    """当前生效的异步模式，作为 SocketIO 的 async_mode"""
+    return _active_mode
+
+def is_cooperative() -> bool:
+    return _active_mode != 'threading'
+
+def run_blocking(fn, *args):
+    """在不阻塞事件循环的情况下执行阻塞操作（如数据库访问）并等待结果
+
+    threading 模式下直接调用；协作式模式下放到系统线程池，当前协程让出直到完成
+    """
+    if _active_mode == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args)
+    if _active_mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(fn, *args)
+    return fn(*args)
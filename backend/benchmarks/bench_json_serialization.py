@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 序列化基准测试
+对比 Flask 默认序列化（ensure_ascii、sort_keys）与 FastJSONProvider
+在学习模块列表、阅读文章列表和课程预约列表上的耗时和响应体积
+
+用法:
+    python benchmarks/bench_json_serialization.py --repeat 200
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from json_provider import FastJSONProvider, orjson
+from services.module_catalog import MAIN_MODULE_IDS, MODULE_CATEGORIES
+
+ARTICLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'articles')
+BASE_TIME = datetime(2025, 1, 1, 8, 0)
+
+def _module_payload():
+    """学习模块列表（与 /api/study-modules 结构相同）"""
+    modules = [
+        {
+            'id': module_id,
+            'title': f'{module_id} 专项训练',
+            'text': f'{module_id} 专项训练',
+            'description': '围绕课文中的字词、语法和阅读方法进行系统训练，配合例题讲解和课后练习',
+            'icon': '📚',
+            'category': MODULE_CATEGORIES[index % 3],
+            'difficulty': index % 3 + 1
+        }
+        for index, module_id in enumerate(MAIN_MODULE_IDS)
+    ]
+    by_category = {category: [m for m in modules if m['category'] == category] for category in MODULE_CATEGORIES}
+    return {'allModules': modules, 'byCategory': by_category, 'mainModules': modules}
+
+def _article_payload(count):
+    """阅读文章列表（与 /api/reading-articles 结构相同）"""
+    sources = []
+    for path in sorted(glob.glob(os.path.join(ARTICLES_DIR, 'article_*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            sources.append(json.load(f))
+    if not sources:
+        sources = [{'title': '春', 'author': '朱自清', 'content': '盼望着，盼望着，东风来了，春天的脚步近了。' * 40}]
+
+    articles = []
+    for index in range(count):
+        data = sources[index % len(sources)]
+        articles.append({
+            'id': index + 1,
+            'title': data.get('title', '未命名文章'),
+            'author': data.get('author', '未知作者'),
+            'content': data.get('content', ''),
+            'category': data.get('category', 'literature'),
+            'difficulty': data.get('difficulty', 1),
+            'word_count': data.get('word_count', 0),
+            'reading_time': data.get('reading_time', 5),
+            'tags': data.get('tags', []),
+            'questions': data.get('questions', []),
+            'created_at': data.get('created_at', ''),
+            'status': data.get('status', 'active')
+        })
+    return articles
+
+def _booking_payload(count):
+    """课程预约列表（与 /api/admin/course-bookings 结构相同）"""
+    bookings = []
+    for index in range(count):
+        scheduled = BASE_TIME + timedelta(hours=index)
+        bookings.append({
+            'id': index + 1,
+            'course_title': '小学五年级阅读方法课',
+            'course_type': '1对1辅导',
+            'subject': '阅读理解专项',
+            'scheduled_time': scheduled.isoformat(),
+            'duration_minutes': 60,
+            'status': 'scheduled',
+            'user_id': 1000 + index % 300,
+            'user_name': '张小明',
+            'teacher_id': 10 + index % 20,
+            'teacher_name': '李老师',
+            'notes': '重点复习记叙文的六要素和中心思想概括',
+            'created_at': (scheduled - timedelta(days=3)).isoformat()
+        })
+    return {
+        'success': True,
+        'bookings': bookings,
+        'pagination': {'limit': count, 'has_more': True, 'next_cursor': 'WyIyMDI1LTAxLTAxVDA4OjAwOjAwIiwxXQ'}
+    }
+
+def _measure(serialize, payload, repeat):
+    """返回 (平均耗时毫秒, 字节数)"""
+    body = serialize(payload)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        serialize(payload)
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    return elapsed, len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON 序列化基准测试')
+    parser.add_argument('--repeat', type=int, default=200, help='每项重复次数')
+    parser.add_argument('--articles', type=int, default=50, help='文章列表条数')
+    parser.add_argument('--bookings', type=int, default=200, help='预约列表条数')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+
+    serializers = [
+        ('Flask默认', lambda obj: default_provider.dumps(obj, separators=(',', ':')).encode('utf-8')),
+        ('快速(' + fast_provider.backend + ')', fast_provider.dumps_bytes),
+    ]
+    payloads = [
+        ('学习模块列表', _module_payload()),
+        (f'文章列表x{args.articles}', _article_payload(args.articles)),
+        (f'预约列表x{args.bookings}', _booking_payload(args.bookings)),
+    ]
+
+    if not orjson:
+        print('未安装 orjson，快速序列化使用标准库 json（仅输出 UTF-8）')
+
+    print(f"{'数据':<16}{'序列化':<14}{'耗时(ms)':>10}{'字节数':>12}{'体积比':>8}{'加速比':>8}")
+    for name, payload in payloads:
+        baseline = None
+        for label, serialize in serializers:
+            elapsed, size = _measure(serialize, payload, args.repeat)
+            if baseline is None:
+                baseline = (elapsed, size)
+            print(f"{name:<16}{label:<14}{elapsed:>10.3f}{size:>12}"
+                  f"{size / baseline[1]:>8.2f}{baseline[0] / elapsed:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列表查询索引基准测试
+在临时 SQLite 数据库中灌入大量课程预约/课程/权限/内容数据，
+分别在没有索引和执行迁移 001 之后测量各列表查询的耗时
+
+用法:
+    python benchmarks/bench_listing_indexes.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from extensions import db
+from models import Course, CourseBooking, StudyContent, UserModulePermission
+from migrations import m001_query_indexes
+
+TEACHER_COUNT = 200
+STUDENT_COUNT = 20000
+MODULE_COUNT = 16
+BATCH_SIZE = 50000
+BASE_TIME = datetime(2025, 1, 1, 8, 0)
+
+# 基准查询: (名称, SQL, 参数)
+QUERIES = [
+    ('老师一周预约',
+     'SELECT * FROM course_bookings WHERE teacher_id = :teacher_id '
+     'AND scheduled_time >= :start AND scheduled_time < :end ORDER BY scheduled_time',
+     {'teacher_id': 7, 'start': BASE_TIME + timedelta(days=70), 'end': BASE_TIME + timedelta(days=77)}),
+    ('学生预约列表',
+     'SELECT * FROM course_bookings WHERE user_id = :user_id ORDER BY scheduled_time',
+     {'user_id': TEACHER_COUNT + 42}),
+    ('进行中预约计数',
+     "SELECT COUNT(*) FROM course_bookings WHERE status = 'active'",
+     {}),
+    ('学生进行中课程',
+     "SELECT * FROM courses WHERE student_id = :student_id AND status = 'ACTIVE'",
+     {'student_id': TEACHER_COUNT + 42}),
+    ('老师当日课程',
+     'SELECT * FROM courses WHERE teacher_id = :teacher_id AND scheduled_date = :day',
+     {'teacher_id': 7, 'day': (BASE_TIME + timedelta(days=70)).date()}),
+    ('权限检查',
+     'SELECT id FROM user_module_permissions WHERE user_id = :user_id AND module_id = :module_id',
+     {'user_id': TEACHER_COUNT + 42, 'module_id': 'module-3'}),
+    ('模块内容列表',
+     'SELECT * FROM study_contents WHERE module_id = :module_id AND is_active = 1 ORDER BY order_index',
+     {'module_id': 'module-3'}),
+]
+
+def _seed(engine, rows):
+    """灌入测试数据"""
+    rng = random.Random(20250101)
+    now = datetime.utcnow()
+    statuses = ['scheduled'] * 6 + ['completed'] * 3 + ['active', 'cancelled']
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            'INSERT INTO users (id, username, nickname, user_type, is_active, created_at, updated_at) '
+            'VALUES (:id, :username, :nickname, :user_type, 1, :now, :now)'
+        ), [
+            {'id': i, 'username': f'user{i}', 'nickname': f'用户{i}',
+             'user_type': 'teacher' if i <= TEACHER_COUNT else 'student', 'now': now}
+            for i in range(1, TEACHER_COUNT + STUDENT_COUNT + 1)
+        ])
+        conn.execute(text(
+            'INSERT INTO study_modules (module_id, title, category, difficulty, is_active, created_at, updated_at) '
+            "VALUES (:module_id, :title, 'reading', 1, 1, :now, :now)"
+        ), [{'module_id': f'module-{i}', 'title': f'模块{i}', 'now': now} for i in range(MODULE_COUNT)])
+
+    def insert_batches(sql, make_row, count):
+        for offset in range(0, count, BATCH_SIZE):
+            size = min(BATCH_SIZE, count - offset)
+            with engine.begin() as conn:
+                conn.execute(text(sql), [make_row(offset + i) for i in range(size)])
+
+    def booking_row(i):
+        return {
+            'user_id': rng.randint(TEACHER_COUNT + 1, TEACHER_COUNT + STUDENT_COUNT),
+            'teacher_id': rng.randint(1, TEACHER_COUNT),
+            'scheduled_time': BASE_TIME + timedelta(hours=rng.randint(0, 24 * 365)),
+            'status': rng.choice(statuses),
+            'now': now
+        }
+
+    insert_batches(
+        'INSERT INTO course_bookings (user_id, teacher_id, course_title, course_type, subject, '
+        'scheduled_time, duration_minutes, status, created_at, updated_at) '
+        "VALUES (:user_id, :teacher_id, '阅读课', '1对1辅导', '阅读', :scheduled_time, 60, :status, :now, :now)",
+        booking_row, rows
+    )
+
+    def course_row(i):
+        return {
+            'student_id': rng.randint(TEACHER_COUNT + 1, TEACHER_COUNT + STUDENT_COUNT),
+            'teacher_id': rng.randint(1, TEACHER_COUNT),
+            'scheduled_date': (BASE_TIME + timedelta(days=rng.randint(0, 365))).date(),
+            'scheduled_time': BASE_TIME.strftime('%H:%M:%S.%f'),
+            'status': rng.choice(['SCHEDULED', 'ACTIVE', 'COMPLETED', 'CANCELLED']),
+            'now': now
+        }
+
+    insert_batches(
+        'INSERT INTO courses (title, course_type, student_id, teacher_id, scheduled_date, scheduled_time, '
+        'duration_minutes, status, created_at, updated_at) '
+        "VALUES ('阅读课', '阅读训练', :student_id, :teacher_id, :scheduled_date, :scheduled_time, 60, :status, :now, :now)",
+        course_row, rows
+    )
+
+    # 每个学生最多拥有全部模块，权限数受限于 学生数 × 模块数
+    permission_rows = min(rows, STUDENT_COUNT * MODULE_COUNT)
+    insert_batches(
+        'INSERT INTO user_module_permissions (user_id, module_id, granted_by, granted_at) '
+        'VALUES (:user_id, :module_id, 1, :now)',
+        lambda i: {'user_id': TEACHER_COUNT + 1 + i // MODULE_COUNT,
+                   'module_id': f'module-{i % MODULE_COUNT}', 'now': now},
+        permission_rows
+    )
+
+    insert_batches(
+        'INSERT INTO study_contents (module_id, content_type, title, content, order_index, is_active, created_at) '
+        "VALUES (:module_id, 'text', '练习', '内容', :order_index, :is_active, :now)",
+        lambda i: {'module_id': f'module-{i % MODULE_COUNT}', 'order_index': i // MODULE_COUNT,
+                   'is_active': rng.random() < 0.9, 'now': now},
+        rows
+    )
+
+def _measure(engine, repeat):
+    """测量每个查询的平均耗时（毫秒）"""
+    results = {}
+    with engine.connect() as conn:
+        for name, sql, params in QUERIES:
+            conn.execute(text(sql), params).fetchall()  # 预热
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(text(sql), params).fetchall()
+            results[name] = (time.perf_counter() - start) * 1000 / repeat
+    return results
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='列表查询索引基准测试')
+    parser.add_argument('--rows', type=int, default=1000000, help='每张大表灌入的行数')
+    parser.add_argument('--repeat', type=int, default=5, help='每个查询重复次数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        db.metadata.create_all(engine)
+
+        # 删除模型中声明的索引，模拟迁移前的数据库
+        with engine.begin() as conn:
+            for model in (CourseBooking, Course, StudyContent, UserModulePermission):
+                for index in model.__table__.indexes:
+                    index.drop(bind=conn, checkfirst=True)
+
+        print(f"灌入测试数据: 每张表 {args.rows} 行 ...")
+        start = time.perf_counter()
+        _seed(engine, args.rows)
+        print(f"灌入完成，用时 {time.perf_counter() - start:.1f}s")
+
+        before = _measure(engine, args.repeat)
+
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            m001_query_indexes.upgrade(conn)
+            conn.execute(text('ANALYZE'))
+        print(f"迁移 001 建索引用时 {time.perf_counter() - start:.1f}s")
+
+        after = _measure(engine, args.repeat)
+        engine.dispose()
+
+    print()
+    print(f"{'查询':<14}{'迁移前(ms)':>14}{'迁移后(ms)':>14}{'加速比':>10}")
+    for name, _, _ in QUERIES:
+        speedup = before[name] / after[name] if after[name] else float('inf')
+        print(f"{name:<14}{before[name]:>14.3f}{after[name]:>14.3f}{speedup:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
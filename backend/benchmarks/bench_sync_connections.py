@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时同步连接压测
+分别以不同的 SocketIO 异步模式启动统一应用（临时 SQLite 数据库），
+用 WebSocket 客户端建立大量空闲的课堂连接，测量服务器进程的内存、线程数，
+以及保持这些连接时 HTTP 接口的响应延迟
+
+需要安装 aiohttp（客户端）以及要测试的异步库（如 gevent）
+
+用法:
+    python benchmarks/bench_sync_connections.py --connections 5000 --modes threading gevent
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# 压测用的学生数，连接按顺序轮流使用（同一学生的多个连接相当于多个标签页）
+STUDENT_COUNT = 200
+# 每批同时发起的连接数
+CONNECT_BATCH = 200
+
+def _serve(port: int):
+    """子进程：启动统一应用（异步模式和数据库由环境变量指定）"""
+    from app_unified import create_unified_app
+    from extensions import db
+    from models import User
+    import async_support
+
+    app, socketio = create_unified_app()
+    with app.app_context():
+        existing = {username for (username,) in db.session.query(User.username)}
+        db.session.add_all([
+            User(username=f'bench{i}', nickname=f'压测学生{i}', user_type='student', grade='初一')
+            for i in range(STUDENT_COUNT) if f'bench{i}' not in existing
+        ])
+        db.session.commit()
+
+    options = {'allow_unsafe_werkzeug': True} if async_support.active_mode() == 'threading' else {}
+    socketio.run(app, host='127.0.0.1', port=port, debug=False, use_reloader=False, log_output=False, **options)
+
+def _process_status(pid: int) -> dict:
+    """服务器进程的常驻内存（MB）和线程数"""
+    status = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key == 'VmRSS':
+                status['rss_mb'] = int(value.split()[0]) / 1024
+            elif key == 'Threads':
+                status['threads'] = int(value)
+    return status
+
+async def _load(url: str, student_ids, connections: int, idle: float, pid: int) -> dict:
+    """建立空闲连接并测量"""
+    import asyncio
+    import aiohttp
+    import socketio
+
+    async def connect(index):
+        client = socketio.AsyncClient(reconnection=False)
+        try:
+            await client.connect(url, transports=['websocket'], auth={
+                'userId': student_ids[index % len(student_ids)],
+                'sessionType': 'learning'
+            }, wait_timeout=30)
+            return client
+        except Exception:
+            return None
+
+    baseline = _process_status(pid)
+    clients = []
+    start = time.perf_counter()
+    for offset in range(0, connections, CONNECT_BATCH):
+        batch = await asyncio.gather(*(connect(i) for i in range(offset, min(offset + CONNECT_BATCH, connections))))
+        clients.extend(client for client in batch if client)
+    connect_seconds = time.perf_counter() - start
+
+    await asyncio.sleep(idle)
+    loaded = _process_status(pid)
+
+    # 保持连接时的接口延迟
+    latencies = []
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True)) as session:
+        for _ in range(20):
+            request_start = time.perf_counter()
+            async with session.get(f'{url}/api/system/status') as response:
+                await response.read()
+            latencies.append((time.perf_counter() - request_start) * 1000)
+
+    await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+
+    connected = len(clients)
+    return {
+        'connected': connected,
+        'connect_seconds': connect_seconds,
+        'rss_mb': loaded['rss_mb'],
+        'kb_per_connection': (loaded['rss_mb'] - baseline['rss_mb']) * 1024 / connected if connected else 0,
+        'threads': loaded['threads'],
+        'latency_ms': sorted(latencies)[len(latencies) // 2]
+    }
+
+def _run_mode(mode: str, connections: int, idle: float, port: int) -> dict:
+    """以指定异步模式启动服务器并压测"""
+    import asyncio
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'bench.db')
+        env = {
+            **os.environ,
+            'SYNC_ASYNC_MODE': mode,
+            'DATABASE_URL': f'sqlite:///{db_path}',
+            'RECOMMENDATION_REBUILD_INTERVAL': '0',
+            'PERMISSION_MATRIX_RELOAD_INTERVAL': '0'
+        }
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port)],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            url = f'http://127.0.0.1:{port}'
+            _wait_ready(url, server)
+            with sqlite3.connect(db_path) as conn:
+                student_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE username LIKE 'bench%'")]
+            return asyncio.run(_load(url, student_ids, connections, idle, server.pid))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+def _wait_ready(url: str, server, timeout: float = 60):
+    """等待服务器可以响应请求"""
+    import urllib.request
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('服务器启动失败')
+        try:
+            urllib.request.urlopen(f'{url}/api/system/status', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError('等待服务器启动超时')
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='实时同步连接压测')
+    parser.add_argument('--connections', type=int, default=5000, help='空闲连接数')
+    parser.add_argument('--modes', nargs='+', default=['threading', 'gevent'], help='要比较的异步模式')
+    parser.add_argument('--idle', type=float, default=5, help='建立连接后保持空闲的秒数')
+    parser.add_argument('--port', type=int, default=5055, help='服务器端口')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _serve(args.port)
+        return
+
+    results = {}
+    for mode in args.modes:
+        print(f"压测 {mode} 模式: {args.connections} 个连接 ...")
+        results[mode] = _run_mode(mode, args.connections, args.idle, args.port)
+
+    print()
+    print(f"{'模式':<12}{'连接数':>8}{'建立用时(s)':>14}{'内存(MB)':>12}{'每连接(KB)':>14}{'线程数':>8}{'接口延迟(ms)':>15}")
+    for mode, result in results.items():
+        print(f"{mode:<12}{result['connected']:>8}{result['connect_seconds']:>14.1f}{result['rss_mb']:>12.1f}"
+              f"{result['kb_per_connection']:>14.1f}{result['threads']:>8}{result['latency_ms']:>15.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应压缩模块
+根据 Accept-Encoding 协商 brotli（已安装 brotli 时）或 gzip 压缩响应。
+小于阈值的响应不压缩；可缓存的响应（带 compression_cache_key）
+按最高压缩级别压缩一次后缓存，之后直接复用
+"""
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Optional
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 需要压缩的响应类型
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript'
+}
+
+# 预压缩缓存使用的压缩级别（只压缩一次，用最高级别）
+CACHED_GZIP_LEVEL = 9
+CACHED_BROTLI_QUALITY = 11
+
+def _compress(body: bytes, encoding: str, level: int) -> bytes:
+    """按指定编码压缩"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    # mtime=0 保证相同内容压缩结果相同
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+class PrecompressedCache:
+    """预压缩结果缓存，按 (缓存键, 编码) 保存，超过容量时淘汰最久未使用的"""
+
+    def __init__(self, max_size: int = 256):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self.max_size = max_size
+
+    def get(self, key: str, encoding: str, body: bytes) -> bytes:
+        """获取压缩结果，未缓存时压缩并缓存"""
+        cache_key = (key, encoding)
+        with self._lock:
+            compressed = self._entries.get(cache_key)
+            if compressed is not None:
+                self._entries.move_to_end(cache_key)
+                return compressed
+
+        level = CACHED_BROTLI_QUALITY if encoding == 'br' else CACHED_GZIP_LEVEL
+        compressed = _compress(body, encoding, level)
+
+        with self._lock:
+            self._entries[cache_key] = compressed
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return compressed
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+# 全局预压缩缓存实例
+precompressed_cache = PrecompressedCache()
+
+def negotiate_encoding() -> Optional[str]:
+    """根据请求的 Accept-Encoding 选择压缩编码，同等权重时优先 brotli"""
+    candidates = ('br', 'gzip') if brotli else ('gzip',)
+    best, best_quality = None, 0
+    for encoding in candidates:
+        quality = request.accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def _is_compressible(response) -> bool:
+    """判断响应是否适合压缩"""
+    if not 200 <= response.status_code < 300 or response.status_code in (204, 206):
+        return False
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if 'Content-Encoding' in response.headers or 'Content-Range' in response.headers:
+        return False
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return False
+    cache_control = response.headers.get('Cache-Control', '')
+    return 'no-transform' not in cache_control
+
+def compress_response(response):
+    """after_request 钩子：压缩响应"""
+    if not _is_compressible(response):
+        return response
+
+    body = response.get_data()
+    if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    # 同一 URL 的响应体会随 Accept-Encoding 变化
+    response.vary.add('Accept-Encoding')
+
+    encoding = negotiate_encoding()
+    if not encoding:
+        return response
+
+    cache_key = getattr(response, 'compression_cache_key', None)
+    if cache_key:
+        compressed = precompressed_cache.get(cache_key, encoding, body)
+    else:
+        config_key = 'COMPRESS_BROTLI_QUALITY' if encoding == 'br' else 'COMPRESS_LEVEL'
+        level = current_app.config[config_key]
+        compressed = _compress(body, encoding, level)
+
+    if len(compressed) >= len(body):
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+
+    # 压缩后的字节与原始内容不同，强 ETag 改为弱 ETag（If-None-Match 按弱比较仍可命中）
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+def init_compression(app):
+    """在应用上启用响应压缩"""
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 5)
+    app.after_request(compress_response)
@@ -26,6 +26,47 @@ class Config:
     CORS_ORIGINS = ["*"]
     CORS_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
     CORS_ALLOW_HEADERS = ["Content-Type", "Authorization"]
+    
+    # 响应压缩配置（小于 COMPRESS_MIN_SIZE 字节的响应不压缩）
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+    
+    # 学习路径推荐批量重建间隔（秒），0 表示不启动后台重建
+    RECOMMENDATION_REBUILD_INTERVAL = int(os.getenv('RECOMMENDATION_REBUILD_INTERVAL', 3600))
+    # 权限矩阵后台整体重新加载间隔（秒），0 表示不启动后台加载
+    PERMISSION_MATRIX_RELOAD_INTERVAL = int(os.getenv('PERMISSION_MATRIX_RELOAD_INTERVAL', 60))
+    
+    # 实时同步：多进程部署时配置消息队列（如 redis://localhost:6379/0）转发房间广播，
+    # 会话存储使用同一个 Redis 共享课堂状态；未配置时使用进程内存储（单进程）
+    SYNC_MESSAGE_QUEUE = os.getenv('SYNC_MESSAGE_QUEUE')
+    SYNC_SESSION_STORE = os.getenv('SYNC_SESSION_STORE', SYNC_MESSAGE_QUEUE or 'memory://')
+    # 跨进程缓存失效（权限、模块内容）使用的 Redis，默认与消息队列相同，未配置时只在本进程失效
+    CACHE_INVALIDATION_URL = os.getenv('CACHE_INVALIDATION_URL', SYNC_MESSAGE_QUEUE)
+    # 每个会话保留的增量条数，断线重连时错过更多增量则改发完整快照
+    SYNC_DELTA_LOG_SIZE = int(os.getenv('SYNC_DELTA_LOG_SIZE', 500))
+    # 会话快照中累积的共享文本更新达到此数后压缩为一条完整状态
+    SYNC_TEXT_COMPACT_UPDATES = int(os.getenv('SYNC_TEXT_COMPACT_UPDATES', 200))
+    # 允许客户端协商紧凑编码（MessagePack + zlib 预设字典，需要安装 msgpack），0 为只用 JSON
+    SYNC_COMPACT_ENCODING = bool(int(os.getenv('SYNC_COMPACT_ENCODING', 1)))
+    # 进度、互动等可合并事件的批量广播间隔（毫秒），0 为逐条立即广播
+    SYNC_BATCH_INTERVAL_MS = int(os.getenv('SYNC_BATCH_INTERVAL_MS', 50))
+    # 每个连接上行事件的限流：每秒 SYNC_RATE_LIMIT 条，最多积累 SYNC_RATE_BURST 条，0 为不限流
+    SYNC_RATE_LIMIT = float(os.getenv('SYNC_RATE_LIMIT', 20))
+    SYNC_RATE_BURST = int(os.getenv('SYNC_RATE_BURST', 40))
+    # 会话生命周期：每隔 SYNC_HEARTBEAT_INTERVAL 秒刷新本进程参与者的心跳并清理过期参与者，
+    # 超过 SYNC_PRESENCE_TIMEOUT 秒没有心跳的参与者（如所在进程已崩溃）视为离开，0 为不清理
+    SYNC_HEARTBEAT_INTERVAL = float(os.getenv('SYNC_HEARTBEAT_INTERVAL', 30))
+    SYNC_PRESENCE_TIMEOUT = float(os.getenv('SYNC_PRESENCE_TIMEOUT', 90))
+    # 每个会话的参与者上限，会话已满时拒绝新用户连接，0 为不限制
+    SYNC_MAX_PARTICIPANTS = int(os.getenv('SYNC_MAX_PARTICIPANTS', 200))
+    
+    # 实时标注批量写入：每隔 ANNOTATION_FLUSH_INTERVAL_MS 毫秒或累计 ANNOTATION_FLUSH_BATCH 条写入一次
+    ANNOTATION_FLUSH_INTERVAL_MS = int(os.getenv('ANNOTATION_FLUSH_INTERVAL_MS', 200))
+    ANNOTATION_FLUSH_BATCH = int(os.getenv('ANNOTATION_FLUSH_BATCH', 100))
+    
+    # 实时学习进度写入间隔（秒），期间同一用户同一课程/模块的进度只写入最新一条
+    PROGRESS_FLUSH_INTERVAL = float(os.getenv('PROGRESS_FLUSH_INTERVAL', 5))
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
@@ -52,6 +93,11 @@ class TestingConfig(Config):
     TESTING = True
     DEBUG = True
     DATABASE_URL = 'sqlite:///:memory:'
+    RECOMMENDATION_REBUILD_INTERVAL = 0
+    PERMISSION_MATRIX_RELOAD_INTERVAL = 0
+    SYNC_MESSAGE_QUEUE = None
+    SYNC_SESSION_STORE = 'memory://'
+    CACHE_INVALIDATION_URL = None
 
 # 配置字典
 config = {
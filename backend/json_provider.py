@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 序列化模块
+安装了 orjson 时用它序列化响应，否则退回标准库 json。
+两种方式都直接输出 UTF-8，中文不再转义为 \\uXXXX（体积约为转义后的三分之一）
+"""
+import json
+from typing import Any
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson 选项：允许整数等非字符串键（与标准库一致）；
+# datetime/date 交给 default 处理，保持与 Flask 默认输出相同的格式
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+class FastJSONProvider(DefaultJSONProvider):
+    """快速 JSON 序列化
+
+    通过 app.json = FastJSONProvider(app) 安装，jsonify 和 responses 模块都会使用它
+    """
+
+    ensure_ascii = False
+    sort_keys = False
+
+    @property
+    def backend(self) -> str:
+        """当前使用的序列化库"""
+        return 'orjson' if orjson else 'json'
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        """序列化为紧凑的 UTF-8 字节串"""
+        if orjson:
+            return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
+        return json.dumps(
+            obj, default=self.default, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """序列化为字符串，带格式参数（如 indent）时使用标准库"""
+        if orjson and not kwargs:
+            return self.dumps_bytes(obj).decode('utf-8')
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        """jsonify 使用的响应构造，调试模式下保留缩进输出"""
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+def dumps_bytes(app, obj: Any) -> bytes:
+    """用应用的 JSON 设置序列化为 UTF-8 字节串"""
+    provider = app.json
+    if isinstance(provider, FastJSONProvider):
+        return provider.dumps_bytes(obj)
+    return provider.dumps(obj).encode('utf-8')
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移模块
+db.create_all() 只会创建缺失的表，不会给已有表补索引或字段，
+这里按顺序执行尚未应用的迁移，并记录到 schema_migrations 表中
+
+用法:
+    python -m migrations            # 对当前配置的数据库执行迁移
+"""
+import importlib
+import logging
+from datetime import datetime
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# 按顺序登记的迁移模块
+MIGRATIONS = [
+    'migrations.m001_query_indexes',
+    'migrations.m002_user_grade_class',
+    'migrations.m003_study_content_features',
+]
+
+def _ensure_version_table(connection):
+    """创建迁移版本记录表"""
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version VARCHAR(100) PRIMARY KEY, '
+        'applied_at TIMESTAMP NOT NULL)'
+    ))
+
+def _applied_versions(connection):
+    """获取已应用的迁移版本"""
+    rows = connection.execute(text('SELECT version FROM schema_migrations')).fetchall()
+    return {row[0] for row in rows}
+
+def run_migrations(engine):
+    """执行所有未应用的迁移，返回本次应用的版本列表"""
+    applied = []
+    with engine.begin() as connection:
+        _ensure_version_table(connection)
+        done = _applied_versions(connection)
+    
+    for module_name in MIGRATIONS:
+        version = module_name.rsplit('.', 1)[-1]
+        if version in done:
+            continue
+        
+        migration = importlib.import_module(module_name)
+        # 每个迁移单独一个事务，失败时不会留下半完成的状态
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(
+                text('INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)'),
+                {'version': version, 'applied_at': datetime.utcnow()}
+            )
+        logger.info(f"数据库迁移已应用: {version} - {migration.DESCRIPTION}")
+        applied.append(version)
+    
+    return applied
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令行执行数据库迁移
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    """主函数"""
+    from app_refactored import create_app
+    from extensions import db
+    from migrations import run_migrations
+    
+    # create_app 内部已经会执行一次迁移，这里再执行一次用于输出结果
+    app = create_app()
+    with app.app_context():
+        applied = run_migrations(db.engine)
+    
+    if applied:
+        print(f"✅ 已应用迁移: {', '.join(applied)}")
+    else:
+        print("✅ 数据库已是最新版本")
+
+if __name__ == '__main__':
+    main()
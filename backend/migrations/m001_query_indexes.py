@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+迁移 001: 为高频查询添加复合索引
+- 课程预约按老师/学生 + 时间、按状态查询
+- 课程按学生 + 状态、按老师 + 日期查询
+- 学习内容按模块 + 是否启用 + 排序查询
+- 用户模块权限 (user_id, module_id) 唯一
+"""
+from sqlalchemy import text
+
+DESCRIPTION = '为课程预约、课程、学习内容和用户权限添加复合索引'
+
+def _remove_duplicate_permissions(connection):
+    """删除重复的权限记录，每个 (user_id, module_id) 只保留最早的一条"""
+    connection.execute(text(
+        'DELETE FROM user_module_permissions WHERE id NOT IN ('
+        'SELECT keep_id FROM ('
+        'SELECT MIN(id) AS keep_id FROM user_module_permissions '
+        'GROUP BY user_id, module_id) AS keep_rows)'
+    ))
+
+def upgrade(connection):
+    """执行迁移"""
+    from models import Course, CourseBooking, StudyContent, UserModulePermission
+    
+    # 建唯一索引之前先清理历史重复数据
+    _remove_duplicate_permissions(connection)
+    
+    for model in (CourseBooking, Course, StudyContent, UserModulePermission):
+        for index in model.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+迁移 002: 用户增加年级和班级字段
+用于按年级/班级批量授予或撤销权限模板
+"""
+from sqlalchemy import inspect, text
+
+DESCRIPTION = '用户表增加 grade、class_name 字段及索引'
+
+def upgrade(connection):
+    """执行迁移"""
+    from models import User
+    
+    existing = {column['name'] for column in inspect(connection).get_columns('users')}
+    for column in ('grade', 'class_name'):
+        if column not in existing:
+            column_type = User.__table__.c[column].type.compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE users ADD COLUMN {column} {column_type}'))
+    
+    for index in User.__table__.indexes:
+        index.create(bind=connection, checkfirst=True)
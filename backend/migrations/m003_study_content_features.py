@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+迁移 003: 学习内容增加难度、适用年级和知识点标签字段
+用于个性化内容选择
+"""
+from sqlalchemy import inspect, text
+
+DESCRIPTION = '学习内容表增加 difficulty、grade、tags 字段'
+
+def upgrade(connection):
+    """执行迁移"""
+    from models import StudyContent
+    
+    existing = {column['name'] for column in inspect(connection).get_columns('study_contents')}
+    for column in ('difficulty', 'grade', 'tags'):
+        if column not in existing:
+            column_type = StudyContent.__table__.c[column].type.compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE study_contents ADD COLUMN {column} {column_type}'))
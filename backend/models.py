@@ -17,11 +17,16 @@ class AnnotationType(Enum):
 class User(db.Model):
     """用户模型"""
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_grade_class', 'grade', 'class_name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     nickname = db.Column(db.String(100), nullable=False)
     user_type = db.Column(db.String(20), nullable=False, default='student')  # admin, teacher, student
+    grade = db.Column(db.String(20))  # 年级，如 初一
+    class_name = db.Column(db.String(50))  # 班级，如 初一(3)班
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -33,6 +38,10 @@ class User(db.Model):
 class Course(db.Model):
     """线下转线上课程模型"""
     __tablename__ = 'courses'
+    __table_args__ = (
+        db.Index('ix_courses_student_status', 'student_id', 'status'),
+        db.Index('ix_courses_teacher_date', 'teacher_id', 'scheduled_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -111,6 +120,30 @@ class CourseSession(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class LearningProgress(db.Model):
+    """学习进度模型（每个用户在每门课程/每个学习模块上保留最新的一条进度）"""
+    __tablename__ = 'learning_progress'
+    __table_args__ = (
+        # 同一用户对同一课程/模块只保留一条进度，批量写入时按此唯一索引更新
+        db.Index('uq_learning_progress_user_target', 'user_id', 'target_type', 'target_id', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    target_type = db.Column(db.String(20), nullable=False)  # course, module
+    target_id = db.Column(db.String(50), nullable=False)    # 课程ID或模块ID
+    
+    # 进度信息
+    percent = db.Column(db.Float, default=0)     # 完成百分比 0-100
+    position = db.Column(db.Integer)             # 阅读位置（如滚动位置、当前内容序号）
+    data = db.Column(db.JSON)                    # 客户端上报的完整进度
+    
+    # 时间戳
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # 关系
+    user = db.relationship('User', backref='learning_progress')
+
 class TrainingContent(db.Model):
     """训练内容模型"""
     __tablename__ = 'training_contents'
@@ -145,6 +178,9 @@ class StudyModule(db.Model):
 class StudyContent(db.Model):
     """学习内容"""
     __tablename__ = 'study_contents'
+    __table_args__ = (
+        db.Index('ix_study_contents_module_active_order', 'module_id', 'is_active', 'order_index'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     module_id = db.Column(db.String(50), db.ForeignKey('study_modules.module_id'), nullable=False)
@@ -152,6 +188,9 @@ class StudyContent(db.Model):
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     order_index = db.Column(db.Integer, default=0)
+    difficulty = db.Column(db.String(10))  # easy, medium, hard（为空时按模块难度）
+    grade = db.Column(db.String(20))  # 适用年级，如 初一
+    tags = db.Column(db.String(200))  # 知识点标签，逗号分隔，如 修辞,比喻
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -161,6 +200,10 @@ class StudyContent(db.Model):
 class UserModulePermission(db.Model):
     """用户模块权限模型"""
     __tablename__ = 'user_module_permissions'
+    __table_args__ = (
+        # 同一用户对同一模块只允许一条权限记录
+        db.Index('uq_user_module_permissions_user_module', 'user_id', 'module_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -173,9 +216,43 @@ class UserModulePermission(db.Model):
     module = db.relationship('StudyModule', backref='user_permissions')
     granter = db.relationship('User', foreign_keys=[granted_by], backref='granted_permissions')
 
+class PermissionTemplate(db.Model):
+    """权限模板模型（一组可以整体授予或撤销的模块，如“初一 基础包”）"""
+    __tablename__ = 'permission_templates'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    description = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 关系
+    modules = db.relationship('PermissionTemplateModule', backref='template', cascade='all, delete-orphan')
+    creator = db.relationship('User', backref='permission_templates')
+
+class PermissionTemplateModule(db.Model):
+    """权限模板包含的模块"""
+    __tablename__ = 'permission_template_modules'
+    __table_args__ = (
+        db.Index('uq_permission_template_modules_template_module', 'template_id', 'module_id', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    template_id = db.Column(db.Integer, db.ForeignKey('permission_templates.id'), nullable=False)
+    module_id = db.Column(db.String(50), db.ForeignKey('study_modules.module_id'), nullable=False)
+    
+    # 关系
+    module = db.relationship('StudyModule')
+
 class CourseBooking(db.Model):
     """课程预约模型"""
     __tablename__ = 'course_bookings'
+    __table_args__ = (
+        db.Index('ix_course_bookings_teacher_scheduled', 'teacher_id', 'scheduled_time'),
+        db.Index('ix_course_bookings_user_scheduled', 'user_id', 'scheduled_time'),
+        db.Index('ix_course_bookings_status', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -195,3 +272,47 @@ class CourseBooking(db.Model):
     # 关系
     user = db.relationship('User', foreign_keys=[user_id], backref='bookings')
     teacher = db.relationship('User', foreign_keys=[teacher_id], backref='teaching_bookings')
+
+class TeacherAvailability(db.Model):
+    """教师每周固定可预约时间"""
+    __tablename__ = 'teacher_availabilities'
+    __table_args__ = (
+        db.Index('ix_teacher_availabilities_teacher_weekday', 'teacher_id', 'weekday'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)  # 0=周一 ... 6=周日
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    slot_minutes = db.Column(db.Integer, default=60)  # 每个可预约时段的时长
+    is_active = db.Column(db.Boolean, default=True)
+    
+    # 时间戳
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 关系
+    teacher = db.relationship('User', backref='availabilities')
+
+class TeacherAvailabilityException(db.Model):
+    """教师可预约时间例外（请假或临时加课）"""
+    __tablename__ = 'teacher_availability_exceptions'
+    __table_args__ = (
+        db.Index('ix_teacher_availability_exceptions_teacher_date', 'teacher_id', 'date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    start_time = db.Column(db.Time)  # 为空表示全天
+    end_time = db.Column(db.Time)
+    is_available = db.Column(db.Boolean, default=False)  # False=该时间不可预约，True=额外开放
+    slot_minutes = db.Column(db.Integer, default=60)
+    reason = db.Column(db.String(200))
+    
+    # 时间戳
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # 关系
+    teacher = db.relationship('User', backref='availability_exceptions')
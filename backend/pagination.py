@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+游标分页模块
+按排序列的取值（而不是 OFFSET）定位下一页，翻页开销与页码无关
+"""
+import base64
+import json
+from datetime import date, datetime, time
+from flask import request
+from extensions import db
+
+# 默认每页条数和每页条数上限
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class PaginationError(ValueError):
+    """分页参数错误"""
+
+def encode_cursor(values) -> str:
+    """把排序列的取值编码为游标字符串"""
+    payload = [value.isoformat() if isinstance(value, (datetime, date, time)) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, columns):
+    """把游标字符串解码为排序列的取值"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        raise PaginationError('分页游标无效')
+
+    if not isinstance(payload, list) or len(payload) != len(columns):
+        raise PaginationError('分页游标无效')
+
+    values = []
+    for column, value in zip(columns, payload):
+        python_type = column.type.python_type
+        try:
+            if value is not None and python_type in (datetime, date, time):
+                value = python_type.fromisoformat(value)
+            elif value is not None:
+                value = python_type(value)
+        except (ValueError, TypeError):
+            raise PaginationError('分页游标无效')
+        values.append(value)
+
+    return values
+
+def _order_by(columns):
+    """排序表达式：可为空的列中 NULL 排在最前（不依赖数据库默认的 NULL 排序）"""
+    order = []
+    for column in columns:
+        if column.nullable:
+            order.append(db.case((column.is_(None), 0), else_=1))
+        order.append(column.asc())
+    return order
+
+def _after(columns, values):
+    """构造“排在游标之后”的条件: (a > x) OR (a = x AND b > y) ...
+
+    NULL 排在最前：游标值为 NULL 时其后是该列所有非空的行，否则只比较非空值
+    """
+    conditions = []
+    for position, column in enumerate(columns):
+        equal_prefix = [
+            columns[i].is_(None) if values[i] is None else columns[i] == values[i]
+            for i in range(position)
+        ]
+        value = values[position]
+        beyond = column.isnot(None) if value is None else column > value
+        conditions.append(db.and_(*equal_prefix, beyond))
+    return db.or_(*conditions)
+
+def keyset_paginate(query, columns):
+    """对查询进行游标分页
+
+    columns 为升序排序列（可以包含允许 NULL 的列），最后一列必须唯一（通常是主键）。
+    从请求参数读取 limit、cursor 和 include_total，
+    返回 (当前页数据, 分页信息)
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationError('每页条数格式错误')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    page_info = {'limit': limit}
+
+    # 总数只在请求时计算，避免每次翻页都做一次全量 COUNT
+    if request.args.get('include_total', '').lower() in ('1', 'true', 'yes'):
+        page_info['total'] = query.order_by(None).count()
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns)))
+
+    # 多取一条用于判断是否还有下一页
+    rows = query.order_by(*_order_by(columns)).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    page_info['has_more'] = has_more
+    page_info['next_cursor'] = None
+    if has_more:
+        last = items[-1]
+        page_info['next_cursor'] = encode_cursor([getattr(last, column.key) for column in columns])
+
+    return items, page_info
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应辅助模块
+构造 JSON 响应（使用应用的快速 JSON 序列化），并支持 ETag 条件请求
+"""
+import hashlib
+from typing import Any
+from flask import current_app, request
+from json_provider import dumps_bytes
+
+def to_json_bytes(payload: Any) -> bytes:
+    """序列化为 UTF-8 JSON 字节串，用于需要缓存序列化结果的场景"""
+    return dumps_bytes(current_app, payload)
+
+def make_etag(body: bytes) -> str:
+    """根据响应内容计算强 ETag"""
+    return hashlib.sha1(body).hexdigest()
+
+def json_response(payload: Any, status: int = 200):
+    """返回 JSON 响应"""
+    return current_app.response_class(to_json_bytes(payload), status=status, mimetype='application/json')
+
+def cached_json_response(body: bytes, etag: str = None):
+    """返回已序列化的 JSON
+
+    带 etag 时设置强 ETag，请求的 If-None-Match 匹配则返回 304。
+    客户端每次都需要重新验证，内容变化后立即拿到新版本
+    """
+    response = current_app.response_class(body, mimetype='application/json')
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        # 内容由 ETag 唯一确定，压缩结果可以按 ETag 缓存
+        response.compression_cache_key = etag
+        response = response.make_conditional(request)
+    return response
@@ -6,12 +6,19 @@
 """
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
 from extensions import db
 from models import User, CourseBooking, Course, CourseSession
+from services.booking_scheduler import get_booking_scheduler, CONFLICT_MESSAGES, MAX_BOOKING_DURATION
+from pagination import keyset_paginate, PaginationError
+from responses import json_response
 
 # 创建管理员蓝图
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
+# 单次批量创建的最大预约数
+MAX_BULK_BOOKINGS = 2000
+
 @admin_bp.route('/course-bookings', methods=['GET'])
 def get_all_course_bookings():
     """获取所有课程预约"""
@@ -39,14 +46,15 @@ def get_all_course_bookings():
             to_date_obj = datetime.fromisoformat(to_date)
             query = query.filter(CourseBooking.scheduled_time < to_date_obj)
         
-        # 按时间排序
-        bookings = query.order_by(CourseBooking.scheduled_time).all()
+        # 按 (时间, ID) 游标分页，学生和老师信息随预约一起加载
+        query = query.options(joinedload(CourseBooking.user), joinedload(CourseBooking.teacher))
+        bookings, page_info = keyset_paginate(query, [CourseBooking.scheduled_time, CourseBooking.id])
         
         # 格式化返回数据
         booking_list = []
         for booking in bookings:
-            student = User.query.get(booking.user_id)
-            teacher = User.query.get(booking.teacher_id)
+            student = booking.user
+            teacher = booking.teacher
             
             booking_data = {
                 'id': booking.id,
@@ -71,12 +79,18 @@ def get_all_course_bookings():
             }
             booking_list.append(booking_data)
         
-        return jsonify({
+        response = {
             'success': True,
             'bookings': booking_list,
-            'total': len(booking_list)
-        })
+            'pagination': page_info
+        }
+        if 'total' in page_info:
+            response['total'] = page_info['total']
+        
+        return json_response(response)
         
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'获取课程预约失败: {str(e)}'}), 500
 
@@ -105,48 +119,32 @@ def create_course_booking():
         if not teacher or teacher.user_type != 'teacher':
             return jsonify({'error': '老师不存在或用户类型错误'}), 400
         
-        # 检查时间冲突
         scheduled_time = datetime.fromisoformat(data['scheduled_time'])
         duration = data.get('duration_minutes', 60)
-        end_time = scheduled_time + timedelta(minutes=duration)
-        
-        # 检查学生时间冲突
-        student_conflict = CourseBooking.query.filter(
-            CourseBooking.user_id == data['student_id'],
-            CourseBooking.status.in_(['scheduled', 'active']),
-            CourseBooking.scheduled_time < end_time,
-            CourseBooking.scheduled_time + timedelta(minutes=CourseBooking.duration_minutes) > scheduled_time
-        ).first()
-        
-        if student_conflict:
-            return jsonify({'error': '学生在该时间段已有其他课程安排'}), 400
-        
-        # 检查老师时间冲突
-        teacher_conflict = CourseBooking.query.filter(
-            CourseBooking.teacher_id == data['teacher_id'],
-            CourseBooking.status.in_(['scheduled', 'active']),
-            CourseBooking.scheduled_time < end_time,
-            CourseBooking.scheduled_time + timedelta(minutes=CourseBooking.duration_minutes) > scheduled_time
-        ).first()
-        
-        if teacher_conflict:
-            return jsonify({'error': '老师在该时间段已有其他课程安排'}), 400
-        
-        # 创建课程预约
-        booking = CourseBooking(
-            user_id=data['student_id'],
-            teacher_id=data['teacher_id'],
-            course_title=data['course_title'],
-            course_type=data['course_type'],
-            subject=data['subject'],
-            scheduled_time=scheduled_time,
-            duration_minutes=duration,
-            description=data.get('description', ''),
-            status='scheduled'
-        )
-        
-        db.session.add(booking)
-        db.session.commit()
+        
+        # 锁定老师和学生后检查时间冲突，避免并发请求重复排课
+        scheduler = get_booking_scheduler()
+        with scheduler.reservation([teacher.id], [student.id], scheduled_time):
+            conflict = scheduler.find_conflict(teacher.id, student.id, scheduled_time, duration)
+            if conflict:
+                db.session.rollback()
+                return jsonify({'error': CONFLICT_MESSAGES[conflict['party']]}), 400
+            
+            # 创建课程预约
+            booking = CourseBooking(
+                user_id=data['student_id'],
+                teacher_id=data['teacher_id'],
+                course_title=data['course_title'],
+                course_type=data['course_type'],
+                subject=data['subject'],
+                scheduled_time=scheduled_time,
+                duration_minutes=duration,
+                description=data.get('description', ''),
+                status='scheduled'
+            )
+            
+            db.session.add(booking)
+            db.session.commit()
         
         return jsonify({
             'success': True,
@@ -172,44 +170,24 @@ def update_course_booking(booking_id):
         # 可更新的字段
         updatable_fields = ['course_title', 'course_type', 'subject', 'scheduled_time', 'duration_minutes', 'description', 'status']
         
-        for field in updatable_fields:
-            if field in data:
-                if field == 'scheduled_time':
-                    # 检查时间冲突
-                    new_time = datetime.fromisoformat(data[field])
-                    duration = data.get('duration_minutes', booking.duration_minutes)
-                    end_time = new_time + timedelta(minutes=duration)
-                    
-                    # 检查学生时间冲突
-                    student_conflict = CourseBooking.query.filter(
-                        CourseBooking.user_id == booking.user_id,
-                        CourseBooking.status.in_(['scheduled', 'active']),
-                        CourseBooking.scheduled_time < end_time,
-                        CourseBooking.scheduled_time + timedelta(minutes=CourseBooking.duration_minutes) > new_time,
-                        CourseBooking.id != booking_id
-                    ).first()
-                    
-                    if student_conflict:
-                        return jsonify({'error': '学生在该时间段已有其他课程安排'}), 400
-                    
-                    # 检查老师时间冲突
-                    teacher_conflict = CourseBooking.query.filter(
-                        CourseBooking.teacher_id == booking.teacher_id,
-                        CourseBooking.status.in_(['scheduled', 'active']),
-                        CourseBooking.scheduled_time < end_time,
-                        CourseBooking.scheduled_time + timedelta(minutes=CourseBooking.duration_minutes) > new_time,
-                        CourseBooking.id != booking_id
-                    ).first()
-                    
-                    if teacher_conflict:
-                        return jsonify({'error': '老师在该时间段已有其他课程安排'}), 400
-                    
-                    setattr(booking, field, new_time)
-                else:
-                    setattr(booking, field, data[field])
-        
-        booking.updated_at = datetime.utcnow()
-        db.session.commit()
+        if 'scheduled_time' in data or 'duration_minutes' in data:
+            # 修改上课时间或时长时，锁定老师和学生后检查时间冲突
+            new_time = datetime.fromisoformat(data['scheduled_time']) if 'scheduled_time' in data else booking.scheduled_time
+            duration = data.get('duration_minutes', booking.duration_minutes)
+            
+            scheduler = get_booking_scheduler()
+            with scheduler.reservation([booking.teacher_id], [booking.user_id], new_time):
+                conflict = scheduler.find_conflict(booking.teacher_id, booking.user_id, new_time, duration,
+                                                   exclude_id=booking_id)
+                if conflict:
+                    db.session.rollback()
+                    return jsonify({'error': CONFLICT_MESSAGES[conflict['party']]}), 400
+                
+                _apply_booking_updates(booking, data, updatable_fields, new_time)
+                db.session.commit()
+        else:
+            _apply_booking_updates(booking, data, updatable_fields)
+            db.session.commit()
         
         return jsonify({
             'success': True,
@@ -220,6 +198,185 @@ def update_course_booking(booking_id):
         db.session.rollback()
         return jsonify({'error': f'更新课程预约失败: {str(e)}'}), 500
 
+def _apply_booking_updates(booking, data, updatable_fields, new_time=None):
+    """把请求中的字段写入课程预约"""
+    for field in updatable_fields:
+        if field in data:
+            if field == 'scheduled_time':
+                setattr(booking, field, new_time)
+            else:
+                setattr(booking, field, data[field])
+    
+    booking.updated_at = datetime.utcnow()
+
+@admin_bp.route('/course-bookings/bulk', methods=['POST'])
+def bulk_create_course_bookings():
+    """管理员批量创建课程预约
+
+    支持两种请求格式：
+    - bookings: 预约列表，每项字段与单个创建接口相同
+    - term: 学期排课，按 interval_days（默认7天）从 first_time 重复 count 次
+            或重复到 end_date 为止
+    all_or_nothing 为 true（默认）时，只要有一项冲突就全部不创建
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': '请求数据不能为空'}), 400
+        
+        try:
+            items = _expand_bulk_bookings(data)
+        except (KeyError, ValueError, TypeError, OverflowError) as e:
+            return jsonify({'error': f'批量预约数据错误: {str(e)}'}), 400
+        
+        if not items:
+            return jsonify({'error': '没有需要创建的课程预约'}), 400
+        
+        if len(items) > MAX_BULK_BOOKINGS:
+            return jsonify({'error': f'单次最多创建 {MAX_BULK_BOOKINGS} 个课程预约'}), 400
+        
+        # 一次查询验证所有老师和学生
+        teacher_ids = {item['teacher_id'] for item in items}
+        student_ids = {item['student_id'] for item in items}
+        user_types = dict(db.session.query(User.id, User.user_type).filter(
+            User.id.in_(teacher_ids | student_ids)
+        ).all())
+        
+        for teacher_id in teacher_ids:
+            if user_types.get(teacher_id) != 'teacher':
+                return jsonify({'error': f'老师不存在或用户类型错误: {teacher_id}'}), 400
+        for student_id in student_ids:
+            if user_types.get(student_id) != 'student':
+                return jsonify({'error': f'学生不存在或用户类型错误: {student_id}'}), 400
+        
+        all_or_nothing = data.get('all_or_nothing', True)
+        scheduler = get_booking_scheduler()
+        earliest_start = min(item['scheduled_time'] for item in items)
+        
+        with scheduler.reservation(teacher_ids, student_ids, earliest_start):
+            conflicts = scheduler.find_batch_conflicts(items)
+            
+            results = []
+            for position, (item, conflict) in enumerate(zip(items, conflicts)):
+                result = {
+                    'index': position,
+                    'student_id': item['student_id'],
+                    'teacher_id': item['teacher_id'],
+                    'scheduled_time': item['scheduled_time'].isoformat()
+                }
+                if conflict:
+                    result['status'] = 'conflict'
+                    result['message'] = CONFLICT_MESSAGES[conflict['party']]
+                    result['conflict'] = conflict
+                else:
+                    result['status'] = 'pending'
+                results.append(result)
+            
+            conflict_count = len([c for c in conflicts if c])
+            if conflict_count and all_or_nothing:
+                db.session.rollback()
+                return jsonify({
+                    'success': False,
+                    'error': f'有 {conflict_count} 个课程预约存在时间冲突，未创建任何预约',
+                    'results': results
+                }), 409
+            
+            bookings = []
+            for item, result in zip(items, results):
+                if result['status'] == 'conflict':
+                    continue
+                booking = CourseBooking(
+                    user_id=item['student_id'],
+                    teacher_id=item['teacher_id'],
+                    course_title=item['course_title'],
+                    course_type=item['course_type'],
+                    subject=item['subject'],
+                    scheduled_time=item['scheduled_time'],
+                    duration_minutes=item['duration_minutes'],
+                    description=item['description'],
+                    status='scheduled'
+                )
+                bookings.append((booking, result))
+            
+            db.session.add_all([booking for booking, _ in bookings])
+            db.session.commit()
+        
+        for booking, result in bookings:
+            result['status'] = 'created'
+            result['booking_id'] = booking.id
+        
+        return jsonify({
+            'success': True,
+            'message': f'批量创建完成：成功 {len(bookings)} 个，冲突 {conflict_count} 个',
+            'summary': {
+                'total': len(items),
+                'created_count': len(bookings),
+                'conflict_count': conflict_count
+            },
+            'results': results
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'批量创建课程预约失败: {str(e)}'}), 500
+
+def _expand_bulk_bookings(data):
+    """把批量请求展开为预约条目列表"""
+    if 'term' in data:
+        term = data['term']
+        if not isinstance(term, dict):
+            raise ValueError('term 格式错误')
+        first_time = datetime.fromisoformat(term['first_time'])
+        interval_days = int(term.get('interval_days', 7))
+        if interval_days <= 0:
+            raise ValueError('interval_days 必须大于 0')
+        interval = timedelta(days=interval_days)
+        
+        if 'count' in term:
+            count = int(term['count'])
+            # 展开前先检查次数，避免过大的 count 占满内存
+            if count <= 0 or count > MAX_BULK_BOOKINGS:
+                raise ValueError(f'count 必须在 1 到 {MAX_BULK_BOOKINGS} 之间')
+            times = [first_time + interval * i for i in range(count)]
+        else:
+            end_date = datetime.fromisoformat(term['end_date'])
+            times = []
+            current = first_time
+            while current <= end_date and len(times) <= MAX_BULK_BOOKINGS:
+                times.append(current)
+                current += interval
+        
+        entries = [dict(term, scheduled_time=time.isoformat()) for time in times]
+    else:
+        entries = data.get('bookings', [])
+        if not isinstance(entries, list):
+            raise ValueError('bookings 必须是列表')
+        if len(entries) > MAX_BULK_BOOKINGS:
+            raise ValueError(f'单次最多创建 {MAX_BULK_BOOKINGS} 个课程预约')
+    
+    max_duration = MAX_BOOKING_DURATION // timedelta(minutes=1)
+    items = []
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f'第 {position + 1} 个预约格式错误')
+        # 时长为 0 或负数的区间不会与任何课程冲突
+        duration = int(entry.get('duration_minutes', 60))
+        if duration <= 0 or duration > max_duration:
+            raise ValueError(f'第 {position + 1} 个预约的 duration_minutes 必须在 1 到 {max_duration} 之间')
+        items.append({
+            'student_id': int(entry['student_id']),
+            'teacher_id': int(entry['teacher_id']),
+            'course_title': entry['course_title'],
+            'course_type': entry['course_type'],
+            'subject': entry['subject'],
+            'scheduled_time': datetime.fromisoformat(entry['scheduled_time']),
+            'duration_minutes': duration,
+            'description': entry.get('description', '')
+        })
+    
+    return items
+
 @admin_bp.route('/course-bookings/<int:booking_id>', methods=['DELETE'])
 def delete_course_booking(booking_id):
     """管理员删除课程预约"""
@@ -247,13 +404,20 @@ def get_users():
     """获取用户列表"""
     try:
         user_type = request.args.get('user_type')
+        grade = request.args.get('grade')
+        class_name = request.args.get('class_name')
         
         query = User.query
         
         if user_type:
             query = query.filter_by(user_type=user_type)
+        if grade:
+            query = query.filter_by(grade=grade)
+        if class_name:
+            query = query.filter_by(class_name=class_name)
         
-        users = query.all()
+        # 按 (创建时间, ID) 游标分页
+        users, page_info = keyset_paginate(query, [User.created_at, User.id])
         
         user_list = []
         for user in users:
@@ -262,17 +426,25 @@ def get_users():
                 'username': user.username,
                 'nickname': user.nickname,
                 'user_type': user.user_type,
+                'grade': user.grade,
+                'class_name': user.class_name,
                 'is_active': user.is_active,
-                'created_at': user.created_at.isoformat()
+                'created_at': user.created_at.isoformat() if user.created_at else None
             }
             user_list.append(user_data)
         
-        return jsonify({
+        response = {
             'success': True,
             'users': user_list,
-            'total': len(user_list)
-        })
+            'pagination': page_info
+        }
+        if 'total' in page_info:
+            response['total'] = page_info['total']
+        
+        return json_response(response)
         
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'获取用户列表失败: {str(e)}'}), 500
 
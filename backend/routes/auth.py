@@ -6,7 +6,7 @@
 """
 from flask import Blueprint, request, jsonify
 from extensions import db
-from models import User, UserModulePermission
+from services.permission_cache import get_permission_cache
 
 # 创建蓝图
 auth_bp = Blueprint('auth', __name__, url_prefix='/api')
@@ -33,25 +33,10 @@ def login():
         if not username or not password:
             return jsonify({'error': '用户名和密码不能为空'}), 400
         
-        # 查找用户 - 支持多种用户名格式
-        user = None
+        # 查找用户 - 支持多种用户名格式，权限按用户缓存
+        permissions = get_permission_cache().get_by_username(username)
         
-        # 首先尝试直接匹配
-        user = User.query.filter_by(username=username, is_active=True).first()
-        
-        # 如果没有找到，尝试处理常见的用户名变体
-        if not user:
-            # 处理 student01 -> student1 的情况
-            if username == 'student01':
-                user = User.query.filter_by(username='student1', is_active=True).first()
-            elif username == 'student02':
-                user = User.query.filter_by(username='student2', is_active=True).first()
-            elif username == 'teacher01':
-                user = User.query.filter_by(username='teacher1', is_active=True).first()
-            elif username == 'teacher02':
-                user = User.query.filter_by(username='teacher2', is_active=True).first()
-        
-        if not user:
+        if not permissions:
             return jsonify({'error': '用户不存在或已被禁用'}), 401
         
         # 简化的密码验证 - 使用映射后的用户名进行验证
@@ -64,30 +49,21 @@ def login():
         }
         
         # 使用映射后的用户名进行密码验证
-        mapped_username = user.username
+        mapped_username = permissions.username
         if mapped_username not in valid_passwords or password != valid_passwords[mapped_username]:
             return jsonify({'error': '密码错误'}), 401
         
-        # 获取用户权限的模块
-        permissions = UserModulePermission.query.filter_by(user_id=user.id).all()
-        allowed_modules = [p.module_id for p in permissions]
-        
-        # 管理员和教师可以访问所有模块
-        if user.user_type in ['admin', 'teacher']:
-            from models import StudyModule
-            all_modules = StudyModule.query.filter_by(is_active=True).all()
-            allowed_modules = [m.module_id for m in all_modules]
-        
+        # 用户信息，管理员和教师的 allowed_modules 为全部活跃模块
         user_info = {
-            'id': user.id,
-            'username': user.username,
-            'nickname': user.nickname,
-            'user_type': user.user_type,
-            'allowed_modules': allowed_modules
+            'id': permissions.user_id,
+            'username': permissions.username,
+            'nickname': permissions.nickname,
+            'user_type': permissions.user_type,
+            'allowed_modules': permissions.allowed_modules
         }
         
         # 简化的token
-        token = f"{user.username}_{user.id}_token"
+        token = f"{permissions.username}_{permissions.user_id}_token"
         
         return jsonify({
             'success': True,
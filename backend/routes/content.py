@@ -6,6 +6,7 @@
 """
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, abort
 from services.content_service import ContentService
+from responses import json_response, cached_json_response
 from services.ai_service import AIService
 
 # 创建API蓝图
@@ -20,8 +21,9 @@ content_page_bp = Blueprint('content_page', __name__)
 def get_study_modules():
     """获取学习模块API"""
     try:
-        response = ContentService.get_study_modules()
-        return jsonify(response)
+        # 直接返回缓存中已序列化的响应，不访问数据库
+        entry = ContentService.get_study_modules_entry()
+        return cached_json_response(entry.body, entry.etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -38,8 +40,8 @@ def get_user_study_content(username):
 def get_module_content(module_id):
     """获取特定模块的详细内容"""
     try:
-        content_list = ContentService.get_module_content(module_id)
-        return jsonify(content_list)
+        entry = ContentService.get_module_content_entry(module_id)
+        return cached_json_response(entry.list_body, entry.list_etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -183,7 +185,7 @@ def api_get_reading_articles():
         # 按创建时间倒序排列（最新的在前）
         articles.sort(key=lambda x: x.get('created_at', ''), reverse=True)
         
-        return jsonify(articles)
+        return json_response(articles)
         
     except Exception as e:
         print(f"获取文章列表失败: {e}")
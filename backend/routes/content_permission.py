@@ -7,8 +7,16 @@
 
 from flask import Blueprint, request, jsonify
 from datetime import datetime
+from sqlalchemy.orm import selectinload
 from extensions import db
-from models import User, StudyModule, StudyContent, UserModulePermission
+from models import User, StudyModule, UserModulePermission, PermissionTemplate, PermissionTemplateModule
+from services.permission_cache import invalidate_user_permissions
+from services.permission_matrix import get_permission_matrix
+from services.permission_service import PermissionService
+from services.recommendation_engine import get_recommendation_engine
+from services.module_catalog import get_module_catalog
+from services.module_content_cache import get_module_content_cache
+from responses import json_response, cached_json_response
 
 # 创建内容权限蓝图
 content_permission_bp = Blueprint('content_permission', __name__, url_prefix='/api/content-permission')
@@ -25,11 +33,10 @@ def get_student_modules(student_id):
             return jsonify({'error': '用户不是学生'}), 400
         
         # 获取学生的模块权限
-        permissions = UserModulePermission.query.filter_by(user_id=student_id).all()
-        permitted_module_ids = [p.module_id for p in permissions]
+        permitted_module_ids = get_permission_matrix().get_module_ids(student_id)
         
         # 获取所有活跃的学习模块
-        all_modules = StudyModule.query.filter_by(is_active=True).all()
+        all_modules = get_module_catalog().get().payload['allModules']
         
         # 按分类组织模块
         categorized_modules = {
@@ -40,28 +47,28 @@ def get_student_modules(student_id):
         
         for module in all_modules:
             # 检查学生是否有权限访问该模块
-            has_permission = module.module_id in permitted_module_ids
+            has_permission = module['id'] in permitted_module_ids
             
             module_data = {
-                'id': module.module_id,
-                'title': module.title,
-                'description': module.description,
-                'icon': module.icon,
-                'category': module.category,
-                'difficulty': module.difficulty,
+                'id': module['id'],
+                'title': module['title'],
+                'description': module['description'],
+                'icon': module['icon'],
+                'category': module['category'],
+                'difficulty': module['difficulty'],
                 'hasPermission': has_permission,
                 'isLocked': not has_permission
             }
             
             # 按分类添加到对应的列表
-            if module.category == 'basic':
+            if module['category'] == 'basic':
                 categorized_modules['basicTraining'].append(module_data)
-            elif module.category == 'reading':
+            elif module['category'] == 'reading':
                 categorized_modules['readingTraining'].append(module_data)
-            elif module.category == 'writing':
+            elif module['category'] == 'writing':
                 categorized_modules['writingTraining'].append(module_data)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'student_id': student_id,
             'modules': categorized_modules,
@@ -76,47 +83,20 @@ def get_student_modules(student_id):
 def get_module_content(student_id, module_id):
     """获取指定模块的学习内容"""
     try:
-        # 验证学生权限
-        permission = UserModulePermission.query.filter_by(
-            user_id=student_id,
-            module_id=module_id
-        ).first()
-        
-        if not permission:
+        # 验证学生权限：以数据库为准（唯一索引上的单行查询），
+        # 进程内的权限矩阵在多进程部署时可能还没有看到其他进程上的撤销
+        has_permission = db.session.query(
+            UserModulePermission.query.filter_by(user_id=student_id, module_id=module_id).exists()
+        ).scalar()
+        if not has_permission:
             return jsonify({'error': '没有访问该模块的权限'}), 403
         
-        # 获取模块信息
-        module = StudyModule.query.get_or_404(module_id)
+        # 模块信息和内容来自缓存，内容未变化时返回 304
+        entry = get_module_content_cache().get(module_id)
+        if entry.detail_body is None:
+            return jsonify({'error': '学习模块不存在'}), 404
         
-        # 获取模块内容
-        contents = StudyContent.query.filter_by(
-            module_id=module_id,
-            is_active=True
-        ).order_by(StudyContent.order_index).all()
-        
-        content_list = []
-        for content in contents:
-            content_data = {
-                'id': content.id,
-                'title': content.title,
-                'content_type': content.content_type,
-                'content': content.content,
-                'order_index': content.order_index
-            }
-            content_list.append(content_data)
-        
-        return jsonify({
-            'success': True,
-            'module': {
-                'id': module.module_id,
-                'title': module.title,
-                'description': module.description,
-                'category': module.category,
-                'difficulty': module.difficulty
-            },
-            'contents': content_list,
-            'total_contents': len(content_list)
-        })
+        return cached_json_response(entry.detail_body, entry.detail_etag)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -169,6 +149,7 @@ def grant_permission():
         
         db.session.add(permission)
         db.session.commit()
+        invalidate_user_permissions([student_id])
         
         return jsonify({
             'success': True,
@@ -224,6 +205,7 @@ def revoke_permission():
         # 删除权限记录
         db.session.delete(permission)
         db.session.commit()
+        invalidate_user_permissions([student_id])
         
         return jsonify({
             'success': True,
@@ -263,66 +245,63 @@ def batch_grant_permissions():
         if not granter or granter.user_type != 'admin':
             return jsonify({'error': '只有管理员可以授予权限'}), 403
         
-        success_count = 0
-        error_count = 0
-        results = []
-        
-        for student_id in student_ids:
-            for module_id in module_ids:
-                try:
-                    # 检查是否已经有权限
-                    existing = UserModulePermission.query.filter_by(
-                        user_id=student_id,
-                        module_id=module_id
-                    ).first()
-                    
-                    if existing:
-                        results.append({
-                            'student_id': student_id,
-                            'module_id': module_id,
-                            'status': 'skipped',
-                            'message': '权限已存在'
-                        })
-                        continue
-                    
-                    # 创建权限记录
-                    permission = UserModulePermission(
-                        user_id=student_id,
-                        module_id=module_id,
-                        granted_by=granted_by
-                    )
-                    
-                    db.session.add(permission)
-                    success_count += 1
-                    
-                    results.append({
-                        'student_id': student_id,
-                        'module_id': module_id,
-                        'status': 'success',
-                        'message': '权限授予成功'
-                    })
-                    
-                except Exception as e:
-                    error_count += 1
-                    results.append({
-                        'student_id': student_id,
-                        'module_id': module_id,
-                        'status': 'error',
-                        'message': str(e)
-                    })
+        # 一次性校验学生和模块、计算缺少的权限并批量写入
+        outcome = PermissionService.grant(student_ids, module_ids, granted_by)
         
         db.session.commit()
+        invalidate_user_permissions(outcome['granted_student_ids'])
+        
+        success_count = outcome['success_count']
+        error_count = outcome['error_count']
         
         return jsonify({
             'success': True,
             'message': f'批量授予完成：成功 {success_count} 个，错误 {error_count} 个',
             'summary': {
-                'total_operations': len(student_ids) * len(module_ids),
+                'total_operations': len(outcome['results']),
                 'success_count': success_count,
                 'error_count': error_count,
-                'skipped_count': len([r for r in results if r['status'] == 'skipped'])
+                'skipped_count': outcome['skipped_count']
             },
-            'results': results
+            'results': outcome['results']
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@content_permission_bp.route('/admin/batch-revoke', methods=['POST'])
+def batch_revoke_permissions():
+    """批量撤销权限"""
+    try:
+        data = request.get_json()
+        
+        # 验证必需字段
+        required_fields = ['student_ids', 'module_ids', 'revoked_by']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({'error': f'缺少必需字段: {field}'}), 400
+        
+        # 验证撤销者是管理员
+        revoker = User.query.get(data['revoked_by'])
+        if not revoker or revoker.user_type != 'admin':
+            return jsonify({'error': '只有管理员可以撤销权限'}), 403
+        
+        outcome = PermissionService.revoke(data['student_ids'], data['module_ids'])
+        
+        db.session.commit()
+        invalidate_user_permissions(outcome['revoked_student_ids'])
+        
+        return jsonify({
+            'success': True,
+            'message': f'批量撤销完成：撤销 {outcome["revoked_count"]} 个',
+            'summary': {
+                'revoked_count': outcome['revoked_count'],
+                'not_found_count': outcome['not_found_count'],
+                'affected_students': len(outcome['revoked_student_ids'])
+            },
+            'revoked_by': revoker.nickname,
+            'revoked_at': datetime.utcnow().isoformat()
         })
         
     except Exception as e:
@@ -410,6 +389,273 @@ def get_module_students(module_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@content_permission_bp.route('/admin/students/missing-modules', methods=['GET'])
+def get_students_missing_modules():
+    """获取缺少指定模块（任意一个）的学生列表
+
+    通过 module_ids（逗号分隔）或 category（默认 basic）指定模块
+    """
+    try:
+        module_ids_param = request.args.get('module_ids')
+        if module_ids_param:
+            module_ids = [m.strip() for m in module_ids_param.split(',') if m.strip()]
+        else:
+            category = request.args.get('category', 'basic')
+            module_ids = [
+                m['id'] for m in get_module_catalog().get().payload['allModules']
+                if m['category'] == category
+            ]
+
+        if not module_ids:
+            return jsonify({'error': '没有找到需要检查的模块'}), 400
+
+        matrix = get_permission_matrix()
+        student_ids = matrix.students_missing_any(module_ids)
+
+        students = User.query.filter(User.id.in_(student_ids)).order_by(User.id).all() if student_ids else []
+        student_list = []
+        for student in students:
+            owned = matrix.get_module_ids(student.id)
+            student_list.append({
+                'id': student.id,
+                'username': student.username,
+                'nickname': student.nickname,
+                'missing_modules': [m for m in module_ids if m not in owned]
+            })
+
+        return jsonify({
+            'success': True,
+            'module_ids': module_ids,
+            'students': student_list,
+            'total_students': len(student_list)
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ==================== 权限模板API ====================
+
+def _template_to_dict(template):
+    """权限模板转换为接口返回格式"""
+    return {
+        'id': template.id,
+        'name': template.name,
+        'description': template.description,
+        'module_ids': PermissionService.template_module_ids(template),
+        'created_by': template.created_by,
+        'created_at': template.created_at.isoformat() if template.created_at else None,
+        'updated_at': template.updated_at.isoformat() if template.updated_at else None
+    }
+
+def _set_template_modules(template, module_ids):
+    """替换权限模板包含的模块，返回不存在的模块ID"""
+    module_ids = list(dict.fromkeys(module_ids))
+    valid_modules = PermissionService.valid_module_ids(module_ids)
+    # 保留已有的记录，避免先插入后删除触发 (template_id, module_id) 唯一索引
+    current = {item.module_id: item for item in template.modules}
+    template.modules = [
+        current.get(m) or PermissionTemplateModule(module_id=m)
+        for m in module_ids if m in valid_modules
+    ]
+    return [m for m in module_ids if m not in valid_modules]
+
+def _template_targets(data):
+    """从请求中解析模板的目标学生：student_ids，或 grade/class_name"""
+    return PermissionService.resolve_students(
+        student_ids=data.get('student_ids'),
+        grade=data.get('grade'),
+        class_name=data.get('class_name')
+    )
+
+@content_permission_bp.route('/admin/templates', methods=['GET'])
+def get_permission_templates():
+    """获取权限模板列表"""
+    try:
+        templates = PermissionTemplate.query.options(
+            selectinload(PermissionTemplate.modules)
+        ).order_by(PermissionTemplate.name).all()
+        
+        return jsonify({
+            'success': True,
+            'templates': [_template_to_dict(template) for template in templates],
+            'total': len(templates)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@content_permission_bp.route('/admin/templates', methods=['POST'])
+def create_permission_template():
+    """创建权限模板"""
+    try:
+        data = request.get_json()
+        
+        # 验证必需字段
+        required_fields = ['name', 'module_ids', 'created_by']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({'error': f'缺少必需字段: {field}'}), 400
+        
+        creator = User.query.get(data['created_by'])
+        if not creator or creator.user_type != 'admin':
+            return jsonify({'error': '只有管理员可以创建权限模板'}), 403
+        
+        if PermissionTemplate.query.filter_by(name=data['name']).first():
+            return jsonify({'error': '权限模板名称已存在'}), 400
+        
+        template = PermissionTemplate(
+            name=data['name'],
+            description=data.get('description'),
+            created_by=creator.id
+        )
+        unknown_modules = _set_template_modules(template, data['module_ids'])
+        if unknown_modules:
+            return jsonify({'error': f'学习模块不存在: {", ".join(unknown_modules)}'}), 400
+        
+        db.session.add(template)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': '权限模板创建成功',
+            'template': _template_to_dict(template)
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@content_permission_bp.route('/admin/templates/<int:template_id>', methods=['PUT'])
+def update_permission_template(template_id):
+    """更新权限模板（不影响已经授予的权限）"""
+    try:
+        template = PermissionTemplate.query.get(template_id)
+        if not template:
+            return jsonify({'error': '权限模板不存在'}), 404
+        data = request.get_json()
+        
+        if 'name' in data and data['name'] != template.name:
+            if PermissionTemplate.query.filter_by(name=data['name']).first():
+                return jsonify({'error': '权限模板名称已存在'}), 400
+            template.name = data['name']
+        if 'description' in data:
+            template.description = data['description']
+        if 'module_ids' in data:
+            unknown_modules = _set_template_modules(template, data['module_ids'])
+            if unknown_modules:
+                db.session.rollback()
+                return jsonify({'error': f'学习模块不存在: {", ".join(unknown_modules)}'}), 400
+        
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': '权限模板更新成功',
+            'template': _template_to_dict(template)
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@content_permission_bp.route('/admin/templates/<int:template_id>', methods=['DELETE'])
+def delete_permission_template(template_id):
+    """删除权限模板（不影响已经授予的权限）"""
+    try:
+        template = PermissionTemplate.query.get(template_id)
+        if not template:
+            return jsonify({'error': '权限模板不存在'}), 404
+        
+        db.session.delete(template)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': '权限模板删除成功'
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@content_permission_bp.route('/admin/templates/<int:template_id>/apply', methods=['POST'])
+def apply_permission_template(template_id):
+    """把权限模板授予指定学生或整个年级/班级"""
+    try:
+        template = PermissionTemplate.query.get(template_id)
+        if not template:
+            return jsonify({'error': '权限模板不存在'}), 404
+        data = request.get_json()
+        
+        if 'granted_by' not in data:
+            return jsonify({'error': '缺少必需字段: granted_by'}), 400
+        
+        granter = User.query.get(data['granted_by'])
+        if not granter or granter.user_type != 'admin':
+            return jsonify({'error': '只有管理员可以授予权限'}), 403
+        
+        student_ids = _template_targets(data)
+        if not student_ids:
+            return jsonify({'error': '没有找到目标学生'}), 400
+        
+        # 单个事务完成全部写入，提交后统一失效一次缓存
+        outcome = PermissionService.apply_template(template, student_ids, granter.id)
+        db.session.commit()
+        invalidate_user_permissions(outcome['granted_student_ids'])
+        
+        return jsonify({
+            'success': True,
+            'message': f'权限模板“{template.name}”已授予 {len(student_ids)} 名学生',
+            'summary': {
+                'target_students': len(student_ids),
+                'success_count': outcome['success_count'],
+                'skipped_count': outcome['skipped_count'],
+                'error_count': outcome['error_count']
+            }
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@content_permission_bp.route('/admin/templates/<int:template_id>/remove', methods=['POST'])
+def remove_permission_template(template_id):
+    """从指定学生或整个年级/班级撤销权限模板中的模块"""
+    try:
+        template = PermissionTemplate.query.get(template_id)
+        if not template:
+            return jsonify({'error': '权限模板不存在'}), 404
+        data = request.get_json()
+        
+        if 'revoked_by' not in data:
+            return jsonify({'error': '缺少必需字段: revoked_by'}), 400
+        
+        revoker = User.query.get(data['revoked_by'])
+        if not revoker or revoker.user_type != 'admin':
+            return jsonify({'error': '只有管理员可以撤销权限'}), 403
+        
+        student_ids = _template_targets(data)
+        if not student_ids:
+            return jsonify({'error': '没有找到目标学生'}), 400
+        
+        outcome = PermissionService.remove_template(template, student_ids)
+        db.session.commit()
+        invalidate_user_permissions(outcome['revoked_student_ids'])
+        
+        return jsonify({
+            'success': True,
+            'message': f'已从 {len(outcome["revoked_student_ids"])} 名学生撤销权限模板“{template.name}”',
+            'summary': {
+                'target_students': len(student_ids),
+                'revoked_count': outcome['revoked_count'],
+                'affected_students': len(outcome['revoked_student_ids'])
+            }
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # ==================== 学习路径推荐API ====================
 
 @content_permission_bp.route('/recommend/<int:student_id>', methods=['GET'])
@@ -421,56 +667,31 @@ def recommend_learning_path(student_id):
         if student.user_type != 'student':
             return jsonify({'error': '用户不是学生'}), 400
         
-        # 获取学生当前的权限
-        current_permissions = UserModulePermission.query.filter_by(user_id=student_id).all()
-        current_module_ids = [p.module_id for p in current_permissions]
-        
-        # 获取所有模块
-        all_modules = StudyModule.query.filter_by(is_active=True).all()
-        
-        # 简单的推荐逻辑：基于难度递增
-        recommendations = {
-            'immediate': [],  # 立即可学习
-            'next_level': [], # 下一阶段
-            'advanced': []    # 高级阶段
-        }
-        
-        for module in all_modules:
-            if module.module_id not in current_module_ids:
-                if module.difficulty == 1:
-                    recommendations['immediate'].append({
-                        'id': module.module_id,
-                        'title': module.title,
-                        'description': module.description,
-                        'category': module.category,
-                        'difficulty': module.difficulty,
-                        'reason': '基础模块，建议优先学习'
-                    })
-                elif module.difficulty == 2:
-                    recommendations['next_level'].append({
-                        'id': module.module_id,
-                        'title': module.title,
-                        'description': module.description,
-                        'category': module.category,
-                        'difficulty': module.difficulty,
-                        'reason': '中级模块，适合进阶学习'
-                    })
-                else:
-                    recommendations['advanced'].append({
-                        'id': module.module_id,
-                        'title': module.title,
-                        'description': module.description,
-                        'category': module.category,
-                        'difficulty': module.difficulty,
-                        'reason': '高级模块，需要扎实基础'
-                    })
+        # 读取预先生成的推荐（权限变化后单独重新计算）
+        entry = get_recommendation_engine().get_for_student(student_id)
+        recommendations = entry['recommendations']
         
-        return jsonify({
+        return json_response({
             'success': True,
             'student_id': student_id,
-            'current_modules': len(current_module_ids),
+            'current_modules': entry['current_modules'],
             'recommendations': recommendations,
-            'total_recommendations': sum(len(recs) for recs in recommendations.values())
+            'total_recommendations': sum(len(recs) for recs in recommendations.values()),
+            'generated_at': entry['graph'].built_at.isoformat()
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@content_permission_bp.route('/admin/recommendations/rebuild', methods=['POST'])
+def rebuild_recommendations():
+    """立即重建所有学生的学习路径推荐"""
+    try:
+        summary = get_recommendation_engine().rebuild()
+        return jsonify({
+            'success': True,
+            'message': '学习路径推荐重建完成',
+            'summary': summary
         })
         
     except Exception as e:
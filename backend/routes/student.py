@@ -6,8 +6,13 @@
 """
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
 from extensions import db
 from models import User, Course, CourseBooking, CourseSession, CourseAnnotation
+from services.schedule_service import ScheduleService, MAX_RANGE_DAYS
+from pagination import keyset_paginate, PaginationError
+from responses import json_response
+from services.progress_store import get_progress_store
 
 # 创建学生蓝图
 student_bp = Blueprint('student', __name__, url_prefix='/api/student')
@@ -45,13 +50,14 @@ def get_student_bookings(student_id):
             except ValueError:
                 return jsonify({'error': '结束日期格式错误'}), 400
         
-        # 按时间排序
-        bookings = query.order_by(CourseBooking.scheduled_time).all()
+        # 按 (时间, ID) 游标分页，老师信息随预约一起加载
+        query = query.options(joinedload(CourseBooking.teacher))
+        bookings, page_info = keyset_paginate(query, [CourseBooking.scheduled_time, CourseBooking.id])
         
         # 格式化返回数据
         booking_list = []
         for booking in bookings:
-            teacher = User.query.get(booking.teacher_id)
+            teacher = booking.teacher
             booking_data = {
                 'id': booking.id,
                 'course_title': booking.course_title,
@@ -67,12 +73,18 @@ def get_student_bookings(student_id):
             }
             booking_list.append(booking_data)
         
-        return jsonify({
+        response = {
             'success': True,
             'bookings': booking_list,
-            'total': len(booking_list)
-        })
+            'pagination': page_info
+        }
+        if 'total' in page_info:
+            response['total'] = page_info['total']
+        
+        return json_response(response)
         
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -246,6 +258,19 @@ def get_student_progress(student_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@student_bp.route('/<int:student_id>/learning-progress', methods=['GET'])
+def get_student_learning_progress(student_id):
+    """获取学生在各课程/学习模块上的最新学习进度（含尚未写入数据库的实时进度）"""
+    try:
+        return json_response({
+            'success': True,
+            'student_id': student_id,
+            'progress': get_progress_store().get_for_user(student_id)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ==================== 教师查询API ====================
 
 @student_bp.route('/teachers', methods=['GET'])
@@ -303,33 +328,61 @@ def get_teacher_schedule(teacher_id):
         except ValueError:
             return jsonify({'error': '日期格式错误'}), 400
         
-        # 获取该教师在该日期的所有预约
-        existing_bookings = CourseBooking.query.filter(
-            CourseBooking.teacher_id == teacher_id,
-            db.func.date(CourseBooking.scheduled_time) == target_date
-        ).all()
+        # 按半开时间区间查询当天预约，并计算空闲时间段
+        schedule = ScheduleService.get_available_slots(teacher_id, target_date)
         
-        # 定义可预约时间段（这里可以根据实际需求调整）
-        available_slots = [
-            '09:00-10:00', '10:00-11:00', '14:00-15:00', 
-            '15:00-16:00', '18:00-19:00', '19:00-20:00', '20:00-21:00'
-        ]
+        return jsonify({
+            'success': True,
+            'teacher_id': teacher_id,
+            'date': date,
+            'available_slots': schedule['available_slots'],
+            'booked_slots': schedule['booked_slots']
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@student_bp.route('/teachers/availability', methods=['GET'])
+def get_teachers_availability():
+    """批量获取多位教师在一段日期内的可预约时间
+
+    参数: teacher_ids（逗号分隔，缺省为全部在职教师）、date_from（YYYY-MM-DD）、days（默认7天）
+    """
+    try:
+        date_from = request.args.get('date_from')
+        if not date_from:
+            return jsonify({'error': '开始日期参数不能为空'}), 400
         
-        # 过滤掉已被预约的时间段
-        booked_times = [booking.scheduled_time.strftime('%H:%M') for booking in existing_bookings]
-        available_times = []
+        try:
+            start_date = datetime.strptime(date_from, '%Y-%m-%d').date()
+            days = int(request.args.get('days', 7))
+        except ValueError:
+            return jsonify({'error': '日期或天数格式错误'}), 400
+        
+        if days < 1 or days > MAX_RANGE_DAYS:
+            return jsonify({'error': f'天数必须在 1 到 {MAX_RANGE_DAYS} 之间'}), 400
+        
+        teacher_ids_param = request.args.get('teacher_ids')
+        if teacher_ids_param:
+            try:
+                teacher_ids = [int(teacher_id) for teacher_id in teacher_ids_param.split(',') if teacher_id]
+            except ValueError:
+                return jsonify({'error': '教师ID格式错误'}), 400
+        else:
+            teacher_ids = [teacher_id for (teacher_id,) in db.session.query(User.id).filter_by(
+                user_type='teacher', is_active=True
+            )]
         
-        for slot in available_slots:
-            start_time = slot.split('-')[0]
-            if start_time not in booked_times:
-                available_times.append(slot)
+        availability = ScheduleService.generate_free_slots(teacher_ids, start_date, days)
         
         return jsonify({
             'success': True,
-            'teacher_id': teacher_id,
-            'date': date,
-            'available_slots': available_times,
-            'booked_slots': booked_times
+            'date_from': start_date.isoformat(),
+            'days': days,
+            'teachers': [
+                {'teacher_id': teacher_id, 'schedule': schedule}
+                for teacher_id, schedule in availability.items()
+            ]
         })
         
     except Exception as e:
@@ -6,8 +6,14 @@
 """
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
 from extensions import db
-from models import User, Course, CourseBooking, CourseSession, CourseAnnotation
+from models import (
+    User, Course, CourseBooking, CourseSession, CourseAnnotation,
+    TeacherAvailability, TeacherAvailabilityException
+)
+from pagination import keyset_paginate, PaginationError
+from responses import json_response
 
 # 创建教师蓝图
 teacher_bp = Blueprint('teacher', __name__, url_prefix='/api/teacher')
@@ -37,13 +43,14 @@ def get_teacher_courses(teacher_id):
         if status != 'all':
             query = query.filter_by(status=status)
         
-        # 按时间排序
-        courses = query.order_by(Course.scheduled_date, Course.scheduled_time).all()
+        # 按 (日期, 时间, ID) 游标分页，学生信息随课程一起加载
+        query = query.options(joinedload(Course.student))
+        courses, page_info = keyset_paginate(query, [Course.scheduled_date, Course.scheduled_time, Course.id])
         
         # 格式化返回数据
         course_list = []
         for course in courses:
-            student = User.query.get(course.student_id)
+            student = course.student
             course_data = {
                 'id': course.id,
                 'title': course.title,
@@ -62,12 +69,18 @@ def get_teacher_courses(teacher_id):
             }
             course_list.append(course_data)
         
-        return jsonify({
+        response = {
             'success': True,
             'courses': course_list,
-            'total': len(course_list)
-        })
+            'pagination': page_info
+        }
+        if 'total' in page_info:
+            response['total'] = page_info['total']
+        
+        return json_response(response)
         
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -578,6 +591,184 @@ def update_booking_status(booking_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ==================== 可预约时间API ====================
+
+def _parse_time_range(data):
+    """解析请求中的 start_time / end_time（HH:MM）"""
+    start_time = datetime.strptime(data['start_time'], '%H:%M').time()
+    end_time = datetime.strptime(data['end_time'], '%H:%M').time()
+    if start_time >= end_time:
+        raise ValueError('结束时间必须晚于开始时间')
+    return start_time, end_time
+
+@teacher_bp.route('/<int:teacher_id>/availability', methods=['GET'])
+def get_teacher_availability(teacher_id):
+    """获取教师的每周可预约时间和例外安排"""
+    try:
+        availabilities = TeacherAvailability.query.filter_by(teacher_id=teacher_id, is_active=True)\
+            .order_by(TeacherAvailability.weekday, TeacherAvailability.start_time).all()
+        
+        exceptions_query = TeacherAvailabilityException.query.filter_by(teacher_id=teacher_id)
+        date_from = request.args.get('date_from')
+        if date_from:
+            try:
+                from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
+                exceptions_query = exceptions_query.filter(TeacherAvailabilityException.date >= from_date)
+            except ValueError:
+                return jsonify({'error': '开始日期格式错误'}), 400
+        exceptions = exceptions_query.order_by(TeacherAvailabilityException.date).all()
+        
+        return jsonify({
+            'success': True,
+            'teacher_id': teacher_id,
+            'weekly': [{
+                'id': availability.id,
+                'weekday': availability.weekday,
+                'start_time': availability.start_time.strftime('%H:%M'),
+                'end_time': availability.end_time.strftime('%H:%M'),
+                'slot_minutes': availability.slot_minutes
+            } for availability in availabilities],
+            'exceptions': [{
+                'id': exception.id,
+                'date': exception.date.isoformat(),
+                'start_time': exception.start_time.strftime('%H:%M') if exception.start_time else None,
+                'end_time': exception.end_time.strftime('%H:%M') if exception.end_time else None,
+                'is_available': exception.is_available,
+                'slot_minutes': exception.slot_minutes,
+                'reason': exception.reason
+            } for exception in exceptions]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@teacher_bp.route('/<int:teacher_id>/availability', methods=['PUT'])
+def set_teacher_availability(teacher_id):
+    """设置教师的每周可预约时间（整体替换）
+
+    请求格式: {"weekly": [{"weekday": 0, "start_time": "18:00", "end_time": "21:00", "slot_minutes": 60}]}
+    weekday 0 表示周一，6 表示周日
+    """
+    try:
+        data = request.get_json()
+        if not data or 'weekly' not in data:
+            return jsonify({'error': '缺少必需字段: weekly'}), 400
+        
+        teacher = User.query.get(teacher_id)
+        if not teacher or teacher.user_type != 'teacher':
+            return jsonify({'error': '老师不存在或用户类型错误'}), 400
+        
+        availabilities = []
+        for window in data['weekly']:
+            try:
+                weekday = int(window['weekday'])
+                start_time, end_time = _parse_time_range(window)
+                slot_minutes = int(window.get('slot_minutes', 60))
+            except (KeyError, ValueError) as e:
+                return jsonify({'error': f'可预约时间格式错误: {str(e)}'}), 400
+            
+            if weekday < 0 or weekday > 6 or slot_minutes <= 0:
+                return jsonify({'error': '星期或时段长度无效'}), 400
+            
+            availabilities.append(TeacherAvailability(
+                teacher_id=teacher_id,
+                weekday=weekday,
+                start_time=start_time,
+                end_time=end_time,
+                slot_minutes=slot_minutes
+            ))
+        
+        TeacherAvailability.query.filter_by(teacher_id=teacher_id).delete()
+        db.session.add_all(availabilities)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': '可预约时间设置成功',
+            'total': len(availabilities)
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@teacher_bp.route('/<int:teacher_id>/availability/exceptions', methods=['POST'])
+def add_availability_exception(teacher_id):
+    """添加可预约时间例外（请假或临时加课）
+
+    不传 start_time / end_time 且 is_available 为 false 时表示全天不可预约
+    """
+    try:
+        data = request.get_json()
+        if not data or 'date' not in data:
+            return jsonify({'error': '缺少必需字段: date'}), 400
+        
+        teacher = User.query.get(teacher_id)
+        if not teacher or teacher.user_type != 'teacher':
+            return jsonify({'error': '老师不存在'}), 404
+        
+        try:
+            exception_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+            if data.get('start_time') or data.get('end_time'):
+                start_time, end_time = _parse_time_range(data)
+            else:
+                start_time, end_time = None, None
+            slot_minutes = int(data.get('slot_minutes', 60))
+        except (KeyError, ValueError) as e:
+            return jsonify({'error': f'例外安排格式错误: {str(e)}'}), 400
+        
+        if slot_minutes <= 0:
+            return jsonify({'error': '时段长度无效'}), 400
+        
+        is_available = bool(data.get('is_available', False))
+        if is_available and start_time is None:
+            return jsonify({'error': '额外开放的时间必须指定开始和结束时间'}), 400
+        
+        exception = TeacherAvailabilityException(
+            teacher_id=teacher_id,
+            date=exception_date,
+            start_time=start_time,
+            end_time=end_time,
+            is_available=is_available,
+            slot_minutes=slot_minutes,
+            reason=data.get('reason', '')
+        )
+        db.session.add(exception)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': '例外安排添加成功',
+            'exception_id': exception.id
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@teacher_bp.route('/<int:teacher_id>/availability/exceptions/<int:exception_id>', methods=['DELETE'])
+def delete_availability_exception(teacher_id, exception_id):
+    """删除可预约时间例外"""
+    try:
+        exception = TeacherAvailabilityException.query.filter_by(
+            id=exception_id,
+            teacher_id=teacher_id
+        ).first()
+        if not exception:
+            return jsonify({'error': '例外安排不存在'}), 404
+        
+        db.session.delete(exception)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': '例外安排删除成功'
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # ==================== 学生管理API ====================
 
 @teacher_bp.route('/<int:teacher_id>/students', methods=['GET'])
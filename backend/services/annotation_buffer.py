@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+标注写入缓冲
+实时同步中的标注变化先进入缓冲区：对同一条标注的连续修改合并为一次写入，
+新增后又删除的标注直接丢弃；每隔 flush_interval_ms 毫秒或累计 max_batch 条
+时在一个事务中批量插入、更新和删除，然后按会话向客户端确认并下发数据库ID
+
+新增标注由客户端生成 clientId，入库前的修改和删除都可以用 clientId 引用。
+字段在加入缓冲时校验；批量写入失败时逐条重试，写不进去的单条操作确认失败后丢弃，
+不影响同一批中的其他操作
+"""
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+from sqlalchemy import update, delete
+from extensions import db
+from models import CourseAnnotation, AnnotationType
+
+logger = logging.getLogger(__name__)
+
+# 标注中可修改的字段：客户端字段名 -> 模型字段名
+UPDATABLE_FIELDS = {'content': 'annotation_text', 'color': 'color'}
+
+# 保留的 clientId -> 数据库ID 映射数，用于解析入库后仍用 clientId 引用的修改
+MAX_CLIENT_IDS = 10000
+
+# 整数列（起止位置）的取值范围
+MAX_POSITION = 2 ** 31 - 1
+# 颜色列的长度（#RRGGBB）
+MAX_COLOR_LENGTH = 7
+
+ClientKey = Tuple[int, str]
+
+class AnnotationValidationError(ValueError):
+    """标注字段无效，无法写入"""
+
+def _annotation_type(value) -> AnnotationType:
+    try:
+        return AnnotationType(value)
+    except ValueError:
+        return AnnotationType.HIGHLIGHT
+
+def _position_fields(position: Dict[str, Any]) -> Dict[str, int]:
+    try:
+        start, end = int(position.get('start', 0)), int(position.get('end', 0))
+    except (TypeError, ValueError):
+        raise AnnotationValidationError('标注位置格式错误')
+    if not (0 <= start <= MAX_POSITION and 0 <= end <= MAX_POSITION):
+        raise AnnotationValidationError('标注位置超出范围')
+    return {'start_position': start, 'end_position': end}
+
+def _check_color(color):
+    if not isinstance(color, str) or len(color) > MAX_COLOR_LENGTH:
+        raise AnnotationValidationError('标注颜色格式错误')
+
+def _insert_fields(annotation: Dict[str, Any]) -> Dict[str, Any]:
+    """新增标注的模型字段（缺少课程或被标注的文本时无法写入）"""
+    try:
+        course_id = int(annotation['courseId'])
+    except (KeyError, TypeError, ValueError):
+        raise AnnotationValidationError('标注缺少课程ID')
+    if course_id <= 0:
+        raise AnnotationValidationError('标注缺少课程ID')
+    text = annotation.get('text')
+    if not isinstance(text, str) or not text:
+        raise AnnotationValidationError('标注缺少被标注的文本')
+    color = annotation.get('color', '#FFD700')
+    _check_color(color)
+    return {
+        'course_id': course_id,
+        'annotation_type': _annotation_type(annotation.get('type', 'highlight')),
+        'text_content': text,
+        'annotation_text': annotation.get('content', ''),
+        'color': color,
+        **_position_fields(annotation.get('position') or {})
+    }
+
+def _update_fields(annotation: Dict[str, Any]) -> Dict[str, Any]:
+    """修改标注的模型字段（只包含客户端传入的字段）"""
+    fields = {column: annotation[key] for key, column in UPDATABLE_FIELDS.items() if key in annotation}
+    if 'color' in fields:
+        _check_color(fields['color'])
+    position = annotation.get('position')
+    if isinstance(position, dict):
+        # 锚定在共享文本上的标注，文本变化后起止位置随之更新
+        fields.update(_position_fields(position))
+    return fields
+
+class PendingWrite:
+    """一条待写入的标注操作"""
+
+    __slots__ = ('action', 'user_id', 'session_id', 'client_id', 'annotation_id', 'fields')
+
+    def __init__(self, action: str, user_id: int, session_id: str, client_id: Optional[str],
+                 annotation_id: Optional[int], fields: Dict[str, Any]):
+        self.action = action
+        self.user_id = user_id
+        self.session_id = session_id
+        self.client_id = client_id
+        self.annotation_id = annotation_id
+        self.fields = fields
+
+    def ack(self, annotation_id: Optional[int], success: bool = True) -> Dict[str, Any]:
+        return {
+            'action': self.action,
+            'clientId': self.client_id,
+            'id': annotation_id,
+            'userId': self.user_id,
+            'success': success
+        }
+
+class AnnotationWriteBuffer:
+    """标注写入缓冲
+
+    flush 只负责数据库写入，返回按会话分组的确认，由调用方在自己的上下文中发送给客户端
+    """
+
+    def __init__(self, flush_interval_ms: int = 200, max_batch: int = 100):
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch = max_batch
+
+        self._lock = threading.Lock()
+        # 同一时间只有一次写入，保证操作按提交顺序落库
+        self._flush_lock = threading.Lock()
+        # 尚未入库的新增（按 (用户ID, clientId)）
+        self._inserts: "OrderedDict[ClientKey, PendingWrite]" = OrderedDict()
+        # 已入库标注的修改和删除（按数据库ID，或按尚在写入中的 clientId）
+        self._updates: "OrderedDict[Any, PendingWrite]" = OrderedDict()
+        self._deletes: "OrderedDict[Any, PendingWrite]" = OrderedDict()
+        self._client_ids: "OrderedDict[ClientKey, int]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._inserts) + len(self._updates) + len(self._deletes)
+
+    def _target(self, user_id: int, annotation: Dict[str, Any]):
+        """标注的引用键：数据库ID，或 (用户ID, clientId)；已知映射的 clientId 换成数据库ID"""
+        if annotation.get('id'):
+            return annotation['id']
+        client_key = (user_id, annotation.get('clientId'))
+        return self._client_ids.get(client_key, client_key)
+
+    def submit(self, session_id: str, user_id: int, annotation: Dict[str, Any], action: str) -> bool:
+        """加入一条标注操作，返回缓冲区是否已达到批量写入条数
+
+        字段无效时抛出 AnnotationValidationError，不加入缓冲
+        """
+        client_id = annotation.get('clientId')
+        if action == 'add':
+            fields = _insert_fields(annotation)
+        elif action == 'update':
+            fields = _update_fields(annotation)
+        with self._lock:
+            if action == 'add':
+                key = (user_id, client_id or uuid.uuid4().hex)
+                self._inserts[key] = PendingWrite('add', user_id, session_id, key[1], None, fields)
+
+            elif action in ('update', 'delete'):
+                if not annotation.get('id') and not client_id:
+                    return False
+                target = self._target(user_id, annotation)
+                pending_insert = self._inserts.get(target) if isinstance(target, tuple) else None
+
+                if action == 'update':
+                    if pending_insert:
+                        # 尚未入库：直接合并进新增
+                        pending_insert.fields.update(fields)
+                    elif target in self._updates:
+                        self._updates[target].fields.update(fields)
+                    else:
+                        annotation_id = target if not isinstance(target, tuple) else None
+                        self._updates[target] = PendingWrite('update', user_id, session_id, client_id, annotation_id, fields)
+                else:
+                    self._updates.pop(target, None)
+                    if pending_insert:
+                        # 新增后又删除：两条操作都不需要落库
+                        del self._inserts[target]
+                    else:
+                        annotation_id = target if not isinstance(target, tuple) else None
+                        self._deletes[target] = PendingWrite('delete', user_id, session_id, client_id, annotation_id, {})
+            else:
+                logger.warning(f"未知的标注操作: {action}")
+                return False
+
+            return len(self) >= self.max_batch
+
+    def _take(self):
+        """取出当前缓冲的全部操作"""
+        with self._lock:
+            inserts, self._inserts = list(self._inserts.values()), OrderedDict()
+            updates, self._updates = list(self._updates.items()), OrderedDict()
+            deletes, self._deletes = list(self._deletes.items()), OrderedDict()
+        return inserts, updates, deletes
+
+    def _resolve(self, items: List[Tuple[Any, PendingWrite]]) -> Tuple[List[PendingWrite], List[PendingWrite]]:
+        """把按 clientId 引用的操作换成数据库ID，返回 (已解析, 无法解析)
+
+        新增写入失败或 clientId 映射已被淘汰时无法解析，这些操作由调用方确认失败
+        """
+        resolved, unresolved = [], []
+        with self._lock:
+            for target, write in items:
+                if isinstance(target, tuple):
+                    write.annotation_id = self._client_ids.get(target)
+                (resolved if write.annotation_id else unresolved).append(write)
+        return resolved, unresolved
+
+    def _remember_client_ids(self, inserts: List[PendingWrite], annotation_ids: List[int]):
+        with self._lock:
+            for write, annotation_id in zip(inserts, annotation_ids):
+                self._client_ids[(write.user_id, write.client_id)] = annotation_id
+            while len(self._client_ids) > MAX_CLIENT_IDS:
+                self._client_ids.popitem(last=False)
+
+    def flush(self) -> Dict[str, List[Dict]]:
+        """批量写入缓冲的操作，返回 {会话ID: 确认列表}（需要在应用上下文中调用）"""
+        with self._flush_lock:
+            inserts, update_items, delete_items = self._take()
+            if not (inserts or update_items or delete_items):
+                return {}
+
+            try:
+                acks = self._write(inserts, update_items, delete_items)
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"标注批量写入失败，逐条重试: {e}")
+                acks = self._write_each(inserts, update_items, delete_items)
+            return acks
+
+    def _write_each(self, inserts: List[PendingWrite], update_items: List[Tuple[Any, PendingWrite]],
+                    delete_items: List[Tuple[Any, PendingWrite]]) -> Dict[str, List[Dict]]:
+        """逐条写入（每条一个事务），失败的操作确认失败后丢弃，不影响其他操作"""
+        acks: Dict[str, List[Dict]] = {}
+        batches = [(write, ([write], [], [])) for write in inserts] + \
+            [(item[1], ([], [item], [])) for item in update_items] + \
+            [(item[1], ([], [], [item])) for item in delete_items]
+        for write, batch in batches:
+            try:
+                result = self._write(*batch)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"标注写入失败，已丢弃: 用户 {write.user_id}, 动作 {write.action}: {e}")
+                result = {write.session_id: [write.ack(write.annotation_id, False)]}
+            for session_id, session_acks in result.items():
+                acks.setdefault(session_id, []).extend(session_acks)
+        return acks
+
+    def _write(self, inserts: List[PendingWrite], update_items: List[Tuple[Any, PendingWrite]],
+               delete_items: List[Tuple[Any, PendingWrite]]) -> Dict[str, List[Dict]]:
+        """在一个事务中写入一批操作，返回按会话分组的确认；失败时抛出异常（调用方回滚）"""
+        # 新增：在同一事务中插入并取得数据库ID（数据库支持时 SQLAlchemy 合并为多值 INSERT）
+        models = [CourseAnnotation(user_id=write.user_id, **write.fields) for write in inserts]
+        db.session.add_all(models)
+        db.session.flush()
+        inserted_ids = [model.id for model in models]
+
+        updates, unresolved_updates = self._resolve(update_items)
+        deletes, unresolved_deletes = self._resolve(delete_items)
+
+        # 修改和删除只允许作者本人：一次查询取得所有者
+        ids = sorted({write.annotation_id for write in updates + deletes})
+        owners = dict(
+            db.session.query(CourseAnnotation.id, CourseAnnotation.user_id)
+            .filter(CourseAnnotation.id.in_(ids))
+        ) if ids else {}
+        deleted_ids = {write.annotation_id for write in deletes if owners.get(write.annotation_id) == write.user_id}
+
+        now = datetime.utcnow()
+        update_rows = [
+            {'id': write.annotation_id, **write.fields, 'updated_at': now}
+            for write in updates
+            if owners.get(write.annotation_id) == write.user_id and write.annotation_id not in deleted_ids
+        ]
+        if update_rows:
+            db.session.execute(update(CourseAnnotation), update_rows)
+        if deleted_ids:
+            db.session.execute(
+                delete(CourseAnnotation).where(CourseAnnotation.id.in_(sorted(deleted_ids))),
+                execution_options={'synchronize_session': False}
+            )
+        db.session.commit()
+        self._remember_client_ids(inserts, inserted_ids)
+
+        acks: Dict[str, List[Dict]] = {}
+        updated_ids = {row['id'] for row in update_rows}
+        for write, annotation_id in zip(inserts, inserted_ids):
+            acks.setdefault(write.session_id, []).append(write.ack(annotation_id))
+        for write in updates:
+            acks.setdefault(write.session_id, []).append(write.ack(write.annotation_id, write.annotation_id in updated_ids))
+        for write in deletes:
+            acks.setdefault(write.session_id, []).append(write.ack(write.annotation_id, write.annotation_id in deleted_ids))
+        for write in unresolved_updates + unresolved_deletes:
+            logger.warning(f"标注操作 {write.action} 未找到对应的标注: 用户 {write.user_id}, clientId {write.client_id}")
+            acks.setdefault(write.session_id, []).append(write.ack(None, False))
+
+        logger.info(f"标注批量写入：新增 {len(inserts)}，修改 {len(update_rows)}，删除 {len(deleted_ids)}")
+        return acks
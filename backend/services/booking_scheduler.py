@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+课程预约调度模块
+在内存中为每位老师和学生维护按开始时间排序的课程区间索引，
+用于快速检测预约时间冲突
+"""
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from extensions import db
+from models import User, CourseBooking
+
+# 会占用时间的预约状态
+ACTIVE_BOOKING_STATUSES = ('scheduled', 'active')
+
+# 内存索引只保留最近开始的课程，更早的课程不会再与新预约冲突
+INDEX_HORIZON = timedelta(days=1)
+
+# 单节课程的最长时长，用于确定刷新索引时需要回溯的时间范围
+MAX_BOOKING_DURATION = timedelta(days=1)
+
+# 预约写入锁的分段数：同一老师或学生的写入落在同一段上串行执行，不同用户的写入互不阻塞
+RESERVATION_LOCK_STRIPES = 64
+
+# 冲突提示信息
+CONFLICT_MESSAGES = {
+    'student': '学生在该时间段已有其他课程安排',
+    'teacher': '老师在该时间段已有其他课程安排'
+}
+
+class IntervalIndex:
+    """单个老师或学生的课程区间索引
+
+    区间按开始时间排序，同时记录最长课程时长。
+    与 [start, end) 重叠的课程开始时间一定落在 (start - 最长时长, end) 内，
+    所以一次二分查找就能定位所有候选课程
+    """
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.entries: List[Tuple[datetime, datetime, int]] = []
+        self.max_duration = timedelta(0)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, start: datetime, end: datetime, booking_id: int):
+        """添加课程区间"""
+        index = bisect_left(self.starts, start)
+        self.starts.insert(index, start)
+        self.entries.insert(index, (start, end, booking_id))
+        self.max_duration = max(self.max_duration, end - start)
+
+    def remove(self, start: datetime, booking_id: int):
+        """删除课程区间"""
+        index = bisect_left(self.starts, start)
+        while index < len(self.entries) and self.starts[index] == start:
+            if self.entries[index][2] == booking_id:
+                del self.starts[index]
+                del self.entries[index]
+                return
+            index += 1
+
+    def find_overlap(self, start: datetime, end: datetime, exclude_id: Optional[int] = None) -> Optional[int]:
+        """查找与 [start, end) 重叠的课程，返回课程预约ID"""
+        index = bisect_left(self.starts, start - self.max_duration)
+        while index < len(self.entries) and self.starts[index] < end:
+            entry_start, entry_end, booking_id = self.entries[index]
+            if entry_end > start and booking_id != exclude_id:
+                return booking_id
+            index += 1
+        return None
+
+class BookingScheduler:
+    """课程预约调度器
+
+    索引在首次使用时从数据库加载，之后通过会话提交钩子随写入更新。
+    写入路径在事务内锁定相关老师和学生的用户行，并从数据库重新加载
+    他们的课程区间，保证多进程部署下也不会重复排课。
+    _lock 只保护内存索引本身，不在数据库访问期间持有；同一进程内的写入按老师和学生
+    分段加锁（SQLite 等不支持行锁的数据库也能避免进程内重复排课）
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reservation_locks = [threading.Lock() for _ in range(RESERVATION_LOCK_STRIPES)]
+        self._teachers: Dict[int, IntervalIndex] = {}
+        self._students: Dict[int, IntervalIndex] = {}
+        self._bookings: Dict[int, Tuple[int, int, datetime, datetime]] = {}
+        self._loaded = False
+
+    # ==================== 索引维护 ====================
+
+    def invalidate(self):
+        """丢弃内存索引，下次使用时重新加载"""
+        with self._lock:
+            self._teachers.clear()
+            self._students.clear()
+            self._bookings.clear()
+            self._loaded = False
+
+    def _ensure_loaded(self):
+        """确保索引已从数据库加载"""
+        if not self._loaded:
+            self.rebuild()
+
+    def rebuild(self):
+        """从数据库重建全部索引"""
+        with self._lock:
+            self._teachers.clear()
+            self._students.clear()
+            self._bookings.clear()
+            for row in self._query_intervals(since=datetime.utcnow() - INDEX_HORIZON):
+                self._add(*row)
+            self._loaded = True
+
+    def _query_intervals(self, since: datetime, teacher_ids: Iterable[int] = (), student_ids: Iterable[int] = ()):
+        """查询占用时间的课程区间"""
+        query = db.session.query(
+            CourseBooking.id, CourseBooking.teacher_id, CourseBooking.user_id,
+            CourseBooking.scheduled_time, CourseBooking.duration_minutes
+        ).filter(
+            CourseBooking.status.in_(ACTIVE_BOOKING_STATUSES),
+            CourseBooking.scheduled_time >= since
+        )
+
+        teacher_ids, student_ids = list(teacher_ids), list(student_ids)
+        if teacher_ids or student_ids:
+            query = query.filter(db.or_(
+                CourseBooking.teacher_id.in_(teacher_ids),
+                CourseBooking.user_id.in_(student_ids)
+            ))
+
+        for booking_id, teacher_id, student_id, start, duration in query:
+            yield booking_id, teacher_id, student_id, start, start + timedelta(minutes=duration or 60)
+
+    def _add(self, booking_id: int, teacher_id: int, student_id: int, start: datetime, end: datetime):
+        self._remove(booking_id)
+        self._teachers.setdefault(teacher_id, IntervalIndex()).add(start, end, booking_id)
+        self._students.setdefault(student_id, IntervalIndex()).add(start, end, booking_id)
+        self._bookings[booking_id] = (teacher_id, student_id, start, end)
+
+    def _remove(self, booking_id: int):
+        booking = self._bookings.pop(booking_id, None)
+        if booking:
+            teacher_id, student_id, start, _ = booking
+            self._teachers[teacher_id].remove(start, booking_id)
+            self._students[student_id].remove(start, booking_id)
+
+    def apply_change(self, booking_id: int, teacher_id: int, student_id: int,
+                     start: datetime, duration: Optional[int], status: Optional[str], deleted: bool = False):
+        """根据已提交的写入更新索引"""
+        with self._lock:
+            if not self._loaded:
+                return
+            if deleted or status not in ACTIVE_BOOKING_STATUSES:
+                self._remove(booking_id)
+            else:
+                self._add(booking_id, teacher_id, student_id, start, start + timedelta(minutes=duration or 60))
+
+    # ==================== 冲突检测 ====================
+
+    def find_conflict(self, teacher_id: int, student_id: int, start: datetime, duration: int,
+                      exclude_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """检测老师和学生在 [start, start + duration) 是否已有课程"""
+        end = start + timedelta(minutes=duration)
+        with self._lock:
+            self._ensure_loaded()
+
+            student_index = self._students.get(student_id)
+            booking_id = student_index.find_overlap(start, end, exclude_id) if student_index else None
+            if booking_id:
+                return {'party': 'student', 'booking_id': booking_id}
+
+            teacher_index = self._teachers.get(teacher_id)
+            booking_id = teacher_index.find_overlap(start, end, exclude_id) if teacher_index else None
+            if booking_id:
+                return {'party': 'teacher', 'booking_id': booking_id}
+
+        return None
+
+    @contextmanager
+    def reservation(self, teacher_ids: Iterable[int], student_ids: Iterable[int], earliest_start: datetime):
+        """预约写入的临界区
+
+        按ID顺序锁定相关用户行（SELECT ... FOR UPDATE，避免死锁），
+        并从数据库刷新这些用户可能与 earliest_start 之后的新课程冲突的课程区间。
+        调用方应在 with 块内完成冲突检测和提交，冲突时需要回滚以释放行锁
+        """
+        teacher_ids, student_ids = set(teacher_ids), set(student_ids)
+        # 按分段序号加锁，避免死锁
+        stripes = sorted({hash(key) % RESERVATION_LOCK_STRIPES for key in
+                          [('teacher', user_id) for user_id in teacher_ids] +
+                          [('student', user_id) for user_id in student_ids]})
+        locks = [self._reservation_locks[stripe] for stripe in stripes]
+        for lock in locks:
+            lock.acquire()
+        try:
+            with self._lock:
+                self._ensure_loaded()
+
+            db.session.query(User.id).filter(
+                User.id.in_(teacher_ids | student_ids)
+            ).order_by(User.id).with_for_update().all()
+
+            since = min(earliest_start - MAX_BOOKING_DURATION, datetime.utcnow() - INDEX_HORIZON)
+            rows = list(self._query_intervals(since, teacher_ids, student_ids))
+
+            with self._lock:
+                stale = set()
+                for indexes, user_ids in ((self._teachers, teacher_ids), (self._students, student_ids)):
+                    for user_id in user_ids:
+                        if user_id in indexes:
+                            stale.update(entry[2] for entry in indexes[user_id].entries)
+                for booking_id in stale:
+                    self._remove(booking_id)
+                for row in rows:
+                    self._add(*row)
+
+            yield self
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def find_batch_conflicts(self, items: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """批量检测冲突，同时检测批次内部的相互冲突
+
+        items 中每项包含 teacher_id、student_id、scheduled_time、duration_minutes，
+        返回与 items 一一对应的冲突信息（无冲突为 None）
+        """
+        pending_teachers: Dict[int, IntervalIndex] = {}
+        pending_students: Dict[int, IntervalIndex] = {}
+        results = []
+
+        for position, item in enumerate(items):
+            start = item['scheduled_time']
+            end = start + timedelta(minutes=item['duration_minutes'])
+            conflict = self.find_conflict(item['teacher_id'], item['student_id'], start, item['duration_minutes'])
+
+            if not conflict:
+                # 批次内的条目用负数下标作为临时ID
+                for party, pending, key in (('student', pending_students, item['student_id']),
+                                            ('teacher', pending_teachers, item['teacher_id'])):
+                    index = pending.get(key)
+                    other = index.find_overlap(start, end) if index else None
+                    if other is not None:
+                        conflict = {'party': party, 'batch_index': -other - 1}
+                        break
+
+            if not conflict:
+                pending_students.setdefault(item['student_id'], IntervalIndex()).add(start, end, -position - 1)
+                pending_teachers.setdefault(item['teacher_id'], IntervalIndex()).add(start, end, -position - 1)
+
+            results.append(conflict)
+
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        with self._lock:
+            return {
+                'loaded': self._loaded,
+                'bookings': len(self._bookings),
+                'teachers': len(self._teachers),
+                'students': len(self._students)
+            }
+
+# 全局调度器实例
+booking_scheduler = BookingScheduler()
+
+def get_booking_scheduler() -> BookingScheduler:
+    """获取调度器实例"""
+    return booking_scheduler
+
+# ==================== 会话提交钩子 ====================
+
+@event.listens_for(Session, 'after_flush')
+def _collect_booking_changes(session, flush_context):
+    """记录本次事务中写入的课程预约"""
+    changes = session.info.setdefault('booking_changes', {})
+    for deleted, objects in ((False, session.new), (False, session.dirty), (True, session.deleted)):
+        for obj in objects:
+            if isinstance(obj, CourseBooking) and obj.id is not None:
+                changes[obj.id] = (obj.id, obj.teacher_id, obj.user_id, obj.scheduled_time,
+                                   obj.duration_minutes, obj.status, deleted)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_booking_changes(session):
+    """事务提交后更新内存索引"""
+    changes = session.info.pop('booking_changes', None)
+    if changes:
+        for change in changes.values():
+            booking_scheduler.apply_change(*change)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_booking_changes(session):
+    """事务回滚时丢弃记录的写入"""
+    session.info.pop('booking_changes', None)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨进程缓存失效
+权限缓存、权限矩阵和模块内容缓存都保存在各进程内。各缓存用 register() 登记
+本地失效函数，写入方调用 invalidate() 时先在本进程失效；配置了 Redis
+（CACHE_INVALIDATION_URL，默认与 SYNC_MESSAGE_QUEUE 相同）并调用
+start_listener() 后，失效同时发布到 Redis 频道，其他进程的后台线程收到后
+在本地执行同样的失效。
+
+发布/订阅不保证送达（如订阅连接中断期间的消息会丢失），缓存项的有效期和
+权限矩阵的定期重新加载作为兜底
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Any
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# 失效消息的 Redis 频道
+CHANNEL = 'cache:invalidate'
+
+# 订阅连接中断后重连的间隔（秒）
+RECONNECT_DELAY = 5
+
+# 本进程的标识，收到自己发布的消息时跳过（本地已失效）
+_origin = uuid.uuid4().hex
+
+# 失效类型 -> 本地失效函数（参数为ID列表）
+_handlers: Dict[str, Callable[[List[Any]], None]] = {}
+
+_lock = threading.Lock()
+_redis = None
+
+def register(kind: str, handler: Callable[[List[Any]], None]):
+    """登记某类缓存的本地失效函数"""
+    _handlers[kind] = handler
+
+def invalidate(kind: str, ids: Iterable[Any]):
+    """使本进程的缓存失效，配置了 Redis 时广播给其他进程"""
+    ids = list(ids)
+    if not ids:
+        return
+    _handlers[kind](ids)
+
+    client = _redis
+    if client is None:
+        return
+    try:
+        client.publish(CHANNEL, json.dumps({'origin': _origin, 'kind': kind, 'ids': ids}))
+    except Exception as e:
+        logger.error(f"广播缓存失效失败（其他进程在缓存有效期后生效）: {kind} {e}")
+
+def _apply(raw: str):
+    """执行其他进程发布的失效"""
+    message = json.loads(raw)
+    if message.get('origin') == _origin:
+        return
+    handler = _handlers.get(message.get('kind'))
+    if handler:
+        handler(message.get('ids') or [])
+
+def _listen(client):
+    while True:
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CHANNEL)
+            for message in pubsub.listen():
+                try:
+                    _apply(message['data'])
+                except Exception as e:
+                    logger.error(f"处理缓存失效消息失败: {e}")
+        except Exception as e:
+            logger.error(f"缓存失效订阅中断，{RECONNECT_DELAY} 秒后重连: {e}")
+            time.sleep(RECONNECT_DELAY)
+
+def start_listener(url: str):
+    """连接 Redis：之后的失效会广播给其他进程，并启动后台线程接收其他进程的失效"""
+    global _redis
+    if redis is None:
+        raise RuntimeError('跨进程缓存失效需要安装 redis 包')
+    with _lock:
+        if _redis is not None:
+            return None
+        _redis = redis.Redis.from_url(url, decode_responses=True)
+
+    thread = threading.Thread(target=_listen, args=(_redis,), name='cache-invalidation', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+个性化内容选择
+为每个模块的学习内容预先计算特征（难度、适用年级、文本二元组），
+按学生档案（年级、薄弱环节、难度偏好）打分，用堆取前 k 条，
+并按档案分桶缓存选择结果
+"""
+import heapq
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+from models import StudyModule, StudyContent
+from services.module_content_cache import get_module_content_cache
+
+# 默认返回的内容条数
+DEFAULT_TOP_K = 5
+
+# 打分权重：薄弱环节匹配、难度接近、年级接近
+AREA_WEIGHT = 0.5
+DIFFICULTY_WEIGHT = 0.3
+GRADE_WEIGHT = 0.2
+
+# 参与文本匹配的正文长度
+FEATURE_TEXT_LENGTH = 300
+
+# 最多缓存的档案分桶结果数
+MAX_CACHED_BUCKETS = 2048
+
+DIFFICULTY_LEVELS = {
+    'easy': 1, '简单': 1, '基础': 1,
+    'medium': 2, '中等': 2, '适中': 2,
+    'hard': 3, '困难': 3, '提高': 3
+}
+DIFFICULTY_LABELS = {1: 'easy', 2: 'medium', 3: 'hard'}
+
+CHINESE_NUMBERS = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+
+def grade_level(grade) -> Optional[int]:
+    """年级转换为 1-12 的数值：一年级~六年级为 1-6，初一~初三为 7-9，高一~高三为 10-12"""
+    if grade is None:
+        return None
+    if isinstance(grade, int):
+        return grade if 1 <= grade <= 12 else None
+
+    text = str(grade).strip()
+    digits = re.search(r'\d+', text)
+    number = int(digits.group()) if digits else next(
+        (value for char, value in CHINESE_NUMBERS.items() if char in text), None
+    )
+    if number is None:
+        return None
+    if text.startswith('初') or '初中' in text:
+        return 6 + number if number <= 3 else None
+    if text.startswith('高') or '高中' in text:
+        return 9 + number if number <= 3 else None
+    return number if 1 <= number <= 12 else None
+
+def difficulty_level(value, default: int = 2) -> int:
+    """难度转换为 1-3"""
+    if isinstance(value, int):
+        return min(max(value, 1), 3)
+    if isinstance(value, str):
+        return DIFFICULTY_LEVELS.get(value.strip().lower(), default)
+    return default
+
+def _bigrams(text: str) -> frozenset:
+    """文本的字符二元组（忽略空白和标点）"""
+    chars = [char for char in text if char.isalnum()]
+    if len(chars) == 1:
+        return frozenset(chars)
+    return frozenset(chars[i] + chars[i + 1] for i in range(len(chars) - 1))
+
+class ContentFeatures:
+    """一条学习内容的特征"""
+
+    __slots__ = ('id', 'content_type', 'title', 'content', 'order_index',
+                 'difficulty', 'grade', 'tags', 'terms')
+
+    def __init__(self, content: StudyContent, module_difficulty: int):
+        self.id = content.id
+        self.content_type = content.content_type
+        self.title = content.title
+        self.content = content.content
+        self.order_index = content.order_index or 0
+        self.difficulty = difficulty_level(content.difficulty, difficulty_level(module_difficulty))
+        self.grade = grade_level(content.grade)
+        self.tags = frozenset(tag.strip() for tag in (content.tags or '').split(',') if tag.strip())
+        self.terms = _bigrams(' '.join([content.title, *self.tags, (content.content or '')[:FEATURE_TEXT_LENGTH]]))
+
+class ProfileBucket:
+    """归一化后的学生档案，作为缓存键"""
+
+    def __init__(self, user_profile: Dict[str, Any]):
+        self.grade = grade_level(user_profile.get('grade'))
+        self.difficulty = difficulty_level(user_profile.get('difficultyPreference'))
+
+        weak_areas = user_profile.get('weakAreas') or []
+        if isinstance(weak_areas, str):
+            weak_areas = weak_areas.split(',')
+        self.weak_areas = tuple(sorted({str(area).strip() for area in weak_areas if str(area).strip()}))[:10]
+        self.area_terms = [(area, _bigrams(area)) for area in self.weak_areas]
+
+    def key(self) -> Tuple:
+        return (self.grade, self.difficulty, self.weak_areas)
+
+    def score(self, features: ContentFeatures) -> Tuple[float, List[str]]:
+        """内容与档案的匹配分数（0-1）及命中的薄弱环节"""
+        matched = []
+        area_score = 0.0
+        for area, terms in self.area_terms:
+            if area in features.tags:
+                coverage = 1.0
+            elif terms:
+                coverage = len(terms & features.terms) / len(terms)
+            else:
+                coverage = 0.0
+            if coverage >= 0.5:
+                matched.append(area)
+            area_score += coverage
+        if self.area_terms:
+            area_score /= len(self.area_terms)
+
+        difficulty_score = 1 - abs(features.difficulty - self.difficulty) / 2
+
+        if self.grade is None or features.grade is None:
+            grade_score = 0.5
+        else:
+            grade_score = 1 - min(abs(features.grade - self.grade), 3) / 3
+
+        score = AREA_WEIGHT * area_score + DIFFICULTY_WEIGHT * difficulty_score + GRADE_WEIGHT * grade_score
+        return score, matched
+
+class ContentSelector:
+    """个性化内容选择器
+
+    模块内容特征按模块内容缓存的版本号缓存，内容有写入提交后自动重建
+    """
+
+    def __init__(self, max_buckets: int = MAX_CACHED_BUCKETS):
+        self._lock = threading.Lock()
+        self._features: Dict[str, Tuple[int, List[ContentFeatures]]] = {}
+        self._results: "OrderedDict[Tuple, List[Dict[str, Any]]]" = OrderedDict()
+        self._max_buckets = max_buckets
+
+    def _module_features(self, module: StudyModule) -> List[ContentFeatures]:
+        """获取模块当前版本的内容特征"""
+        version = get_module_content_cache().version(module.module_id)
+        cached = self._features.get(module.module_id)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        contents = StudyContent.query.filter_by(
+            module_id=module.module_id,
+            is_active=True
+        ).order_by(StudyContent.order_index).all()
+        features = [ContentFeatures(content, module.difficulty) for content in contents]
+
+        with self._lock:
+            self._features[module.module_id] = (version, features)
+        return features
+
+    def select(self, module: StudyModule, user_profile: Dict[str, Any], k: int = DEFAULT_TOP_K) -> List[Dict[str, Any]]:
+        """选出与档案最匹配的 k 条内容（返回的列表来自缓存，调用方不要修改）"""
+        bucket = ProfileBucket(user_profile)
+        version = get_module_content_cache().version(module.module_id)
+        cache_key = (module.module_id, version, k, bucket.key())
+
+        with self._lock:
+            cached = self._results.get(cache_key)
+            if cached is not None:
+                self._results.move_to_end(cache_key)
+                return cached
+
+        # 分数相同时按原有顺序
+        scored = (
+            (*bucket.score(features), -features.order_index, features)
+            for features in self._module_features(module)
+        )
+        top = heapq.nlargest(k, scored, key=lambda item: (item[0], item[2]))
+
+        result = [
+            {
+                'id': features.id,
+                'type': features.content_type,
+                'title': features.title,
+                'content': features.content,
+                'order': features.order_index,
+                'difficulty': DIFFICULTY_LABELS[features.difficulty],
+                'score': round(score, 3),
+                'matched_areas': matched
+            }
+            for score, matched, _, features in top
+        ]
+
+        with self._lock:
+            self._results[cache_key] = result
+            while len(self._results) > self._max_buckets:
+                self._results.popitem(last=False)
+        return result
+
+# 全局内容选择器实例
+content_selector = ContentSelector()
+
+def get_content_selector() -> ContentSelector:
+    """获取内容选择器实例"""
+    return content_selector
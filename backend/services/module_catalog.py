@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学习模块目录缓存
+在进程内缓存学习模块列表及其序列化结果，模块有增删改时自动失效
+"""
+import threading
+from typing import Dict, Any, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import StudyModule
+from responses import to_json_bytes, make_etag
+
+# 主要模块（16个细分模块）
+MAIN_MODULE_IDS = [
+    # 基础能力训练 (4个)
+    'word-foundation', 'grammar-rules', 'grammar-foundation', 'classical-foundation',
+    # 阅读理解训练 (9个)
+    'modern-text', 'narrative-text', 'novel', 'argumentative', 'expository',
+    'poetry', 'prose', 'classical-prose', 'non-continuous',
+    # 写作表达训练 (3个)
+    'proposition-writing', 'semi-proposition', 'ai-writing-assistant'
+]
+
+# 模块分类
+MODULE_CATEGORIES = ['basic', 'reading', 'writing', 'speaking', 'knowledge']
+
+def module_to_dict(module: StudyModule) -> Dict[str, Any]:
+    """学习模块转换为接口返回格式"""
+    return {
+        'id': module.module_id,
+        'title': module.title,
+        'text': module.title,
+        'description': module.description,
+        'icon': module.icon,
+        'category': module.category,
+        'difficulty': module.difficulty
+    }
+
+class CatalogEntry:
+    """某一版本的模块目录"""
+
+    def __init__(self, version: int, modules: Dict[str, Dict[str, Any]], payload: Dict[str, Any], body: bytes):
+        self.version = version
+        self.modules = modules
+        self.payload = payload
+        self.body = body
+        self.etag = make_etag(body)
+
+class ModuleCatalog:
+    """学习模块目录缓存
+
+    第一次访问时查询一次数据库并构建完整响应，之后直接返回缓存。
+    学习模块有写入提交时版本号加一，下次访问重新构建
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entry: Optional[CatalogEntry] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self):
+        """使缓存失效"""
+        with self._lock:
+            self._version += 1
+            self._entry = None
+
+    def get(self) -> CatalogEntry:
+        """获取当前版本的模块目录"""
+        entry = self._entry
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            if self._entry is None:
+                self._entry = self._build(self._version)
+            return self._entry
+
+    @staticmethod
+    def _build(version: int) -> CatalogEntry:
+        """查询所有活跃模块并构建响应"""
+        all_modules = StudyModule.query.filter_by(is_active=True).order_by(StudyModule.difficulty).all()
+        module_dicts = [module_to_dict(module) for module in all_modules]
+
+        # 按类别分组
+        modules_by_category = {category: [] for category in MODULE_CATEGORIES}
+        for module in module_dicts:
+            if module['category'] in modules_by_category:
+                modules_by_category[module['category']].append(module)
+
+        modules = {module['id']: module for module in module_dicts}
+        payload = {
+            'allModules': module_dicts,
+            'byCategory': modules_by_category,
+            'mainModules': [modules[module_id] for module_id in MAIN_MODULE_IDS if module_id in modules]
+        }
+
+        return CatalogEntry(version, modules, payload, to_json_bytes(payload))
+
+# 全局模块目录实例
+module_catalog = ModuleCatalog()
+
+def get_module_catalog() -> ModuleCatalog:
+    """获取模块目录实例"""
+    return module_catalog
+
+# ==================== 会话提交钩子 ====================
+
+@event.listens_for(Session, 'after_flush')
+def _collect_module_changes(session, flush_context):
+    """记录本次事务中是否写入了学习模块"""
+    for objects in (session.new, session.dirty, session.deleted):
+        if any(isinstance(obj, StudyModule) for obj in objects):
+            session.info['study_modules_changed'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    """学习模块写入提交后使缓存失效"""
+    if session.info.pop('study_modules_changed', False):
+        module_catalog.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_module_changes(session):
+    """事务回滚时丢弃记录"""
+    session.info.pop('study_modules_changed', None)
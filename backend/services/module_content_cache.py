@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模块内容缓存
+按 (模块ID, 版本) 缓存模块的学习内容及其序列化结果和 ETag，
+学习内容或学习模块有写入提交时对应模块的版本号加一，
+配置了 Redis 时经 cache_invalidation 通知其他进程
+"""
+import threading
+from typing import Dict, List, Any, Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import StudyModule, StudyContent
+from responses import to_json_bytes, make_etag
+from services import cache_invalidation
+
+class ModuleContentEntry:
+    """某一版本的模块内容
+
+    list_body 对应 /api/module/<id>/content 的响应，
+    detail_body 对应内容权限接口中带模块信息的响应（模块不存在时为 None）
+    """
+
+    def __init__(self, module_id: str, version: int, module: Optional[Dict[str, Any]], contents: List[Dict[str, Any]]):
+        self.module_id = module_id
+        self.version = version
+        self.module = module
+        self.contents = contents
+
+        self.list_body = to_json_bytes([
+            {
+                'id': content['id'],
+                'type': content['content_type'],
+                'title': content['title'],
+                'content': content['content'],
+                'order': content['order_index']
+            }
+            for content in contents
+        ])
+        self.list_etag = make_etag(self.list_body)
+
+        self.detail_body = None
+        self.detail_etag = None
+        if module is not None:
+            self.detail_body = to_json_bytes({
+                'success': True,
+                'module': module,
+                'contents': contents,
+                'total_contents': len(contents)
+            })
+            self.detail_etag = make_etag(self.detail_body)
+
+class ModuleContentCache:
+    """模块内容缓存
+
+    只缓存存在的模块，避免任意模块ID占用内存
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._entries: Dict[str, ModuleContentEntry] = {}
+
+    def version(self, module_id: str) -> int:
+        return self._versions.get(module_id, 0)
+
+    def invalidate(self, module_ids):
+        """使指定模块的缓存失效"""
+        with self._lock:
+            for module_id in module_ids:
+                self._versions[module_id] = self._versions.get(module_id, 0) + 1
+                self._entries.pop(module_id, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for module_id in list(self._entries):
+                self._versions[module_id] = self._versions.get(module_id, 0) + 1
+            self._entries.clear()
+
+    def get(self, module_id: str) -> ModuleContentEntry:
+        """获取当前版本的模块内容"""
+        entry = self._entries.get(module_id)
+        if entry is not None and entry.version == self.version(module_id):
+            return entry
+
+        with self._lock:
+            version = self.version(module_id)
+            entry = self._entries.get(module_id)
+            if entry is None or entry.version != version:
+                entry = self._build(module_id, version)
+                if entry.module is not None:
+                    self._entries[module_id] = entry
+            return entry
+
+    @staticmethod
+    def _build(module_id: str, version: int) -> ModuleContentEntry:
+        """查询模块信息和启用的学习内容"""
+        module = StudyModule.query.get(module_id)
+        contents = StudyContent.query.filter_by(
+            module_id=module_id,
+            is_active=True
+        ).order_by(StudyContent.order_index).all()
+
+        module_data = None
+        if module is not None:
+            module_data = {
+                'id': module.module_id,
+                'title': module.title,
+                'description': module.description,
+                'category': module.category,
+                'difficulty': module.difficulty
+            }
+
+        content_list = [
+            {
+                'id': content.id,
+                'title': content.title,
+                'content_type': content.content_type,
+                'content': content.content,
+                'order_index': content.order_index
+            }
+            for content in contents
+        ]
+
+        return ModuleContentEntry(module_id, version, module_data, content_list)
+
+# 全局模块内容缓存实例
+module_content_cache = ModuleContentCache()
+
+def get_module_content_cache() -> ModuleContentCache:
+    """获取模块内容缓存实例"""
+    return module_content_cache
+
+cache_invalidation.register('module_content', module_content_cache.invalidate)
+
+# ==================== 会话提交钩子 ====================
+
+@event.listens_for(Session, 'after_flush')
+def _collect_content_changes(session, flush_context):
+    """记录本次事务中学习内容或学习模块有变化的模块ID"""
+    changed = session.info.setdefault('changed_content_modules', set())
+    for objects in (session.new, session.dirty, session.deleted):
+        for obj in objects:
+            if isinstance(obj, (StudyContent, StudyModule)):
+                changed.add(obj.module_id)
+                # 学习内容移动到其他模块时，原模块同样需要失效
+                changed.update(inspect(obj).attrs.module_id.history.deleted or ())
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_content(session):
+    """学习内容写入提交后使对应模块的缓存失效"""
+    changed = session.info.pop('changed_content_modules', None)
+    if changed:
+        cache_invalidation.invalidate('module_content', changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_content_changes(session):
+    """事务回滚时丢弃记录"""
+    session.info.pop('changed_content_modules', None)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户权限缓存
+在进程内缓存每个用户可访问的模块ID集合以及序列化后的模块列表，
+权限授予/撤销时需要调用 invalidate_user_permissions 使对应用户的缓存和权限矩阵失效，
+配置了 Redis 时失效经 cache_invalidation 广播到其他进程。
+缓存项另有 CACHE_TTL 秒的有效期，广播丢失时作为兜底
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Iterable, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import User, UserModulePermission
+from services import cache_invalidation
+from services.module_catalog import get_module_catalog, MAIN_MODULE_IDS, MODULE_CATEGORIES
+from services.permission_matrix import get_permission_matrix
+from services.recommendation_engine import get_recommendation_engine
+
+# 常见的用户名变体（如 student01 -> student1）
+USERNAME_ALIASES = {
+    'student01': 'student1',
+    'student02': 'student2',
+    'teacher01': 'teacher1',
+    'teacher02': 'teacher2'
+}
+
+# 最多缓存的用户数
+MAX_CACHED_USERS = 10000
+
+# 缓存项的有效期（秒）
+CACHE_TTL = 30
+
+# 拥有全部模块权限的用户类型
+FULL_ACCESS_USER_TYPES = ('admin', 'teacher')
+
+class UserPermissions:
+    """某个用户的有效权限"""
+
+    def __init__(self, user: User, module_ids: frozenset, catalog_version: int, modules: List[Dict[str, Any]]):
+        self.user_id = user.id
+        self.username = user.username
+        self.nickname = user.nickname
+        self.user_type = user.user_type
+        self.catalog_version = catalog_version
+        self.loaded_at = time.monotonic()
+
+        # 权限表中的模块ID（学生）或全部活跃模块ID（管理员和教师）
+        self.module_ids = module_ids
+
+        # get_user_study_content 的完整响应
+        modules_by_category = {category: [] for category in MODULE_CATEGORIES}
+        for module in modules:
+            if module['category'] in modules_by_category:
+                modules_by_category[module['category']].append(module)
+
+        self.content = {
+            'allModules': modules,
+            'byCategory': modules_by_category,
+            'mainModules': [m for m in modules if m['id'] in MAIN_MODULE_IDS],
+            'user': {
+                'username': user.username,
+                'nickname': user.nickname,
+                'user_type': user.user_type
+            }
+        }
+
+    @property
+    def allowed_modules(self) -> List[str]:
+        """登录接口返回的可访问模块ID列表"""
+        return sorted(self.module_ids)
+
+class PermissionCache:
+    """用户权限缓存
+
+    按用户ID缓存 UserPermissions，并记录用户名到用户ID的映射。
+    模块目录版本变化或超过有效期后缓存项视为过期
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED_USERS, ttl: float = CACHE_TTL):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, UserPermissions]" = OrderedDict()
+        self._usernames: Dict[str, int] = {}
+        self._max_size = max_size
+        self._ttl = ttl
+        # 每次失效加一；读取权限期间发生过失效时，读到的结果可能已过期，不写入缓存
+        self._generation = 0
+
+    def get_by_username(self, username: str) -> Optional[UserPermissions]:
+        """按用户名（支持常见变体）获取有效权限，用户不存在或已禁用时返回 None"""
+        for candidate in (username, USERNAME_ALIASES.get(username)):
+            if not candidate:
+                continue
+
+            user_id = self._usernames.get(candidate)
+            if user_id is not None:
+                entry = self._get_fresh(user_id)
+                if entry:
+                    return entry
+
+            user = User.query.filter_by(username=candidate, is_active=True).first()
+            if user:
+                return self.get_for_user(user)
+
+        return None
+
+    def get_for_user(self, user: User) -> UserPermissions:
+        """获取已加载用户的有效权限"""
+        entry = self._get_fresh(user.id)
+        if entry:
+            return entry
+
+        generation = self._generation
+        catalog = get_module_catalog().get()
+        if user.user_type in FULL_ACCESS_USER_TYPES:
+            module_ids = frozenset(catalog.modules)
+            modules = list(catalog.payload['allModules'])
+        else:
+            module_ids = frozenset(get_permission_matrix().get_module_ids(user.id))
+            # 只返回仍处于启用状态的模块，顺序与模块目录一致
+            modules = [m for m in catalog.payload['allModules'] if m['id'] in module_ids]
+
+        entry = UserPermissions(user, module_ids, catalog.version, modules)
+        with self._lock:
+            if self._generation != generation:
+                return entry
+            self._entries[user.id] = entry
+            self._entries.move_to_end(user.id)
+            self._usernames[user.username] = user.id
+            while len(self._entries) > self._max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._usernames.pop(evicted.username, None)
+        return entry
+
+    def _get_fresh(self, user_id: int) -> Optional[UserPermissions]:
+        """获取未过期的缓存项"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry.catalog_version != get_module_catalog().version or \
+                    time.monotonic() - entry.loaded_at > self._ttl:
+                del self._entries[user_id]
+                self._usernames.pop(entry.username, None)
+                return None
+            self._entries.move_to_end(user_id)
+            return entry
+
+    def invalidate(self, user_ids: Iterable[int]):
+        """使指定用户的缓存失效"""
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                entry = self._entries.pop(user_id, None)
+                if entry:
+                    self._usernames.pop(entry.username, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._usernames.clear()
+
+# 全局权限缓存实例
+permission_cache = PermissionCache()
+
+def get_permission_cache() -> PermissionCache:
+    """获取权限缓存实例"""
+    return permission_cache
+
+def _invalidate_local(user_ids: List[int]):
+    """使本进程中指定用户的权限缓存、权限矩阵行和推荐失效"""
+    permission_cache.invalidate(user_ids)
+    get_permission_matrix().invalidate(user_ids)
+    get_recommendation_engine().invalidate(user_ids)
+
+cache_invalidation.register('permissions', _invalidate_local)
+
+def invalidate_user_permissions(user_ids: Iterable[int]):
+    """用户权限发生变化后调用（授予、撤销、批量授予），同时通知其他进程"""
+    cache_invalidation.invalidate('permissions', user_ids)
+
+# ==================== 会话提交钩子 ====================
+
+@event.listens_for(Session, 'after_flush')
+def _collect_user_changes(session, flush_context):
+    """记录本次事务中新增或修改的用户（禁用、改名、改类型等）以及权限记录有变化的用户"""
+    changed = session.info.setdefault('changed_user_ids', set())
+    for objects in (session.new, session.dirty, session.deleted):
+        for obj in objects:
+            if isinstance(obj, User):
+                changed.add(obj.id)
+            elif isinstance(obj, UserModulePermission):
+                changed.add(obj.user_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    """用户信息写入提交后使对应缓存失效"""
+    changed = session.info.pop('changed_user_ids', None)
+    if changed:
+        invalidate_user_permissions(changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_user_changes(session):
+    """事务回滚时丢弃记录"""
+    session.info.pop('changed_user_ids', None)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学生 × 模块权限矩阵
+把 user_module_permissions 表加载为内存中的位图：
+- 行：每个用户一个整数位图，第 i 位表示是否拥有第 i 个模块
+- 列：每个模块一个整数位图，第 j 位表示第 j 个用户是否拥有该模块
+单个权限检查是一次位运算，“哪些学生拥有模块X”“哪些学生缺少某些模块”
+之类的全校查询是几次大整数位运算
+
+矩阵只保存在本进程中，其他进程上的权限变化经 cache_invalidation 广播后标记
+（见 permission_cache），广播丢失时在后台定期整体重新加载（start_periodic_reload）
+时生效。因此矩阵用于统计、推荐等允许短暂滞后的场景，访问控制以数据库为准
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Iterable, Set, Tuple
+import async_support
+from extensions import db
+from models import User, UserModulePermission
+
+logger = logging.getLogger(__name__)
+
+# 整体替换矩阵时交换的字段
+_STATE_FIELDS = ('_module_bits', '_modules', '_user_bits', '_users', '_rows', '_columns', '_students')
+
+def _iter_bits(mask: int):
+    """依次返回位图中为 1 的位置"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def _mask(bits: Iterable[int]) -> int:
+    """由位置列表构造位图，一次构造，避免逐位或运算反复复制大整数"""
+    bits = list(bits)
+    if not bits:
+        return 0
+    buffer = bytearray(max(bits) // 8 + 1)
+    for bit in bits:
+        buffer[bit >> 3] |= 1 << (bit & 7)
+    return int.from_bytes(buffer, 'little')
+
+class PermissionMatrix:
+    """权限位图矩阵
+
+    首次使用时从数据库加载。权限或用户变化后调用 invalidate 标记相关用户，
+    下一次读取时用一次查询重新加载这些用户的行；refresh 在调用方线程中加载
+    一份新矩阵后整体替换，加载期间的读取继续使用旧矩阵
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._stale_users: Set[int] = set()
+        self._reset()
+
+    def _reset(self):
+        # 模块ID与位序号的映射
+        self._module_bits: Dict[str, int] = {}
+        self._modules: List[str] = []
+        # 用户ID与位序号的映射
+        self._user_bits: Dict[int, int] = {}
+        self._users: List[int] = []
+        # 行位图、列位图和学生位图
+        self._rows: Dict[int, int] = {}
+        self._columns: List[int] = []
+        self._students = 0
+
+    # ==================== 加载与更新 ====================
+
+    def _module_bit(self, module_id: str) -> int:
+        bit = self._module_bits.get(module_id)
+        if bit is None:
+            bit = len(self._modules)
+            self._module_bits[module_id] = bit
+            self._modules.append(module_id)
+            self._columns.append(0)
+        return bit
+
+    def _user_bit(self, user_id: int) -> int:
+        bit = self._user_bits.get(user_id)
+        if bit is None:
+            bit = len(self._users)
+            self._user_bits[user_id] = bit
+            self._users.append(user_id)
+        return bit
+
+    def _load_rows(self, user_ids=None):
+        """从数据库加载用户行，user_ids 为空时加载全部"""
+        permission_query = db.session.query(UserModulePermission.user_id, UserModulePermission.module_id)
+        student_query = db.session.query(User.id).filter_by(user_type='student', is_active=True)
+        if user_ids is not None:
+            permission_query = permission_query.filter(UserModulePermission.user_id.in_(user_ids))
+            student_query = student_query.filter(User.id.in_(user_ids))
+
+        rows: Dict[int, List[str]] = {user_id: [] for user_id in (user_ids or [])}
+        for user_id, module_id in permission_query:
+            rows.setdefault(user_id, []).append(module_id)
+        students = {user_id for (user_id,) in student_query}
+        for user_id in students:
+            rows.setdefault(user_id, [])
+
+        # 替换这些用户的整行权限：先按模块汇总清除和设置的用户位，每个列位图只重建一次
+        cleared: Dict[int, List[int]] = {}
+        added: Dict[int, List[int]] = {}
+        loaded_bits = []
+        for user_id, module_ids in rows.items():
+            user_bit = self._user_bit(user_id)
+            loaded_bits.append(user_bit)
+            for module_bit in _iter_bits(self._rows.pop(user_id, 0)):
+                cleared.setdefault(module_bit, []).append(user_bit)
+            row = 0
+            for module_id in module_ids:
+                module_bit = self._module_bit(module_id)
+                row |= 1 << module_bit
+                added.setdefault(module_bit, []).append(user_bit)
+            if row:
+                self._rows[user_id] = row
+
+        for module_bit in cleared.keys() | added.keys():
+            column = self._columns[module_bit] & ~_mask(cleared.get(module_bit, ()))
+            self._columns[module_bit] = column | _mask(added.get(module_bit, ()))
+        student_bits = _mask(self._user_bits[user_id] for user_id in students)
+        self._students = (self._students & ~_mask(loaded_bits)) | student_bits
+
+    def _ensure_fresh(self):
+        """读取前确保矩阵已加载，并刷新被标记的用户"""
+        if not self._loaded:
+            self._reset()
+            self._stale_users.clear()
+            self._load_rows()
+            self._loaded = True
+        elif self._stale_users:
+            stale = list(self._stale_users)
+            self._stale_users.clear()
+            self._load_rows(stale)
+
+    def invalidate(self, user_ids: Iterable[int]):
+        """标记需要重新加载的用户"""
+        with self._lock:
+            self._stale_users.update(user_ids)
+
+    def reload(self):
+        """下次读取时重新加载整个矩阵"""
+        with self._lock:
+            self._loaded = False
+
+    def refresh(self):
+        """重新加载整个矩阵后整体替换（需要在应用上下文中调用，加载时不持有锁）"""
+        fresh = PermissionMatrix()
+        fresh._load_rows()
+        with self._lock:
+            # 加载期间标记的用户仍留在 _stale_users 中，下次读取时按新矩阵重新加载其行
+            for name in _STATE_FIELDS:
+                setattr(self, name, getattr(fresh, name))
+            self._loaded = True
+
+    # ==================== 查询 ====================
+
+    def has_permission(self, user_id: int, module_id: str) -> bool:
+        """用户是否拥有模块权限"""
+        with self._lock:
+            self._ensure_fresh()
+            bit = self._module_bits.get(module_id)
+            return bit is not None and bool(self._rows.get(user_id, 0) >> bit & 1)
+
+    def get_module_ids(self, user_id: int) -> Set[str]:
+        """用户拥有权限的模块ID"""
+        with self._lock:
+            self._ensure_fresh()
+            return {self._modules[bit] for bit in _iter_bits(self._rows.get(user_id, 0))}
+
+    def _module_mask(self, module_ids: Iterable[str]) -> List[int]:
+        """模块ID对应的列位图，未知模块视为无人拥有"""
+        return [self._columns[self._module_bits[m]] if m in self._module_bits else 0 for m in module_ids]
+
+    def _decode_users(self, mask: int) -> List[int]:
+        return sorted(self._users[bit] for bit in _iter_bits(mask))
+
+    def students_with_module(self, module_id: str) -> List[int]:
+        """拥有指定模块的学生ID"""
+        with self._lock:
+            self._ensure_fresh()
+            columns = self._module_mask([module_id])
+            return self._decode_users(columns[0] & self._students)
+
+    def students_with_all(self, module_ids: Iterable[str]) -> List[int]:
+        """拥有全部指定模块的学生ID"""
+        with self._lock:
+            self._ensure_fresh()
+            mask = self._students
+            for column in self._module_mask(module_ids):
+                mask &= column
+            return self._decode_users(mask)
+
+    def students_missing_any(self, module_ids: Iterable[str]) -> List[int]:
+        """缺少任意一个指定模块的学生ID"""
+        with self._lock:
+            self._ensure_fresh()
+            has_all = self._students
+            for column in self._module_mask(module_ids):
+                has_all &= column
+            return self._decode_users(self._students & ~has_all)
+
+    def module_student_counts(self) -> Dict[str, int]:
+        """每个模块拥有权限的学生数"""
+        with self._lock:
+            self._ensure_fresh()
+            return {
+                module_id: bin(self._columns[bit] & self._students).count('1')
+                for module_id, bit in self._module_bits.items()
+            }
+
+    def student_ids(self) -> List[int]:
+        """全部在读学生ID"""
+        with self._lock:
+            self._ensure_fresh()
+            return self._decode_users(self._students)
+
+    def co_enrollment(self, module_ids: List[str]) -> Dict[Tuple[str, str], int]:
+        """同时拥有两个模块的学生数，键为 (模块A, 模块B)，A 与 B 相同时为拥有该模块的学生数"""
+        with self._lock:
+            self._ensure_fresh()
+            columns = [column & self._students for column in self._module_mask(module_ids)]
+            counts = {}
+            for i, first in enumerate(module_ids):
+                for j in range(i, len(module_ids)):
+                    count = bin(columns[i] & columns[j]).count('1')
+                    counts[(first, module_ids[j])] = counts[(module_ids[j], first)] = count
+            return counts
+
+    def get_stats(self) -> Dict[str, int]:
+        """矩阵统计信息"""
+        with self._lock:
+            self._ensure_fresh()
+            return {
+                'users': len(self._users),
+                'students': bin(self._students).count('1'),
+                'modules': len(self._modules),
+                'permissions': sum(bin(row).count('1') for row in self._rows.values())
+            }
+
+# 全局权限矩阵实例
+permission_matrix = PermissionMatrix()
+
+def get_permission_matrix() -> PermissionMatrix:
+    """获取权限矩阵实例"""
+    return permission_matrix
+
+def start_periodic_reload(app, interval: int):
+    """启动后台线程，每隔 interval 秒整体重新加载一次权限矩阵，使其他进程上的权限变化生效"""
+    def _refresh():
+        with app.app_context():
+            try:
+                permission_matrix.refresh()
+            except Exception as e:
+                logger.error(f"权限矩阵重新加载失败: {e}")
+            finally:
+                db.session.remove()
+
+    def _run():
+        while True:
+            time.sleep(interval)
+            # 协作式异步模式下这里是协程，加载放到线程池中执行，避免阻塞事件循环
+            async_support.run_blocking(_refresh)
+
+    thread = threading.Thread(target=_run, name='permission-matrix-reload', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+权限服务模块
+以集合运算批量处理学生模块权限，避免按 (学生, 模块) 逐对查询
+"""
+from itertools import product
+from typing import Dict, List, Any, Iterable, Set, Tuple
+from sqlalchemy import delete, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models import User, StudyModule, UserModulePermission, PermissionTemplate
+
+def _insert_ignore_duplicates(table):
+    """按数据库方言构造“重复则跳过”的 INSERT"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect == 'mysql':
+        return insert(table).prefix_with('IGNORE')
+    return insert(table)
+
+class PermissionService:
+    """权限服务类"""
+
+    @staticmethod
+    def resolve_students(student_ids: Iterable[int] = None, grade: str = None, class_name: str = None) -> List[int]:
+        """一次查询解析目标学生：指定的学生ID，或某个年级/班级的全部在读学生"""
+        if student_ids is None and not grade and not class_name:
+            return []
+
+        query = db.session.query(User.id).filter(User.user_type == 'student')
+        if student_ids is not None:
+            student_ids = set(student_ids)
+            if not student_ids:
+                return []
+            query = query.filter(User.id.in_(student_ids))
+        else:
+            query = query.filter(User.is_active == True)
+        if grade:
+            query = query.filter(User.grade == grade)
+        if class_name:
+            query = query.filter(User.class_name == class_name)
+
+        return [user_id for (user_id,) in query.order_by(User.id)]
+
+    @staticmethod
+    def valid_student_ids(student_ids: Iterable[int]) -> Set[int]:
+        """一次查询过滤出存在的学生ID"""
+        student_ids = set(student_ids)
+        if not student_ids:
+            return set()
+        return {
+            user_id for (user_id,) in
+            db.session.query(User.id).filter(User.id.in_(student_ids), User.user_type == 'student')
+        }
+
+    @staticmethod
+    def valid_module_ids(module_ids: Iterable[str]) -> Set[str]:
+        """一次查询过滤出存在的模块ID"""
+        module_ids = set(module_ids)
+        if not module_ids:
+            return set()
+        return {
+            module_id for (module_id,) in
+            db.session.query(StudyModule.module_id).filter(StudyModule.module_id.in_(module_ids))
+        }
+
+    @staticmethod
+    def existing_pairs(student_ids: Iterable[int], module_ids: Iterable[str]) -> Set[Tuple[int, str]]:
+        """一次查询已有的 (学生, 模块) 权限"""
+        student_ids, module_ids = list(student_ids), list(module_ids)
+        if not student_ids or not module_ids:
+            return set()
+        return set(
+            db.session.query(UserModulePermission.user_id, UserModulePermission.module_id).filter(
+                UserModulePermission.user_id.in_(student_ids),
+                UserModulePermission.module_id.in_(module_ids)
+            )
+        )
+
+    @staticmethod
+    def insert_pairs(pairs: Iterable[Tuple[int, str]], granted_by: int):
+        """一条批量 INSERT 写入权限，已存在的 (学生, 模块) 由数据库跳过
+
+        不提交事务，由调用方提交
+        """
+        rows = [
+            {'user_id': user_id, 'module_id': module_id, 'granted_by': granted_by}
+            for user_id, module_id in pairs
+        ]
+        if rows:
+            db.session.execute(_insert_ignore_duplicates(UserModulePermission.__table__), rows)
+
+    @staticmethod
+    def grant(student_ids: List[int], module_ids: List[str], granted_by: int) -> Dict[str, Any]:
+        """批量授予权限（不提交事务）
+
+        无论学生和模块多少，都只执行三次查询和一次批量写入。
+        返回每一对 (学生, 模块) 的处理结果
+        """
+        student_ids = list(dict.fromkeys(student_ids))
+        module_ids = list(dict.fromkeys(module_ids))
+
+        valid_students = PermissionService.valid_student_ids(student_ids)
+        valid_modules = PermissionService.valid_module_ids(module_ids)
+        existing = PermissionService.existing_pairs(valid_students, valid_modules)
+
+        missing = [
+            (student_id, module_id) for student_id, module_id in product(student_ids, module_ids)
+            if student_id in valid_students and module_id in valid_modules
+            and (student_id, module_id) not in existing
+        ]
+        PermissionService.insert_pairs(missing, granted_by)
+
+        results = []
+        for student_id, module_id in product(student_ids, module_ids):
+            if student_id not in valid_students:
+                status, message = 'error', '学生不存在'
+            elif module_id not in valid_modules:
+                status, message = 'error', '学习模块不存在'
+            elif (student_id, module_id) in existing:
+                status, message = 'skipped', '权限已存在'
+            else:
+                status, message = 'success', '权限授予成功'
+            results.append({
+                'student_id': student_id,
+                'module_id': module_id,
+                'status': status,
+                'message': message
+            })
+
+        return {
+            'granted_student_ids': sorted({student_id for student_id, _ in missing}),
+            'success_count': len(missing),
+            'skipped_count': len(existing),
+            'error_count': len(results) - len(missing) - len(existing),
+            'results': results
+        }
+
+    @staticmethod
+    def revoke(student_ids: List[int], module_ids: List[str]) -> Dict[str, Any]:
+        """批量撤销权限（不提交事务）
+
+        一次查询实际存在的权限，一条 DELETE 删除
+        """
+        student_ids = list(dict.fromkeys(student_ids))
+        module_ids = list(dict.fromkeys(module_ids))
+
+        existing = PermissionService.existing_pairs(student_ids, module_ids)
+        if existing:
+            db.session.execute(
+                delete(UserModulePermission).where(
+                    UserModulePermission.user_id.in_(sorted({student_id for student_id, _ in existing})),
+                    UserModulePermission.module_id.in_(module_ids)
+                ).execution_options(synchronize_session=False)
+            )
+
+        return {
+            'revoked_student_ids': sorted({student_id for student_id, _ in existing}),
+            'revoked_count': len(existing),
+            'not_found_count': len(student_ids) * len(module_ids) - len(existing)
+        }
+
+    @staticmethod
+    def template_module_ids(template: PermissionTemplate) -> List[str]:
+        """权限模板包含的模块ID"""
+        return [item.module_id for item in template.modules]
+
+    @staticmethod
+    def apply_template(template: PermissionTemplate, student_ids: List[int], granted_by: int) -> Dict[str, Any]:
+        """把权限模板授予一批学生（不提交事务），只统计数量不返回逐对结果"""
+        outcome = PermissionService.grant(student_ids, PermissionService.template_module_ids(template), granted_by)
+        outcome.pop('results')
+        return outcome
+
+    @staticmethod
+    def remove_template(template: PermissionTemplate, student_ids: List[int]) -> Dict[str, Any]:
+        """从一批学生撤销权限模板中的模块（不提交事务）
+
+        注意：同一模块即使也来自其他模板或单独授予，同样会被撤销
+        """
+        return PermissionService.revoke(student_ids, PermissionService.template_module_ids(template))
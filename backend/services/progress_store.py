@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学习进度存储
+实时同步中的 progress-change 事件频率很高（滚动、翻页都会上报），
+这里在内存中只保留每个 (用户, 课程/模块) 的最新进度，定时用一条 upsert
+批量写入 learning_progress 表；读取时内存中尚未写入的进度优先。
+
+批量写入失败时逐条重试，某条进度连续 MAX_FLUSH_ATTEMPTS 次写入失败后丢弃，
+避免一条写不进去的进度阻塞所有用户的进度写入
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from extensions import db
+from models import LearningProgress
+
+logger = logging.getLogger(__name__)
+
+ProgressKey = Tuple[int, str, str]
+
+# 批量写入时更新的字段
+UPSERT_COLUMNS = ('percent', 'position', 'data', 'updated_at')
+
+# target_id 列的长度，超长的课程/模块ID无法写入
+MAX_TARGET_ID_LENGTH = LearningProgress.__table__.c.target_id.type.length
+# position 为 32 位整数列
+MAX_POSITION = 2 ** 31 - 1
+# 单条进度写入失败的最多次数，之后丢弃
+MAX_FLUSH_ATTEMPTS = 3
+
+def progress_target(progress: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """进度对应的 (target_type, target_id)：优先课程，其次学习模块"""
+    if progress.get('courseId'):
+        return 'course', str(progress['courseId'])
+    if progress.get('moduleId'):
+        return 'module', str(progress['moduleId'])
+    return None
+
+def _percent(progress: Dict[str, Any]) -> float:
+    value = progress.get('percent', progress.get('progress', 0))
+    try:
+        return min(max(float(value), 0.0), 100.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _position(progress: Dict[str, Any]) -> Optional[int]:
+    try:
+        return min(max(int(progress['position']), -MAX_POSITION), MAX_POSITION)
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return None
+
+def _upsert(rows: List[Dict[str, Any]]):
+    """按数据库方言批量 upsert（按 user_id + target_type + target_id 唯一索引）"""
+    table = LearningProgress.__table__
+    dialect = db.session.get_bind().dialect.name
+    index_elements = ['user_id', 'target_type', 'target_id']
+
+    if dialect in ('postgresql', 'sqlite'):
+        statement = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={column: statement.excluded[column] for column in UPSERT_COLUMNS}
+        )
+        db.session.execute(statement, rows)
+        return
+
+    if dialect == 'mysql':
+        statement = mysql.insert(table)
+        statement = statement.on_duplicate_key_update({column: statement.inserted[column] for column in UPSERT_COLUMNS})
+        db.session.execute(statement, rows)
+        return
+
+    # 其他数据库：一次查询已有记录，分别批量插入和更新
+    keys = {(row['user_id'], row['target_type'], row['target_id']) for row in rows}
+    existing = {
+        (user_id, target_type, target_id): progress_id
+        for progress_id, user_id, target_type, target_id in db.session.query(
+            LearningProgress.id, LearningProgress.user_id, LearningProgress.target_type, LearningProgress.target_id
+        ).filter(LearningProgress.user_id.in_(sorted({key[0] for key in keys})))
+        if (user_id, target_type, target_id) in keys
+    }
+    new_rows = [row for row in rows if (row['user_id'], row['target_type'], row['target_id']) not in existing]
+    if new_rows:
+        db.session.execute(insert(table), new_rows)
+    for row in rows:
+        progress_id = existing.get((row['user_id'], row['target_type'], row['target_id']))
+        if progress_id:
+            db.session.query(LearningProgress).filter_by(id=progress_id).update(
+                {column: row[column] for column in UPSERT_COLUMNS}, synchronize_session=False
+            )
+
+class ProgressStore:
+    """学习进度写入合并
+
+    record() 只更新内存中的最新进度，flush() 把有变化的进度批量写入数据库
+    """
+
+    def __init__(self, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # 尚未写入数据库的最新进度
+        self._pending: Dict[ProgressKey, Dict[str, Any]] = {}
+        # 合并掉的上报次数（统计用）
+        self.coalesced = 0
+        # 写入失败的进度及其失败次数
+        self._failures: Dict[ProgressKey, int] = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, user_id: int, progress: Dict[str, Any]) -> bool:
+        """记录一次进度上报，无法确定课程/模块（或ID超长）时返回 False"""
+        target = progress_target(progress)
+        if target is None or len(target[1]) > MAX_TARGET_ID_LENGTH:
+            return False
+
+        key = (user_id, *target)
+        row = {
+            'user_id': user_id,
+            'target_type': target[0],
+            'target_id': target[1],
+            'percent': _percent(progress),
+            'position': _position(progress),
+            'data': progress,
+            'updated_at': datetime.utcnow()
+        }
+        with self._lock:
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = row
+        return True
+
+    def flush(self) -> int:
+        """批量写入有变化的进度，返回写入条数（需要在应用上下文中调用）"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            try:
+                _upsert(list(pending.values()))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"学习进度批量写入失败，逐条重试: {e}")
+                return self._flush_each(pending)
+
+            with self._lock:
+                for key in pending:
+                    self._failures.pop(key, None)
+            logger.info(f"学习进度批量写入 {len(pending)} 条")
+            return len(pending)
+
+    def _flush_each(self, pending: Dict[ProgressKey, Dict[str, Any]]) -> int:
+        """逐条写入进度，失败的放回缓冲区下次重试，多次失败后丢弃"""
+        written = 0
+        for key, row in pending.items():
+            try:
+                _upsert([row])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                with self._lock:
+                    attempts = self._failures.get(key, 0) + 1
+                    if attempts >= MAX_FLUSH_ATTEMPTS:
+                        self._failures.pop(key, None)
+                        logger.error(f"学习进度多次写入失败，已丢弃: 用户 {key[0]}, {key[1]} {key[2]}: {e}")
+                    else:
+                        self._failures[key] = attempts
+                        # 期间的新进度优先
+                        self._pending.setdefault(key, row)
+                continue
+            written += 1
+            with self._lock:
+                self._failures.pop(key, None)
+        return written
+
+    def get_for_user(self, user_id: int) -> List[Dict[str, Any]]:
+        """用户的全部学习进度（内存中尚未写入的优先）"""
+        rows = {
+            (progress.target_type, progress.target_id): {
+                'target_type': progress.target_type,
+                'target_id': progress.target_id,
+                'percent': progress.percent,
+                'position': progress.position,
+                'data': progress.data,
+                'updated_at': progress.updated_at
+            }
+            for progress in LearningProgress.query.filter_by(user_id=user_id)
+        }
+        with self._lock:
+            for (pending_user_id, target_type, target_id), row in self._pending.items():
+                if pending_user_id == user_id:
+                    rows[(target_type, target_id)] = {key: value for key, value in row.items() if key != 'user_id'}
+
+        result = sorted(rows.values(), key=lambda row: row['updated_at'], reverse=True)
+        for row in result:
+            row['updated_at'] = row['updated_at'].isoformat()
+        return result
+
+# 全局学习进度存储实例
+progress_store = ProgressStore()
+
+def get_progress_store() -> ProgressStore:
+    """获取学习进度存储实例"""
+    return progress_store
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学习路径推荐引擎
+批量任务根据模块目录构建前置关系图（同一类别内按难度分级），
+根据权限矩阵统计模块之间的共同开通情况，并为每个学生预先生成推荐；
+接口直接读取预先生成的结果。学生权限变化时只重新计算该学生
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional
+import async_support
+from extensions import db
+from services.module_catalog import get_module_catalog
+from services.permission_matrix import get_permission_matrix
+
+logger = logging.getLogger(__name__)
+
+# 推荐分组
+RECOMMENDATION_GROUPS = ('immediate', 'next_level', 'advanced')
+
+class ModuleGraph:
+    """某一次批量任务得到的模块统计
+
+    - levels: 模块在所属类别中的难度层级（0 为最基础）
+    - prerequisites: 模块的前置模块（同类别上一层级的模块）
+    - affinity: affinity[a][b] 为开通了 a 的学生中也开通了 b 的比例
+    - popularity: 开通该模块的学生比例
+    """
+
+    def __init__(self, catalog_version: int, modules: List[Dict[str, Any]], co_enrollment: Dict, student_count: int):
+        self.catalog_version = catalog_version
+        self.built_at = datetime.utcnow()
+        self.modules = modules
+
+        levels_by_category: Dict[str, List[int]] = {}
+        for module in modules:
+            levels_by_category.setdefault(module['category'], []).append(module['difficulty'] or 1)
+        levels_by_category = {category: sorted(set(values)) for category, values in levels_by_category.items()}
+
+        self.levels: Dict[str, int] = {}
+        for module in modules:
+            self.levels[module['id']] = levels_by_category[module['category']].index(module['difficulty'] or 1)
+
+        self.prerequisites: Dict[str, List[str]] = {
+            module['id']: [
+                other['id'] for other in modules
+                if other['category'] == module['category']
+                and self.levels[other['id']] == self.levels[module['id']] - 1
+            ]
+            for module in modules
+        }
+
+        module_ids = [module['id'] for module in modules]
+        self.popularity = {
+            module_id: co_enrollment.get((module_id, module_id), 0) / student_count if student_count else 0.0
+            for module_id in module_ids
+        }
+        self.affinity: Dict[str, Dict[str, float]] = {}
+        for first in module_ids:
+            owners = co_enrollment.get((first, first), 0)
+            self.affinity[first] = {
+                second: co_enrollment.get((first, second), 0) / owners if owners else 0.0
+                for second in module_ids if second != first
+            }
+
+    def recommend(self, owned: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """为拥有 owned 模块的学生生成推荐"""
+        owned = set(owned)
+
+        # 学生在每个类别中已达到的最高层级
+        reached: Dict[str, int] = {}
+        for module in self.modules:
+            if module['id'] in owned:
+                level = self.levels[module['id']]
+                reached[module['category']] = max(reached.get(module['category'], -1), level)
+
+        groups = {group: [] for group in RECOMMENDATION_GROUPS}
+        for order, module in enumerate(self.modules):
+            module_id = module['id']
+            if module_id in owned:
+                continue
+
+            # 共同开通比例：已开通模块的平均值，尚无模块时使用整体开通率
+            if owned:
+                score = sum(self.affinity.get(o, {}).get(module_id, 0.0) for o in owned) / len(owned)
+            else:
+                score = self.popularity[module_id]
+
+            level = self.levels[module_id]
+            gap = level - reached.get(module['category'], -1)
+            if gap <= 1:
+                group = 'immediate'
+                reason = '基础模块，建议优先学习' if level == 0 else '已开通前置模块，可以开始学习'
+            elif gap == 2:
+                group = 'next_level'
+                reason = '中级模块，完成前置模块后学习'
+            else:
+                group = 'advanced'
+                reason = '高级模块，需要扎实基础'
+
+            groups[group].append((-score, module['difficulty'] or 1, order, {
+                'id': module_id,
+                'title': module['title'],
+                'description': module['description'],
+                'category': module['category'],
+                'difficulty': module['difficulty'],
+                'prerequisites': [p for p in self.prerequisites[module_id] if p not in owned],
+                'score': round(score, 3),
+                'reason': reason
+            }))
+
+        return {group: [item for *_, item in sorted(items, key=lambda entry: entry[:3])] for group, items in groups.items()}
+
+class RecommendationEngine:
+    """学习路径推荐引擎
+
+    rebuild() 为批量任务，重新统计并为所有学生生成推荐；
+    get_for_student() 读取预先生成的结果，缺失（新学生或权限刚变化）时单独计算
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._graph: Optional[ModuleGraph] = None
+        self._recommendations: Dict[int, Dict[str, Any]] = {}
+        # 每次 invalidate 加一，并记录各学生最近一次失效时的值；
+        # 批量重建期间失效的学生不使用重建结果（其中的权限可能已过期）
+        self._generation = 0
+        self._invalidated: Dict[int, int] = {}
+
+    def _build_graph(self) -> ModuleGraph:
+        catalog = get_module_catalog().get()
+        matrix = get_permission_matrix()
+        modules = catalog.payload['allModules']
+        co_enrollment = matrix.co_enrollment([module['id'] for module in modules])
+        return ModuleGraph(catalog.version, modules, co_enrollment, len(matrix.student_ids()))
+
+    def _current_graph(self) -> ModuleGraph:
+        """获取模块统计，模块目录变化后重新构建"""
+        graph = self._graph
+        if graph is None or graph.catalog_version != get_module_catalog().version:
+            graph = self._build_graph()
+            with self._lock:
+                self._graph = graph
+                self._recommendations = {}
+        return graph
+
+    def _compute(self, graph: ModuleGraph, student_id: int) -> Dict[str, Any]:
+        owned = get_permission_matrix().get_module_ids(student_id)
+        return {
+            'graph': graph,
+            'current_modules': len(owned),
+            'recommendations': graph.recommend(owned)
+        }
+
+    def rebuild(self) -> Dict[str, Any]:
+        """批量任务：重新统计并为所有学生生成推荐"""
+        start = time.perf_counter()
+        with self._lock:
+            generation = self._generation
+        graph = self._build_graph()
+        student_ids = get_permission_matrix().student_ids()
+        recommendations = {student_id: self._compute(graph, student_id) for student_id in student_ids}
+
+        with self._lock:
+            for student_id, invalidated_at in self._invalidated.items():
+                if invalidated_at > generation:
+                    recommendations.pop(student_id, None)
+            # 之前的记录已经用不到了，只保留仍可能与其他进行中的重建相关的
+            self._invalidated = {
+                student_id: invalidated_at for student_id, invalidated_at in self._invalidated.items()
+                if invalidated_at > generation
+            }
+            self._graph = graph
+            self._recommendations = recommendations
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"学习路径推荐已重建: {len(student_ids)} 名学生，用时 {elapsed:.2f}s")
+        return {
+            'students': len(student_ids),
+            'modules': len(graph.modules),
+            'built_at': graph.built_at.isoformat(),
+            'elapsed_seconds': round(elapsed, 3)
+        }
+
+    def get_for_student(self, student_id: int) -> Dict[str, Any]:
+        """获取学生的推荐（返回的字典来自缓存，调用方不要修改）"""
+        graph = self._current_graph()
+        entry = self._recommendations.get(student_id)
+        if entry is None or entry['graph'] is not graph:
+            generation = self._generation
+            entry = self._compute(graph, student_id)
+            with self._lock:
+                # 计算期间发生过失效时不缓存，下次访问重新计算
+                if self._graph is graph and self._generation == generation:
+                    self._recommendations[student_id] = entry
+        return entry
+
+    def invalidate(self, user_ids: Iterable[int]):
+        """学生权限变化后丢弃其推荐，下次访问时单独重新计算"""
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._recommendations.pop(user_id, None)
+                self._invalidated[user_id] = self._generation
+
+# 全局推荐引擎实例
+recommendation_engine = RecommendationEngine()
+
+def get_recommendation_engine() -> RecommendationEngine:
+    """获取推荐引擎实例"""
+    return recommendation_engine
+
+def start_periodic_rebuild(app, interval: int):
+    """启动后台线程，每隔 interval 秒重建一次推荐"""
+    def _rebuild():
+        with app.app_context():
+            try:
+                recommendation_engine.rebuild()
+            except Exception as e:
+                logger.error(f"学习路径推荐重建失败: {e}")
+            finally:
+                db.session.remove()
+
+    def _run():
+        while True:
+            time.sleep(interval)
+            # 协作式异步模式下这里是协程，重建放到线程池中执行，避免阻塞事件循环
+            async_support.run_blocking(_rebuild)
+
+    thread = threading.Thread(target=_run, name='recommendation-rebuild', daemon=True)
+    thread.start()
+    return thread
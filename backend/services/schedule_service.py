@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+排课服务模块
+根据教师的每周可预约时间、例外安排和已有预约计算空闲时间段
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Any, Iterable, Tuple
+from extensions import db
+from models import CourseBooking, TeacherAvailability, TeacherAvailabilityException
+
+# 教师未配置可预约时间时使用的默认时间段
+DEFAULT_SLOTS = [
+    '09:00-10:00', '10:00-11:00', '14:00-15:00',
+    '15:00-16:00', '18:00-19:00', '19:00-20:00', '20:00-21:00'
+]
+
+# 前一天晚间开始、跨过零点的课程也会占用当天的时段
+BOOKING_LOOKBACK = timedelta(hours=4)
+
+# 单次查询的最大天数
+MAX_RANGE_DAYS = 31
+
+DAY_MINUTES = 24 * 60
+
+def _parse_slot(slot: str) -> Tuple[int, int]:
+    """把 'HH:MM-HH:MM' 解析为当天的分钟区间 [start, end)"""
+    start_text, end_text = slot.split('-')
+    start = datetime.strptime(start_text, '%H:%M')
+    end = datetime.strptime(end_text, '%H:%M')
+    return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+def _to_minutes(value: time) -> int:
+    """time 转换为当天的分钟数"""
+    return value.hour * 60 + value.minute
+
+def _format_minutes(minutes: int) -> str:
+    """当天的分钟数格式化为 HH:MM"""
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+# 预先解析的默认时间段，每个时间段作为一个独立窗口: (开始, 结束, 时段长度)
+DEFAULT_WINDOWS = [(start, end, end - start) for start, end in map(_parse_slot, DEFAULT_SLOTS)]
+
+def _subtract(windows: List[Tuple[int, int, int]], block_start: int, block_end: int) -> List[Tuple[int, int, int]]:
+    """从可预约窗口中扣除 [block_start, block_end)"""
+    result = []
+    for start, end, slot_minutes in windows:
+        if block_end <= start or block_start >= end:
+            result.append((start, end, slot_minutes))
+            continue
+        if start < block_start:
+            result.append((start, block_start, slot_minutes))
+        if block_end < end:
+            result.append((block_end, end, slot_minutes))
+    return result
+
+class TeacherDaySchedule:
+    """教师某一天的占用情况
+
+    已预约的课程按开始时间排序为不重叠的分钟区间，
+    判断一个时段是否空闲只需二分查找一次
+    """
+
+    def __init__(self, busy: Iterable[Tuple[int, int]]):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+
+        # 合并重叠区间，保证 starts 和 ends 都单调递增（首尾相接的课程不合并）
+        for start, end in sorted(busy):
+            if self.ends and start < self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def is_free(self, start: int, end: int) -> bool:
+        """判断 [start, end) 是否没有被任何课程占用"""
+        # 第一个结束时间晚于 start 的区间是唯一可能重叠的区间
+        index = bisect_right(self.ends, start)
+        return index == len(self.starts) or self.starts[index] >= end
+
+class ScheduleService:
+    """排课服务类"""
+
+    @staticmethod
+    def _load_bookings(teacher_ids: List[int], start_date: date, days: int):
+        """一次查询日期范围内所有教师的预约，按 (教师, 第几天) 分组
+
+        返回 (占用区间, 当天开始的预约时间) 两个字典
+        """
+        range_start = datetime.combine(start_date, time.min)
+        range_end = range_start + timedelta(days=days)
+
+        # 使用 scheduled_time 的半开区间，可以命中 (teacher_id, scheduled_time) 索引
+        rows = db.session.query(
+            CourseBooking.teacher_id, CourseBooking.scheduled_time, CourseBooking.duration_minutes
+        ).filter(
+            CourseBooking.teacher_id.in_(teacher_ids),
+            CourseBooking.scheduled_time >= range_start - BOOKING_LOOKBACK,
+            CourseBooking.scheduled_time < range_end,
+            CourseBooking.status != 'cancelled'
+        ).all()
+
+        busy = defaultdict(list)
+        booked = defaultdict(list)
+        for teacher_id, scheduled_time, duration in rows:
+            start = int((scheduled_time - range_start).total_seconds() // 60)
+            end = start + (duration or 60)
+
+            if start >= 0:
+                booked[(teacher_id, start // DAY_MINUTES)].append(start % DAY_MINUTES)
+
+            # 跨零点的课程拆分到每一天
+            for day in range(max(start, 0) // DAY_MINUTES, min((end - 1) // DAY_MINUTES, days - 1) + 1):
+                offset = day * DAY_MINUTES
+                busy[(teacher_id, day)].append((max(start - offset, 0), min(end - offset, DAY_MINUTES)))
+
+        return busy, booked
+
+    @staticmethod
+    def _load_windows(teacher_ids: List[int], start_date: date, days: int):
+        """一次查询教师的每周可预约时间，一次查询日期范围内的例外安排"""
+        weekly = defaultdict(lambda: defaultdict(list))
+        for availability in TeacherAvailability.query.filter(
+            TeacherAvailability.teacher_id.in_(teacher_ids),
+            TeacherAvailability.is_active == True
+        ):
+            weekly[availability.teacher_id][availability.weekday].append((
+                _to_minutes(availability.start_time),
+                _to_minutes(availability.end_time),
+                availability.slot_minutes or 60
+            ))
+
+        exceptions = defaultdict(list)
+        for exception in TeacherAvailabilityException.query.filter(
+            TeacherAvailabilityException.teacher_id.in_(teacher_ids),
+            TeacherAvailabilityException.date >= start_date,
+            TeacherAvailabilityException.date < start_date + timedelta(days=days)
+        ):
+            exceptions[(exception.teacher_id, exception.date)].append(exception)
+
+        return weekly, exceptions
+
+    @staticmethod
+    def _day_windows(teacher_weekly, day_exceptions, target_date: date) -> List[Tuple[int, int, int]]:
+        """计算教师某一天的可预约窗口"""
+        if teacher_weekly:
+            windows = sorted(teacher_weekly.get(target_date.weekday(), []))
+        else:
+            # 未配置每周可预约时间的教师使用默认时间段
+            windows = list(DEFAULT_WINDOWS)
+
+        # 先扣除不可预约的例外，再加入额外开放的时间
+        for exception in day_exceptions:
+            if exception.is_available:
+                continue
+            if exception.start_time is None or exception.end_time is None:
+                windows = []
+            else:
+                windows = _subtract(windows, _to_minutes(exception.start_time), _to_minutes(exception.end_time))
+
+        for exception in day_exceptions:
+            if exception.is_available and exception.start_time and exception.end_time:
+                # 与已有窗口重叠的部分以例外为准，避免生成重复的时段
+                windows = _subtract(windows, _to_minutes(exception.start_time), _to_minutes(exception.end_time))
+                windows.append((
+                    _to_minutes(exception.start_time),
+                    _to_minutes(exception.end_time),
+                    exception.slot_minutes or 60
+                ))
+
+        return sorted(windows)
+
+    @staticmethod
+    def generate_free_slots(teacher_ids: Iterable[int], start_date: date, days: int = 7) -> Dict[int, Dict[str, Any]]:
+        """计算多位教师在日期范围内的空闲时间段
+
+        无论教师和天数多少，都只执行三次查询（每周时间、例外、预约）。
+        返回 {教师ID: {'YYYY-MM-DD': {'available_slots': [...], 'booked_slots': [...]}}}
+        """
+        teacher_ids = list(dict.fromkeys(teacher_ids))
+        days = max(1, min(days, MAX_RANGE_DAYS))
+        if not teacher_ids:
+            return {}
+
+        weekly, exceptions = ScheduleService._load_windows(teacher_ids, start_date, days)
+        busy, booked = ScheduleService._load_bookings(teacher_ids, start_date, days)
+
+        result = {}
+        for teacher_id in teacher_ids:
+            teacher_days = {}
+            for day in range(days):
+                target_date = start_date + timedelta(days=day)
+                windows = ScheduleService._day_windows(
+                    weekly.get(teacher_id), exceptions.get((teacher_id, target_date), []), target_date
+                )
+                schedule = TeacherDaySchedule(busy.get((teacher_id, day), []))
+
+                available_slots = []
+                for window_start, window_end, slot_minutes in windows:
+                    # 时段长度无效的旧数据直接跳过，避免死循环
+                    if not slot_minutes or slot_minutes <= 0:
+                        continue
+                    slot_start = window_start
+                    while slot_start + slot_minutes <= window_end:
+                        slot_end = slot_start + slot_minutes
+                        if schedule.is_free(slot_start, slot_end):
+                            available_slots.append(f'{_format_minutes(slot_start)}-{_format_minutes(slot_end)}')
+                        slot_start = slot_end
+
+                teacher_days[target_date.isoformat()] = {
+                    'available_slots': available_slots,
+                    'booked_slots': [_format_minutes(start) for start in sorted(booked.get((teacher_id, day), []))]
+                }
+            result[teacher_id] = teacher_days
+
+        return result
+
+    @staticmethod
+    def get_available_slots(teacher_id: int, target_date: date) -> Dict[str, Any]:
+        """获取教师某一天的可预约时间段"""
+        slots = ScheduleService.generate_free_slots([teacher_id], target_date, days=1)
+        return slots[teacher_id][target_date.isoformat()]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时同步广播批处理和限流
+高频、可合并的事件（progress-sync、interaction）不再逐条广播给整个房间，
+而是按会话暂存，每隔 SYNC_BATCH_INTERVAL_MS 毫秒合并为一条 sync-batch 发出：
+
+- progress-sync 按用户合并，只保留最新进度
+- interaction 按 (用户, 互动类型) 合并，只保留最新一次
+- 其他事件按到达顺序保留
+
+这样一个会话每个周期最多广播一次，广播条数不再随上报次数线性增长。
+每个连接另有令牌桶限流，超出速率的可合并事件直接丢弃，其他事件拒绝并通知客户端
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 可合并的事件类型：事件 -> 合并键（同一键的事件只保留最新一条）
+MERGE_KEYS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    'progress-sync': lambda data: data.get('userId'),
+    'interaction': lambda data: (data.get('userId'), data.get('type'))
+}
+
+# 每个会话最多暂存的广播条数（如互动类型很多时），超出时丢弃最早的
+MAX_PENDING_PER_SESSION = 1000
+
+# 暂存的广播：(事件, 数据, 快照变更, 是否记入增量日志)
+BatchEntry = Tuple[str, Dict[str, Any], Optional[List], bool]
+
+class RateLimiter:
+    """令牌桶限流：每个键每秒补充 rate 个令牌，最多积累 burst 个"""
+
+    def __init__(self, rate: float = 20, burst: int = 40):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets: Dict[Any, List[float]] = {}
+
+    def allow(self, key: Any) -> bool:
+        """消耗一个令牌，令牌不足时返回 False"""
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                return False
+            bucket[0] = tokens - 1
+            return True
+
+    def retry_after_ms(self, key: Any) -> int:
+        """下一个令牌到达前需要等待的毫秒数"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or self.rate <= 0:
+                return 0
+            return max(int((1 - bucket[0]) / self.rate * 1000), 0)
+
+    def forget(self, key: Any):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+class BroadcastBatcher:
+    """按会话暂存待广播的事件，可合并的事件只保留最新一条"""
+
+    def __init__(self, max_pending: int = MAX_PENDING_PER_SESSION):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending: Dict[str, "OrderedDict[Any, BatchEntry]"] = {}
+        # 不可合并事件的唯一键
+        self._sequence = itertools.count()
+        # 合并掉、因超出上限丢弃的事件数（统计用）
+        self.merged = 0
+        self.dropped = 0
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._pending.values())
+
+    def add(self, session_id: str, event: str, data: Dict[str, Any],
+            changes: Optional[List] = None, log: bool = True) -> bool:
+        """暂存一条广播，返回是否合并掉了之前的同类事件"""
+        merge_key = MERGE_KEYS.get(event)
+        key = (event, merge_key(data)) if merge_key else next(self._sequence)
+        with self._lock:
+            entries = self._pending.setdefault(session_id, OrderedDict())
+            merged = key in entries
+            entries[key] = (event, data, changes, log)
+            # 合并后的事件按最新一次的时间排序
+            entries.move_to_end(key)
+            if merged:
+                self.merged += 1
+            elif len(entries) > self.max_pending:
+                entries.popitem(last=False)
+                self.dropped += 1
+            return merged
+
+    def take(self) -> Dict[str, List[BatchEntry]]:
+        """取出所有会话暂存的事件"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return {session_id: list(entries.values()) for session_id, entries in pending.items()}
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._pending.pop(session_id, None)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时同步紧凑编码
+客户端连接时在 auth 中带上 encoding: 'msgpack' 即可协商使用（需要安装 msgpack），
+之后服务器发给它的同步事件不再是 JSON 对象，而是一个二进制帧：
+
+- 字段名按 FIELDS 表换成序号（连接时通过 codec 事件下发该表），ISO 时间戳换成毫秒整数
+- 用 MessagePack 编码，二进制数据（如共享文本更新）原样传输，不再转 base64
+- 较大的消息用 zlib 压缩；会话积累一定数量的消息后，以这些消息为样本生成预设字典，
+  同一会话中的消息结构相似，使用字典后小消息也能明显压缩
+
+帧格式：1 字节类型 + 数据
+    0x00  MessagePack
+    0x01  zlib(MessagePack)
+    0x02  8 字节字典ID + zlib(MessagePack)（使用该会话的预设字典）
+
+字典通过 codec-dictionary 事件下发，也记在会话快照的 dictionaries 中（字典ID为十六进制）；
+收到未知字典ID的帧时，客户端不带 lastSeq 发送 sync-request 重新获取快照即可。
+每条广播只编码一次，房间中使用紧凑编码的所有连接收到同一个帧
+"""
+import hashlib
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+CODEC_VERSION = 1
+
+ENCODING_JSON = 'json'
+ENCODING_MSGPACK = 'msgpack'
+
+# 参与字段名压缩的字段，序号即在表中的位置（只能在末尾追加，修改时递增 CODEC_VERSION）
+FIELDS = (
+    'sessionId', 'userId', 'timestamp', 'seq', 'fromSeq', 'events', 'event', 'data',
+    'annotation', 'annotations', 'action', 'clientId', 'id', 'courseId', 'type', 'text',
+    'content', 'color', 'position', 'start', 'end', 'anchor', 'progress', 'percent',
+    'moduleId', 'update', 'siteId', 'key', 'acks', 'success', 'participants', 'session_info',
+    'session_id', 'session_type', 'participant_count', 'user_id', 'user_type', 'username',
+    'nickname', 'joined_at', 'dictionaries', 'dictionary'
+)
+_FIELD_IDS = {name: index for index, name in enumerate(FIELDS)}
+
+FRAME_RAW = 0
+FRAME_ZLIB = 1
+FRAME_ZLIB_DICT = 2
+
+# 小于此字节数的消息不压缩
+COMPRESS_MIN_SIZE = 128
+# 预设字典的样本消息数和字典大小
+DICTIONARY_SAMPLES = 64
+DICTIONARY_SIZE = 4096
+DICTIONARY_ID_SIZE = 8
+
+def available() -> bool:
+    """是否支持紧凑编码"""
+    return msgpack is not None
+
+def negotiate(requested: Optional[str], enabled: bool = True) -> str:
+    """根据客户端请求的编码确定连接使用的编码，不支持时退回 JSON"""
+    if enabled and requested == ENCODING_MSGPACK and available():
+        return ENCODING_MSGPACK
+    return ENCODING_JSON
+
+def codec_info() -> Dict[str, Any]:
+    """下发给客户端的编码说明"""
+    return {'encoding': ENCODING_MSGPACK, 'version': CODEC_VERSION, 'fields': list(FIELDS)}
+
+def _timestamp_ms(value: str):
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if moment.tzinfo is None:
+        # 服务器时间戳均为 UTC（datetime.utcnow）
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+def _intern(value):
+    """字段名换成序号、时间戳换成毫秒整数"""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key == 'timestamp' and isinstance(item, str):
+                item = _timestamp_ms(item)
+            result[_FIELD_IDS.get(key, key)] = _intern(item)
+        return result
+    if isinstance(value, (list, tuple)):
+        return [_intern(item) for item in value]
+    return value
+
+def _restore(value):
+    """_intern 的逆过程（时间戳保持为毫秒整数）"""
+    if isinstance(value, dict):
+        return {
+            FIELDS[key] if isinstance(key, int) and key < len(FIELDS) else key: _restore(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_restore(item) for item in value]
+    return value
+
+def pack(data: Any) -> bytes:
+    """MessagePack 编码（字段名压缩）"""
+    return msgpack.packb(_intern(data), use_bin_type=True)
+
+def unpack(payload: bytes) -> Any:
+    return _restore(msgpack.unpackb(payload, raw=False, strict_map_key=False))
+
+def _compress(payload: bytes, dictionary: Optional[bytes] = None) -> bytes:
+    compressor = zlib.compressobj(level=6, wbits=-15, zdict=dictionary) if dictionary else \
+        zlib.compressobj(level=6, wbits=-15)
+    return compressor.compress(payload) + compressor.flush()
+
+def encode_frame(payload: bytes, dictionary: Optional[Tuple[bytes, bytes]] = None) -> bytes:
+    """把 MessagePack 数据封装为帧，dictionary 为 (字典ID, 字典)；压缩后没有变小则不压缩"""
+    if len(payload) < COMPRESS_MIN_SIZE:
+        return bytes([FRAME_RAW]) + payload
+    if dictionary:
+        frame = bytes([FRAME_ZLIB_DICT]) + dictionary[0] + _compress(payload, dictionary[1])
+    else:
+        frame = bytes([FRAME_ZLIB]) + _compress(payload)
+    if len(frame) >= len(payload) + 1:
+        return bytes([FRAME_RAW]) + payload
+    return frame
+
+def decode_frame(frame: bytes, dictionaries: Optional[Dict[bytes, bytes]] = None) -> Any:
+    """解码帧（客户端逻辑的参考实现，也用于测试和基准），dictionaries 为 字典ID -> 字典"""
+    kind, body = frame[0], frame[1:]
+    if kind == FRAME_ZLIB:
+        body = zlib.decompressobj(wbits=-15).decompress(body)
+    elif kind == FRAME_ZLIB_DICT:
+        dictionary_id, body = body[:DICTIONARY_ID_SIZE], body[DICTIONARY_ID_SIZE:]
+        body = zlib.decompressobj(wbits=-15, zdict=(dictionaries or {})[dictionary_id]).decompress(body)
+    return unpack(body)
+
+class SessionCodec:
+    """一个会话的广播编码器：记录样本消息，样本足够后生成该会话的预设字典"""
+
+    def __init__(self, samples: int = DICTIONARY_SAMPLES, dictionary_size: int = DICTIONARY_SIZE):
+        self._lock = threading.Lock()
+        self._max_samples = samples
+        self._dictionary_size = dictionary_size
+        self._samples: List[bytes] = []
+        self.dictionary: Optional[Tuple[bytes, bytes]] = None
+        # 刚生成、尚未下发给客户端的字典
+        self._announce: Optional[Tuple[bytes, bytes]] = None
+
+    def encode(self, data: Any) -> bytes:
+        """编码一条广播"""
+        payload = pack(data)
+        with self._lock:
+            frame = encode_frame(payload, self.dictionary)
+            if self.dictionary is None and self._announce is None and len(payload) >= COMPRESS_MIN_SIZE // 4:
+                self._samples.append(payload)
+                if len(self._samples) >= self._max_samples:
+                    self._build_dictionary()
+        return frame
+
+    def _build_dictionary(self):
+        # zlib 把字典当作数据之前的内容，越靠后的内容匹配代价越小，因此最近的样本放在末尾
+        dictionary = b''.join(self._samples)[-self._dictionary_size:]
+        dictionary_id = hashlib.sha1(dictionary).digest()[:DICTIONARY_ID_SIZE]
+        self._samples = []
+        self._announce = (dictionary_id, dictionary)
+
+    def take_dictionary(self) -> Optional[Tuple[bytes, bytes]]:
+        """取出新生成的字典；调用方下发给客户端后再调用 activate 开始使用"""
+        with self._lock:
+            announce, self._announce = self._announce, None
+            return announce
+
+    def activate(self, dictionary: Tuple[bytes, bytes]):
+        with self._lock:
+            self.dictionary = dictionary
+            self._samples = []
@@ -5,14 +5,35 @@
 处理学习界面和上课界面之间的数据同步
 """
 
+import base64
+import hashlib
 import json
 import logging
+import os
+import sys
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
+from flask import request
 from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
+import async_support
 from extensions import db
-from models import User, Course, CourseAnnotation, CourseSession
+from models import User, Course, CourseAnnotation, CourseSession, CourseStatus
+from services.sync_store import SessionStore, MemorySessionStore
+from services.annotation_buffer import AnnotationWriteBuffer, AnnotationValidationError
+from services.progress_store import get_progress_store
+from services.text_crdt import TextDocument, CRDTDecodeError, decode_update
+from services import sync_codec
+from services.sync_codec import SessionCodec
+from services.sync_batch import BroadcastBatcher, RateLimiter
+
+# 单条共享文本更新的最大字节数
+MAX_TEXT_UPDATE_SIZE = 64 * 1024
+
+# 每个会话的共享文本副本中允许挂起（依赖的字符尚未到达）的操作数，超过时拒绝新的更新
+MAX_PENDING_TEXT_OPS = 256
 
 logger = logging.getLogger(__name__)
 
@@ -31,10 +52,66 @@ class SyncEvent:
 class SyncService:
     """同步服务类"""
     
-    def __init__(self, socketio: SocketIO):
+    def __init__(self, socketio: SocketIO, store: Optional[SessionStore] = None, app=None):
         self.socketio = socketio
-        self.active_sessions: Dict[str, Dict] = {}
-        self.user_sessions: Dict[int, str] = {}
+        self.app = app
+        
+        # 会话、参与者、课程会话索引和用户当前会话保存在共享存储中，
+        # 多个进程使用同一个存储（如 Redis）即可共享课堂状态
+        self.store = store or MemorySessionStore()
+        
+        # 本进程上的连接：sid -> 用户ID、用户类型、所在会话和共享文本站点编号
+        self.connections: Dict[str, Dict] = {}
+        
+        self._lock = threading.RLock()
+        
+        # 本进程上各会话共享文本的副本：会话ID -> {'doc', 'seq', 'keys'}，
+        # 使用前从增量日志补齐其他进程上的更新
+        self._texts: Dict[str, Dict] = {}
+        
+        # 标注写入缓冲：合并连续修改，定时批量落库后确认
+        config = app.config if app else {}
+        self.annotation_buffer = AnnotationWriteBuffer(
+            flush_interval_ms=config.get('ANNOTATION_FLUSH_INTERVAL_MS', 200),
+            max_batch=config.get('ANNOTATION_FLUSH_BATCH', 100)
+        )
+        
+        # 学习进度：内存中只保留最新进度，定时批量写入
+        self.progress_store = get_progress_store()
+        self.progress_store.flush_interval = config.get('PROGRESS_FLUSH_INTERVAL', 5)
+        
+        # 快照中累积多少条共享文本更新后压缩为一条完整状态
+        self.text_compact_updates = config.get('SYNC_TEXT_COMPACT_UPDATES', 200)
+        
+        # 紧凑编码：使用紧凑编码的连接加入会话的 :msgpack 房间，广播按会话编码一次；
+        # 配置了消息队列时其他进程上可能有这类连接，总是编码
+        self.compact_encoding = config.get('SYNC_COMPACT_ENCODING', True)
+        self._always_encode = bool(config.get('SYNC_MESSAGE_QUEUE'))
+        self._codecs: Dict[str, SessionCodec] = {}
+        self._compact_connections: Dict[str, int] = {}
+        
+        # 高频可合并事件按会话合并后定时批量广播；每个连接的上行事件限流
+        self.batch_interval_ms = config.get('SYNC_BATCH_INTERVAL_MS', 50)
+        self.batcher = BroadcastBatcher()
+        self.rate_limiter = RateLimiter(
+            rate=config.get('SYNC_RATE_LIMIT', 20),
+            burst=config.get('SYNC_RATE_BURST', 40)
+        )
+        
+        # 会话生命周期：定时刷新本进程参与者的心跳，清理心跳超时的参与者和没有参与者的会话
+        self.heartbeat_interval = config.get('SYNC_HEARTBEAT_INTERVAL', 30)
+        self.presence_timeout = config.get('SYNC_PRESENCE_TIMEOUT', 90)
+        self.max_participants = config.get('SYNC_MAX_PARTICIPANTS', 200)
+        # 清理掉的参与者数、失效连接数（统计用）
+        self.swept_participants = 0
+        self.dropped_connections = 0
+        
+        if app is not None:
+            self.socketio.start_background_task(self._flush_loop)
+        if self.batch_interval_ms > 0:
+            self.socketio.start_background_task(self._batch_loop)
+        if self.heartbeat_interval > 0 and self.presence_timeout > 0:
+            self.socketio.start_background_task(self._lifecycle_loop)
         
         # 注册WebSocket事件处理器
         self._register_handlers()
@@ -48,26 +125,36 @@ class SyncService:
             try:
                 user_id = auth.get('userId') if auth else None
                 user_type = auth.get('userType') if auth else None
-                session_type = auth.get('sessionType', 'learning')
+                session_type = auth.get('sessionType', 'learning') if auth else 'learning'
+                course_id = auth.get('courseId') if auth else None
+                encoding = sync_codec.negotiate(auth.get('encoding') if auth else None, self.compact_encoding)
                 
                 if not user_id:
                     logger.warning("连接被拒绝：缺少用户ID")
                     return False
                 
                 # 获取用户信息
-                user = User.query.get(user_id)
+                user = self._run_db(self._load_user, user_id)
                 if not user:
                     logger.warning(f"连接被拒绝：用户不存在 {user_id}")
                     return False
                 
-                # 创建或加入会话
-                session_id = self._create_or_join_session(user, session_type)
-                
-                # 记录用户会话
-                self.user_sessions[user_id] = session_id
+                # 创建或加入会话，并记录连接对应的用户
+                session_id = self._create_or_join_session(user, session_type, course_id, encoding)
+                if not session_id:
+                    logger.warning(f"连接被拒绝：会话参与者已满 {user_id}")
+                    return False
+                self._register_connection(request.sid, user, session_id, encoding)
                 
                 logger.info(f"用户 {user.nickname} 连接到会话 {session_id}")
                 
+                # 告知客户端紧凑编码的字段表，之后的同步事件均为二进制帧
+                if encoding == sync_codec.ENCODING_MSGPACK:
+                    self.socketio.emit('codec', sync_codec.codec_info(), to=request.sid)
+                
+                # 新加入的客户端收到快照，带 lastSeq 重连的客户端只补发错过的增量
+                self._sync_client(request.sid, session_id, auth.get('lastSeq'))
+                
                 # 通知会话参与者更新
                 self._notify_participant_update(session_id)
                 
@@ -81,14 +168,17 @@ class SyncService:
         def handle_disconnect():
             """处理客户端断开连接"""
             try:
-                # 获取当前用户的会话
-                user_id = self._get_current_user_id()
-                if user_id and user_id in self.user_sessions:
-                    session_id = self.user_sessions[user_id]
-                    
+                # 注销连接，用户的最后一个连接断开时才离开会话
+                user_id, session_id, last_connection = self._unregister_connection(request.sid)
+                self.rate_limiter.forget(request.sid)
+                if user_id and session_id and last_connection:
                     # 从会话中移除用户
                     self._leave_session(user_id, session_id)
                     
+                    # 尽快写入该用户的学习进度
+                    if self.app is not None:
+                        self.socketio.start_background_task(self._flush_progress)
+                    
                     # 通知会话参与者更新
                     self._notify_participant_update(session_id)
                     
@@ -110,16 +200,48 @@ class SyncService:
                     logger.warning("标注同步失败：缺少必要参数")
                     return
                 
-                # 保存标注到数据库
-                self._save_annotation(annotation, action, user_id)
+                # 只能向自己所在的会话广播
+                if not self._in_session(session_id):
+                    logger.warning(f"标注同步被拒绝：用户 {user_id} 不在会话 {session_id} 中")
+                    return
+                
+                if not self._allow('annotation-change', data):
+                    return
+                
+                # 锚定在共享文本字符上的标注，按当前文本换算出落库的起止位置
+                self._resolve_anchor(session_id, annotation)
+                
+                # 写入缓冲区，批量落库后通过 annotation-ack 确认；
+                # 达到批量条数时立即写入，未启动后台写入时直接写入
+                try:
+                    flush_now = self.annotation_buffer.submit(session_id, user_id, annotation, action)
+                except AnnotationValidationError as e:
+                    # 无法落库的标注不广播，直接向发送者确认失败
+                    logger.warning(f"标注同步被拒绝：{e}")
+                    self._emit_to_connection(request.sid, 'annotation-ack', {
+                        'sessionId': session_id,
+                        'acks': [{
+                            'action': action,
+                            'clientId': annotation.get('clientId'),
+                            'id': annotation.get('id'),
+                            'userId': user_id,
+                            'success': False,
+                            'error': str(e)
+                        }]
+                    })
+                    return
                 
-                # 广播给会话中的其他用户
-                self._broadcast_to_session(session_id, 'annotation-sync', {
+                # 记入会话快照并广播给会话中的其他用户；
+                # 先于写入确认，快照中已有该标注时确认附带的数据库ID才能合并进去
+                self._publish(session_id, 'annotation-sync', {
                     'annotation': annotation,
                     'action': action,
                     'userId': user_id,
                     'timestamp': datetime.utcnow().isoformat()
-                }, exclude_user=user_id)
+                }, self._annotation_changes(annotation, action), exclude_sid=request.sid)
+                
+                if flush_now or self.app is None:
+                    self._flush_annotations()
                 
                 logger.info(f"标注同步成功：用户 {user_id}, 动作 {action}")
                 
@@ -138,15 +260,23 @@ class SyncService:
                     logger.warning("进度同步失败：缺少必要参数")
                     return
                 
-                # 保存进度到数据库
-                self._save_progress(progress, user_id)
+                # 只能向自己所在的会话广播
+                if not self._in_session(session_id):
+                    logger.warning(f"进度同步被拒绝：用户 {user_id} 不在会话 {session_id} 中")
+                    return
+                
+                # 记录最新进度，定时批量写入数据库；未启动后台写入时直接写入
+                self.progress_store.record(user_id, progress)
+                if self.app is None:
+                    self.progress_store.flush()
                 
-                # 广播给会话中的其他用户
-                self._broadcast_to_session(session_id, 'progress-sync', {
+                # 记入会话快照并广播给会话中的其他用户（同一用户一个批处理周期内只广播最新进度，
+                # 因此不限流：超出速率的上报只会合并掉，不会增加广播）
+                self._queue(session_id, 'progress-sync', {
                     'progress': progress,
                     'userId': user_id,
                     'timestamp': datetime.utcnow().isoformat()
-                }, exclude_user=user_id)
+                }, [('progress', str(user_id), 'set', progress)])
                 
                 logger.info(f"进度同步成功：用户 {user_id}")
                 
@@ -165,229 +295,718 @@ class SyncService:
                     logger.warning("内容同步失败：缺少必要参数")
                     return
                 
-                # 只有教师可以更新内容
-                user = User.query.get(user_id)
-                if not user or user.user_type != 'teacher':
+                # 只能向自己所在的会话广播
+                if not self._in_session(session_id):
+                    logger.warning(f"内容同步被拒绝：用户 {user_id} 不在会话 {session_id} 中")
+                    return
+                
+                # 只有教师可以更新内容（用户类型取自连接时记录的参与者信息）
+                if self._get_user_type() != 'teacher':
                     logger.warning(f"内容更新被拒绝：用户 {user_id} 不是教师")
                     return
                 
-                # 广播给会话中的其他用户
-                self._broadcast_to_session(session_id, 'content-update', {
+                if not self._allow('content-update', data):
+                    return
+                
+                # 记入会话快照并广播给会话中的其他用户
+                self._publish(session_id, 'content-update', {
                     'content': content,
                     'userId': user_id,
                     'timestamp': datetime.utcnow().isoformat()
-                }, exclude_user=user_id)
+                }, [('content', 'current', 'set', content)], exclude_sid=request.sid)
                 
                 logger.info(f"内容更新成功：教师 {user_id}")
                 
             except Exception as e:
                 logger.error(f"处理内容更新失败: {e}")
         
+        @self.socketio.on('text-update')
+        def handle_text_update(data):
+            """处理共享文本更新（CRDT 二进制更新，见 services/text_crdt.py）"""
+            try:
+                user_id = self._get_current_user_id()
+                connection = self._get_connection()
+                session_id = data.get('sessionId')
+                update = data.get('update')
+                
+                if not all([user_id, session_id, update]):
+                    logger.warning("文本同步失败：缺少必要参数")
+                    return
+                
+                # 只能向自己所在的会话广播
+                if not self._in_session(session_id):
+                    logger.warning(f"文本同步被拒绝：用户 {user_id} 不在会话 {session_id} 中")
+                    return
+                
+                if not self._allow('text-update', data):
+                    return
+                
+                # 二进制传输时为 bytes，JSON 传输时为 base64 字符串
+                if isinstance(update, str):
+                    update = base64.b64decode(update)
+                if len(update) > MAX_TEXT_UPDATE_SIZE:
+                    logger.warning(f"文本同步被拒绝：更新过大 {len(update)} 字节")
+                    return
+                
+                # 插入操作只能使用本连接的站点编号，防止伪造其他站点的字符ID
+                site_id = connection['site_id']
+                if any(op[0] == 'insert' and op[1][1] != site_id for op in decode_update(update)):
+                    logger.warning(f"文本同步被拒绝：用户 {user_id} 的插入操作使用了其他站点编号")
+                    return
+                
+                key = self._text_update_key(update)
+                encoded = base64.b64encode(update).decode('ascii')
+                with self._lock:
+                    replica = self._text_replica(session_id)
+                    replica['doc'].apply(update, max_pending=MAX_PENDING_TEXT_OPS)
+                    replica['keys'].add(key)
+                
+                # 记入会话快照并广播：日志和快照中为 base64，实时广播直接发送二进制
+                event = {
+                    'userId': user_id,
+                    'siteId': connection['site_id'],
+                    'timestamp': datetime.utcnow().isoformat()
+                }
+                self._publish(session_id, 'text-update', {**event, 'key': key, 'update': encoded},
+                              [('text', key, 'set', encoded)], exclude_sid=request.sid,
+                              wire_data={**event, 'update': update})
+                
+                self._compact_text(session_id)
+                
+            except CRDTDecodeError as e:
+                logger.warning(f"文本同步被拒绝：{e}")
+            except Exception as e:
+                logger.error(f"处理文本更新失败: {e}")
+        
         @self.socketio.on('interaction')
         def handle_interaction(data):
             """处理互动事件"""
             try:
                 user_id = self._get_current_user_id()
-                session_id = self.user_sessions.get(user_id)
+                connection = self._get_connection()
+                session_id = connection['session_id'] if connection else None
                 
                 if not session_id:
                     logger.warning("互动失败：用户未在会话中")
                     return
                 
-                # 广播互动事件
-                self._broadcast_to_session(session_id, 'interaction', {
+                # 互动可以合并，超出速率时直接丢弃
+                if not self.rate_limiter.allow(request.sid):
+                    logger.debug(f"互动事件超出速率被丢弃：用户 {user_id}")
+                    return
+                
+                # 广播互动事件（不记入增量日志）
+                self._queue(session_id, 'interaction', {
                     **data,
                     'userId': user_id,
                     'timestamp': datetime.utcnow().isoformat()
-                })
+                }, log=False)
                 
                 logger.info(f"互动事件：用户 {user_id}")
                 
             except Exception as e:
                 logger.error(f"处理互动失败: {e}")
+        
+        @self.socketio.on('sync-request')
+        def handle_sync_request(data):
+            """客户端发现序号不连续时请求补发增量（或快照）"""
+            try:
+                connection = self._get_connection()
+                if not connection:
+                    logger.warning("同步请求失败：用户未在会话中")
+                    return
+                
+                self._sync_client(request.sid, connection['session_id'], (data or {}).get('lastSeq'))
+                
+            except Exception as e:
+                logger.error(f"处理同步请求失败: {e}")
     
-    def _create_or_join_session(self, user: User, session_type: str) -> str:
-        """创建或加入会话"""
-        # 生成会话ID
-        session_id = f"{session_type}_{user.id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+    def _create_or_join_session(self, user: User, session_type: str, course_id: Optional[int] = None,
+                                encoding: str = sync_codec.ENCODING_JSON) -> Optional[str]:
+        """创建或加入会话，会话参与者已满时返回 None"""
+        # 同一用户的多个连接（可能在不同进程上）共用一个会话
+        session_id = self.store.get_user_session(user.id)
+        if session_id and not self.store.get_session(session_id):
+            session_id = None
         
-        # 如果是学生，查找是否有对应的教师会话
-        if user.user_type == 'student':
-            # 查找该学生的活跃课程
-            active_course = Course.query.filter_by(
-                student_id=user.id,
-                status='active'
-            ).first()
-            
-            if active_course:
-                # 查找教师的会话
-                teacher_session = None
-                for sid, session_info in self.active_sessions.items():
-                    if (session_info.get('teacher_id') == active_course.teacher_id and 
-                        session_info.get('course_id') == active_course.id):
-                        teacher_session = sid
-                        break
-                
-                if teacher_session:
-                    session_id = teacher_session
-        
-        # 加入会话房间
-        join_room(session_id)
+        course_key = None
+        if not session_id:
+            course = self._run_db(self._find_course, user, course_id)
+            if course:
+                course_key = (course.teacher_id, course.id)
+                session_id = self.store.get_course_session(course_key)
+        
+        if not session_id:
+            # 生成会话ID
+            session_id = f"{session_type}_{user.id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+            if course_key:
+                # 教师开课或学生先进入课堂时建立课程索引，并发创建时以先登记的为准
+                session_id = self.store.claim_course_session(course_key, session_id)
         
         # 初始化会话信息
-        if session_id not in self.active_sessions:
-            self.active_sessions[session_id] = {
-                'session_id': session_id,
-                'session_type': session_type,
-                'created_at': datetime.utcnow().isoformat(),
-                'participants': [],
-                'course_id': None,
-                'teacher_id': None,
-                'student_ids': []
-            }
+        created = self.store.create_session(session_id, {
+            'session_id': session_id,
+            'session_type': session_type,
+            'created_at': datetime.utcnow().isoformat(),
+            'course_id': course_key[1] if course_key else None,
+            'teacher_id': course_key[0] if course_key else None
+        })
+        if created and course_key:
+            self._seed_course_annotations(session_id, course_key[1])
+        
+        # 限制每个会话的参与者数（已在会话中的用户打开新连接不受限制）
+        if self.max_participants and not created:
+            participants = (self.store.get_session(session_id) or {}).get('participants', {})
+            if user.id not in participants and len(participants) >= self.max_participants:
+                return None
         
-        # 添加参与者
-        participant_info = {
+        # 添加参与者（已在会话中时不重复添加）
+        self.store.add_participant(session_id, {
             'user_id': user.id,
             'user_type': user.user_type,
             'username': user.username,
             'nickname': user.nickname,
             'joined_at': datetime.utcnow().isoformat()
-        }
-        
-        session_info = self.active_sessions[session_id]
-        
-        # 避免重复添加
-        existing_participant = next(
-            (p for p in session_info['participants'] if p['user_id'] == user.id),
-            None
-        )
-        
-        if not existing_participant:
-            session_info['participants'].append(participant_info)
+        })
         
         # 更新会话角色信息
         if user.user_type == 'teacher':
-            session_info['teacher_id'] = user.id
-        elif user.user_type == 'student':
-            if user.id not in session_info['student_ids']:
-                session_info['student_ids'].append(user.id)
+            self.store.update_session(session_id, teacher_id=user.id)
+        
+        # 加入会话房间（按连接的编码）
+        join_room(self._room(session_id, encoding))
         
         return session_id
     
+    @staticmethod
+    def _load_user(user_id) -> Optional[User]:
+        return User.query.get(user_id)
+    
+    def _find_course(self, user: User, course_id: Optional[int] = None) -> Optional[Course]:
+        """查找用户要进入的课程：连接时指定了课程则使用该课程，学生默认进入进行中的课程"""
+        if course_id:
+            course = Course.query.get(course_id)
+            if course and user.id in (course.teacher_id, course.student_id):
+                return course
+            return None
+        
+        if user.user_type == 'student':
+            return Course.query.filter_by(
+                student_id=user.id,
+                status=CourseStatus.ACTIVE
+            ).first()
+        return None
+    
+    def _register_connection(self, sid: str, user: User, session_id: str, encoding: str = sync_codec.ENCODING_JSON):
+        """记录连接对应的用户和用户当前会话，并为连接分配共享文本站点编号"""
+        site_id = self.store.allocate_site_id(session_id)
+        with self._lock:
+            self.connections[sid] = {
+                'user_id': user.id,
+                'user_type': user.user_type,
+                'session_id': session_id,
+                'site_id': site_id,
+                'encoding': encoding
+            }
+            if encoding == sync_codec.ENCODING_MSGPACK:
+                self._compact_connections[session_id] = self._compact_connections.get(session_id, 0) + 1
+        self.store.add_connection(user.id)
+        self.store.set_user_session(user.id, session_id)
+    
+    def _unregister_connection(self, sid: str) -> Tuple[Optional[int], Optional[str], bool]:
+        """注销连接，返回 (用户ID, 会话ID, 是否为该用户的最后一个连接)"""
+        with self._lock:
+            connection = self.connections.pop(sid, None)
+            if connection and connection['encoding'] == sync_codec.ENCODING_MSGPACK:
+                session_id = connection['session_id']
+                self._compact_connections[session_id] -= 1
+                if not self._compact_connections[session_id]:
+                    del self._compact_connections[session_id]
+        if connection is None:
+            return None, None, False
+        
+        remaining = self.store.remove_connection(connection['user_id'])
+        return connection['user_id'], connection['session_id'], remaining == 0
+    
     def _leave_session(self, user_id: int, session_id: str):
         """离开会话"""
         leave_room(session_id)
+        leave_room(self._room(session_id, sync_codec.ENCODING_MSGPACK))
+        self._remove_participant(user_id, session_id)
         
-        if session_id in self.active_sessions:
-            session_info = self.active_sessions[session_id]
-            session_info['participants'] = [
-                p for p in session_info['participants'] 
-                if p['user_id'] != user_id
-            ]
-            
-            # 如果会话没有参与者，清理会话
-            if not session_info['participants']:
-                del self.active_sessions[session_id]
+    def _remove_participant(self, user_id: int, session_id: str):
+        """从会话中移除参与者，会话没有参与者时删除会话（不需要连接上下文）"""
+        remaining = self.store.remove_participant(session_id, user_id)
+        self.store.release_user_session(user_id, session_id)
         
-        if user_id in self.user_sessions:
-            del self.user_sessions[user_id]
+        # 如果会话没有参与者，清理会话和课程索引
+        if not remaining:
+            session_info = self.store.get_session(session_id)
+            if session_info and session_info['course_id']:
+                self.store.release_course_session((session_info['teacher_id'], session_info['course_id']), session_id)
+            self.store.delete_session(session_id)
+            with self._lock:
+                self._texts.pop(session_id, None)
+                self._codecs.pop(session_id, None)
+            self.batcher.discard(session_id)
     
     def _notify_participant_update(self, session_id: str):
         """通知参与者更新"""
-        if session_id in self.active_sessions:
-            session_info = self.active_sessions[session_id]
-            self._broadcast_to_session(session_id, 'participant-update', {
-                'participants': session_info['participants'],
-                'session_info': {
-                    'session_id': session_id,
-                    'session_type': session_info['session_type'],
-                    'participant_count': len(session_info['participants'])
-                }
+        session_info = self.store.get_session(session_id)
+        if not session_info:
+            return
+        
+        participants = list(session_info['participants'].values())
+        self._broadcast_to_session(session_id, 'participant-update', {
+            'participants': participants,
+            'session_info': {
+                'session_id': session_id,
+                'session_type': session_info['session_type'],
+                'participant_count': len(participants)
+            }
+        })
+    
+    def _publish(self, session_id: str, event: str, data: Dict, changes: Optional[List] = None,
+                 exclude_sid: Optional[str] = None, wire_data: Optional[Dict] = None):
+        """记录会话事件（分配序号、更新快照）后广播，客户端按 seq 判断是否漏收
+
+        wire_data 为实时广播使用的数据（如二进制形式），默认与记录的数据相同
+        """
+        seq = self.store.apply_event(session_id, event, data, changes)
+        self._broadcast_to_session(session_id, event, {**(wire_data or data), 'seq': seq}, exclude_sid=exclude_sid)
+    
+    def _allow(self, event: str, data: Dict) -> bool:
+        """上行事件限流：超出速率时拒绝并告知客户端稍后重发（用于不能合并丢弃的事件）"""
+        if self.rate_limiter.allow(request.sid):
+            return True
+        logger.warning(f"{event} 超出速率被拒绝：用户 {self._get_current_user_id()}")
+        self._emit_to_connection(request.sid, 'rate-limited', {
+            'event': event,
+            'clientId': (data.get('annotation') or {}).get('clientId'),
+            'retryAfterMs': self.rate_limiter.retry_after_ms(request.sid)
+        })
+        return False
+    
+    def _queue(self, session_id: str, event: str, data: Dict, changes: Optional[List] = None, log: bool = True):
+        """暂存可合并的广播，由批处理任务统一发出；未启用批处理时立即广播给其他连接"""
+        if self.batch_interval_ms > 0:
+            self.batcher.add(session_id, event, data, changes, log)
+        elif log:
+            self._publish(session_id, event, data, changes, exclude_sid=request.sid)
+        else:
+            self._broadcast_to_session(session_id, event, data, exclude_sid=request.sid)
+    
+    def _flush_batches(self):
+        """发出暂存的广播：每个会话一条 sync-batch（发送者也会收到自己的事件）
+
+        需要记入增量日志的事件在此时分配序号，与立即广播的事件序号连续
+        """
+        for session_id, entries in self.batcher.take().items():
+            events = []
+            for event, data, changes, log in entries:
+                if log:
+                    data = {**data, 'seq': self.store.apply_event(session_id, event, data, changes)}
+                events.append({'event': event, 'data': data})
+            self._broadcast_to_session(session_id, 'sync-batch', {'sessionId': session_id, 'events': events})
+    
+    def _batch_loop(self):
+        """后台任务：定时发出批量广播"""
+        interval = self.batch_interval_ms / 1000
+        while True:
+            self.socketio.sleep(interval)
+            try:
+                self._flush_batches()
+            except Exception as e:
+                logger.error(f"批量广播失败: {e}")
+    
+    @staticmethod
+    def _annotation_changes(annotation: Dict, action: str) -> List:
+        """标注操作对应的快照变更，标注以 clientId（没有时用标注ID）为键"""
+        key = annotation.get('clientId') or annotation.get('id')
+        if not key:
+            return []
+        if action == 'add':
+            return [('annotations', str(key), 'set', annotation)]
+        if action == 'update':
+            return [('annotations', str(key), 'merge', annotation)]
+        if action == 'delete':
+            return [('annotations', str(key), 'delete', None)]
+        return []
+    
+    def _sync_client(self, sid: str, session_id: str, last_seq=None):
+        """向客户端补发 last_seq 之后的增量，无法补发时发送完整快照"""
+        deltas = None
+        if last_seq is not None:
+            try:
+                deltas = self.store.deltas_since(session_id, int(last_seq))
+            except (TypeError, ValueError):
+                deltas = None
+        
+        # 客户端生成共享文本更新时使用的站点编号
+        connection = self.connections.get(sid)
+        site_id = connection['site_id'] if connection else None
+        
+        if deltas is not None:
+            self._emit_to_connection(sid, 'session-deltas', {
+                'sessionId': session_id,
+                'siteId': site_id,
+                'fromSeq': int(last_seq),
+                'seq': deltas[-1]['seq'] if deltas else int(last_seq),
+                'events': deltas
+            })
+        else:
+            self._emit_to_connection(sid, 'session-snapshot', {
+                'sessionId': session_id,
+                'siteId': site_id,
+                **self.store.get_snapshot(session_id)
             })
     
-    def _broadcast_to_session(self, session_id: str, event: str, data: Dict, exclude_user: Optional[int] = None):
-        """向会话中的所有用户广播消息"""
-        self.socketio.emit(event, data, room=session_id, skip_sid=exclude_user)
+    @staticmethod
+    def _text_update_key(update: bytes) -> str:
+        """共享文本更新在快照中的键（内容摘要，重复的更新只保存一份）"""
+        return hashlib.sha1(update).hexdigest()[:16]
     
-    def _get_current_user_id(self) -> Optional[int]:
-        """获取当前用户ID"""
-        # 这里需要从Flask-SocketIO的上下文中获取用户ID
-        # 实际实现可能需要根据具体的认证方式调整
+    def _text_replica(self, session_id: str) -> Dict:
+        """本进程上会话共享文本的副本，先从增量日志补齐其他进程上的更新（调用方持有 _lock）
+
+        keys 为副本已包含的快照条目，压缩时可以安全删除
+        """
+        replica = self._texts.get(session_id)
+        deltas = self.store.deltas_since(session_id, replica['seq']) if replica else None
+        
+        if deltas is None:
+            # 首次使用或错过的增量已不在日志中：由快照重建
+            snapshot = self.store.get_snapshot(session_id)
+            updates = [base64.b64decode(encoded) for encoded in snapshot['text']]
+            replica = {
+                'doc': TextDocument.from_updates(updates),
+                'seq': snapshot['seq'],
+                'keys': {self._text_update_key(update) for update in updates}
+            }
+            self._texts[session_id] = replica
+            return replica
+        
+        for delta in deltas:
+            if delta['event'] == 'text-update':
+                replica['doc'].apply(base64.b64decode(delta['data']['update']))
+                replica['keys'].add(delta['data']['key'])
+            elif delta['event'] == 'text-compact':
+                replica['keys'].add(delta['data']['key'])
+            replica['seq'] = delta['seq']
+        return replica
+    
+    def _compact_text(self, session_id: str):
+        """快照中的共享文本更新过多时，把副本已包含的更新替换为一条完整状态
+
+        只删除副本已包含的条目，其他进程同时写入的更新保留在快照中
+        """
+        with self._lock:
+            replica = self._texts.get(session_id)
+            if not replica or len(replica['keys']) < self.text_compact_updates:
+                return
+            state = replica['doc'].encode_state()
+            key = self._text_update_key(state)
+            changes = [('text', old_key, 'delete', None) for old_key in replica['keys'] if old_key != key]
+            changes.append(('text', key, 'set', base64.b64encode(state).decode('ascii')))
+            replica['keys'] = {key}
+        
+        self.store.apply_event(session_id, 'text-compact', {'key': key}, changes)
+        logger.info(f"会话 {session_id} 共享文本压缩：{len(changes) - 1} 条更新")
+    
+    def _resolve_anchor(self, session_id: str, annotation: Dict):
+        """标注的 anchor {'start', 'end'} 为首尾字符的ID，换算为当前文本中的 position"""
+        anchor = annotation.get('anchor')
+        if not isinstance(anchor, dict):
+            return
+        
+        with self._lock:
+            doc = self._text_replica(session_id)['doc']
+            start = doc.offset_of(anchor.get('start'))
+            end = doc.offset_of(anchor.get('end'))
+        if start is not None and end is not None:
+            annotation['position'] = {'start': start, 'end': max(end + 1, start)}
+    
+    def _seed_course_annotations(self, session_id: str, course_id: int):
+        """课堂会话创建时载入课程已有的标注作为初始快照"""
+        self.store.seed_state(session_id, 'annotations', self._run_db(self._load_course_annotations, course_id))
+    
+    @staticmethod
+    def _load_course_annotations(course_id: int) -> Dict[str, Dict]:
+        """课程已有的标注（按快照格式，以标注ID为键）"""
+        annotations = CourseAnnotation.query.filter_by(course_id=course_id).order_by(CourseAnnotation.id).all()
+        return {
+            str(annotation.id): {
+                'id': annotation.id,
+                'courseId': annotation.course_id,
+                'userId': annotation.user_id,
+                'type': annotation.annotation_type.value if annotation.annotation_type else 'highlight',
+                'text': annotation.text_content,
+                'content': annotation.annotation_text,
+                'color': annotation.color,
+                'position': {'start': annotation.start_position, 'end': annotation.end_position}
+            }
+            for annotation in annotations
+        }
+    
+    @staticmethod
+    def _room(session_id: str, encoding: str) -> str:
+        """会话房间：JSON 连接使用会话ID，紧凑编码的连接使用 {会话ID}:msgpack"""
+        if encoding == sync_codec.ENCODING_MSGPACK:
+            return f"{session_id}:{encoding}"
+        return session_id
+    
+    def _broadcast_to_session(self, session_id: str, event: str, data: Dict, exclude_sid: Optional[str] = None):
+        """向会话中的所有连接广播消息，exclude_sid 为不需要接收的连接（通常是发送者）
+
+        配置了 message_queue 时，SocketIO 会把广播转发到其他进程上的连接
+        """
+        self.socketio.emit(event, data, room=session_id, skip_sid=exclude_sid)
+        
+        if not sync_codec.available() or not (self._always_encode or self._compact_connections.get(session_id)):
+            return
+        with self._lock:
+            codec = self._codecs.setdefault(session_id, SessionCodec())
+        self.socketio.emit(event, codec.encode(data), room=self._room(session_id, sync_codec.ENCODING_MSGPACK),
+                           skip_sid=exclude_sid)
+        
+        dictionary = codec.take_dictionary()
+        if dictionary:
+            self._announce_dictionary(session_id, codec, dictionary)
+    
+    def _announce_dictionary(self, session_id: str, codec: SessionCodec, dictionary: Tuple[bytes, bytes]):
+        """下发会话新生成的预设字典并记入快照，之后的广播开始使用该字典"""
+        dictionary_id = dictionary[0].hex()
+        self.store.seed_state(session_id, 'dictionaries', {
+            dictionary_id: base64.b64encode(dictionary[1]).decode('ascii')
+        })
+        self.socketio.emit('codec-dictionary', sync_codec.encode_frame(sync_codec.pack({
+            'id': dictionary_id,
+            'dictionary': dictionary[1]
+        })), room=self._room(session_id, sync_codec.ENCODING_MSGPACK))
+        codec.activate(dictionary)
+        logger.info(f"会话 {session_id} 紧凑编码字典 {dictionary_id}（{len(dictionary[1])} 字节）")
+    
+    def _emit_to_connection(self, sid: str, event: str, data: Dict):
+        """向单个连接发送消息，按连接协商的编码"""
+        connection = self.connections.get(sid)
+        if connection and connection['encoding'] == sync_codec.ENCODING_MSGPACK:
+            self.socketio.emit(event, sync_codec.encode_frame(sync_codec.pack(data)), to=sid)
+        else:
+            self.socketio.emit(event, data, to=sid)
+    
+    def _get_connection(self) -> Optional[Dict]:
+        """获取当前连接的信息（连接时根据认证信息记录）"""
         try:
-            from flask import request
-            return request.sid  # 临时实现，实际需要从认证信息中获取
-        except:
+            return self.connections.get(request.sid)
+        except RuntimeError:
+            # 不在请求上下文中
             return None
     
-    def _save_annotation(self, annotation: Dict, action: str, user_id: int):
-        """保存标注到数据库"""
-        try:
-            if action == 'add':
-                course_annotation = CourseAnnotation(
-                    course_id=annotation.get('courseId'),
-                    user_id=user_id,
-                    annotation_type=annotation.get('type', 'highlight'),
-                    text_content=annotation.get('text', ''),
-                    annotation_text=annotation.get('content', ''),
-                    color=annotation.get('color', '#FFD700'),
-                    start_position=annotation.get('position', {}).get('start', 0),
-                    end_position=annotation.get('position', {}).get('end', 0)
-                )
-                db.session.add(course_annotation)
-                
-            elif action == 'update':
-                annotation_id = annotation.get('id')
-                if annotation_id:
-                    existing = CourseAnnotation.query.get(annotation_id)
-                    if existing and existing.user_id == user_id:
-                        existing.annotation_text = annotation.get('content', existing.annotation_text)
-                        existing.color = annotation.get('color', existing.color)
-                        existing.updated_at = datetime.utcnow()
-                        
-            elif action == 'delete':
-                annotation_id = annotation.get('id')
-                if annotation_id:
-                    existing = CourseAnnotation.query.get(annotation_id)
-                    if existing and existing.user_id == user_id:
-                        db.session.delete(existing)
-            
-            db.session.commit()
-            logger.info(f"标注保存成功：{action} - 用户 {user_id}")
-            
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"保存标注失败: {e}")
-    
-    def _save_progress(self, progress: Dict, user_id: int):
-        """保存学习进度"""
-        try:
-            # 这里可以保存到专门的进度表或者更新课程会话
-            # 暂时记录到日志
-            logger.info(f"进度更新：用户 {user_id}, 进度 {progress}")
-            
-        except Exception as e:
-            logger.error(f"保存进度失败: {e}")
+    def _get_current_user_id(self) -> Optional[int]:
+        """获取当前连接对应的用户ID"""
+        connection = self._get_connection()
+        return connection['user_id'] if connection else None
+    
+    def _get_user_type(self) -> Optional[str]:
+        """获取当前连接的用户类型"""
+        connection = self._get_connection()
+        return connection['user_type'] if connection else None
+    
+    def _in_session(self, session_id: Optional[str]) -> bool:
+        """当前连接是否在指定会话中"""
+        connection = self._get_connection()
+        return connection is not None and session_id is not None and connection['session_id'] == session_id
+    
+    def _flush_loop(self):
+        """后台任务：定时批量写入标注和学习进度"""
+        interval = self.annotation_buffer.flush_interval_ms / 1000
+        last_progress_flush = time.monotonic()
+        while True:
+            self.socketio.sleep(interval)
+            self._flush_annotations()
+            if time.monotonic() - last_progress_flush >= self.progress_store.flush_interval:
+                last_progress_flush = time.monotonic()
+                self._flush_progress()
+    
+    def _lifecycle_loop(self):
+        """后台任务：定时刷新心跳并清理过期的参与者和会话"""
+        while True:
+            self.socketio.sleep(self.heartbeat_interval)
+            try:
+                self._heartbeat()
+                self._sweep()
+            except Exception as e:
+                logger.error(f"清理同步会话失败: {e}")
+    
+    def _heartbeat(self):
+        """清理已失效的本地连接（未收到断开事件），刷新其余连接对应参与者的心跳"""
+        manager = self.socketio.server.manager
+        with self._lock:
+            connections = list(self.connections.items())
+        
+        alive = []
+        for sid, connection in connections:
+            if manager.is_connected(sid, '/'):
+                alive.append((connection['session_id'], connection['user_id']))
+                continue
+            user_id, session_id, last_connection = self._unregister_connection(sid)
+            self.rate_limiter.forget(sid)
+            self.dropped_connections += 1
+            if user_id and session_id and last_connection:
+                self._remove_participant(user_id, session_id)
+                self._notify_participant_update(session_id)
+        
+        if alive:
+            self.store.touch_participants(alive)
+    
+    def _sweep(self):
+        """移除心跳超时的参与者（其所在进程已退出或连接丢失），并丢弃已删除会话的本地副本"""
+        with self._lock:
+            local = {(connection['session_id'], connection['user_id']) for connection in self.connections.values()}
+        
+        updated = set()
+        for session_id, user_id in self.store.stale_participants(time.time() - self.presence_timeout):
+            if (session_id, user_id) in local:
+                continue
+            # 用户已不在其他会话中时，连接数也随之失效
+            if self.store.get_user_session(user_id) in (None, session_id):
+                self.store.reset_connections(user_id)
+            self._remove_participant(user_id, session_id)
+            self.swept_participants += 1
+            updated.add(session_id)
+            logger.info(f"参与者心跳超时，已移出会话 {session_id}: 用户 {user_id}")
+        
+        for session_id in updated:
+            self._notify_participant_update(session_id)
+        
+        # 会话被其他进程删除后，本进程的共享文本副本和编码器不再需要
+        with self._lock:
+            cached = set(self._texts) | set(self._codecs)
+        for session_id in cached:
+            if self.store.get_session(session_id) is None:
+                with self._lock:
+                    self._texts.pop(session_id, None)
+                    self._codecs.pop(session_id, None)
+                self.batcher.discard(session_id)
+    
+    def _run_db(self, fn, *args):
+        """在事件处理器中访问数据库
+
+        协作式异步模式下数据库驱动会阻塞整个事件循环，因此放到线程池中执行
+        （使用独立的应用上下文和数据库会话，返回的模型对象已脱离会话，只读取已加载的字段）
+        """
+        if self.app is None or not async_support.is_cooperative():
+            return fn(*args)
+        
+        def call():
+            with self.app.app_context():
+                try:
+                    return fn(*args)
+                finally:
+                    db.session.remove()
+        return async_support.run_blocking(call)
+    
+    def _run_flush(self, flush, name: str):
+        """在应用上下文中执行一次批量写入（协作式异步模式下在线程池中执行）"""
+        if self.app is None:
+            # 在事件处理器中调用，已有应用上下文
+            return flush()
+        
+        def call():
+            with self.app.app_context():
+                try:
+                    return flush()
+                except Exception as e:
+                    logger.error(f"写入{name}失败: {e}")
+                finally:
+                    db.session.remove()
+        return async_support.run_blocking(call)
+    
+    def _flush_annotations(self):
+        """写入缓冲的标注，写入完成后在当前协程中发送确认（线程池中只执行数据库事务）"""
+        acks = self._run_flush(self.annotation_buffer.flush, '标注') or {}
+        for session_id, session_acks in acks.items():
+            self._ack_annotations(session_id, session_acks)
+    
+    def _flush_progress(self):
+        """写入缓冲的学习进度"""
+        return self._run_flush(self.progress_store.flush, '学习进度')
+    
+    def _ack_annotations(self, session_id: str, acks: List[Dict]):
+        """向会话确认已写入的标注，新增的标注附带数据库ID，其他参与者可据此对应 clientId"""
+        changes = [
+            ('annotations', str(ack['clientId']), 'merge', {'id': ack['id']})
+            for ack in acks if ack['action'] == 'add' and ack['success'] and ack['clientId']
+        ]
+        self._publish(session_id, 'annotation-ack', {
+            'sessionId': session_id,
+            'acks': acks
+        }, changes)
     
     def get_session_info(self, session_id: str) -> Optional[Dict]:
         """获取会话信息"""
-        return self.active_sessions.get(session_id)
+        return self.store.get_session(session_id)
     
     def get_user_session(self, user_id: int) -> Optional[str]:
         """获取用户当前会话"""
-        return self.user_sessions.get(user_id)
+        return self.store.get_user_session(user_id)
     
     def get_active_sessions(self) -> Dict[str, Dict]:
         """获取所有活跃会话"""
-        return self.active_sessions.copy()
+        return self.store.list_sessions()
+    
+    def count_active_sessions(self) -> int:
+        """活跃会话数"""
+        return self.store.count_sessions()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """同步服务的运行指标：本进程的连接和缓存、共享存储的统计以及进程内存"""
+        with self._lock:
+            local_sessions = {connection['session_id'] for connection in self.connections.values()}
+            metrics = {
+                'local_connections': len(self.connections),
+                'local_sessions': len(local_sessions),
+                'compact_connections': sum(self._compact_connections.values()),
+                'text_replicas': len(self._texts),
+                'text_nodes': sum(len(replica['doc']._chars) for replica in self._texts.values()),
+                'session_codecs': len(self._codecs)
+            }
+        metrics.update({
+            'pending_broadcasts': len(self.batcher),
+            'merged_broadcasts': self.batcher.merged,
+            'dropped_broadcasts': self.batcher.dropped,
+            'pending_annotations': len(self.annotation_buffer),
+            'pending_progress': len(self.progress_store),
+            'swept_participants': self.swept_participants,
+            'dropped_connections': self.dropped_connections,
+            'store': self.store.stats(),
+            'memory_rss_mb': _memory_rss_mb()
+        })
+        return metrics
+
+def _memory_rss_mb() -> Optional[float]:
+    """当前进程的常驻内存（MB），无法获取时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # 非 Linux 平台只能得到峰值内存（macOS 单位为字节，其他为 KB）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+    except ImportError:
+        return None
 
 # 全局同步服务实例
 sync_service = None
 
-def init_sync_service(socketio: SocketIO):
-    """初始化同步服务"""
+def init_sync_service(socketio: SocketIO, store: Optional[SessionStore] = None, app=None):
+    """初始化同步服务（传入 app 时启动后台写入任务）"""
     global sync_service
-    sync_service = SyncService(socketio)
+    sync_service = SyncService(socketio, store, app)
     return sync_service
 
 def get_sync_service() -> Optional[SyncService]:
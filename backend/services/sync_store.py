@@ -0,0 +1,641 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时同步会话存储
+保存课堂会话、参与者、课程会话索引和用户当前会话等共享状态：
+- MemorySessionStore: 进程内存储，用于单进程部署和测试
+- RedisSessionStore: Redis 存储，多个进程/节点共享同一份会话状态
+房间广播本身通过 SocketIO 的 message_queue（如 redis://）在进程间转发
+
+每个会话还保存一份状态快照（当前内容、标注、各参与者进度、共享文本）和带递增
+序号的增量日志：新加入的客户端收到一份快照，断线重连的客户端只补发错过的增量
+
+参与者带有最近心跳时间：持有连接的进程定时刷新，进程崩溃或连接异常丢失后
+心跳超时的参与者由 stale_participants() 找出并清理
+"""
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Any, Tuple
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CourseKey = Tuple[int, int]
+
+# 快照状态的组成部分：当前内容（键为 current）、标注（键为 clientId 或标注ID）、进度（键为用户ID）、
+# 共享文本（base64 编码的 CRDT 更新）、紧凑编码的预设字典（字典ID -> base64）
+STATE_SECTIONS = ('content', 'annotations', 'progress', 'text', 'dictionaries')
+
+# 快照变更：(部分, 键, 操作, 值)，操作为 set（覆盖）、merge（合并字段，键不存在时忽略）、delete
+StateChange = Tuple[str, str, str, Any]
+
+# 每个会话保留的增量条数，重连时错过的增量超过此数则改发快照
+DELTA_LOG_SIZE = 500
+
+def _apply_change(sections: Dict[str, Dict[str, Any]], change: StateChange):
+    section, key, op, value = change
+    items = sections[section]
+    if op == 'set':
+        items[key] = value
+    elif op == 'merge':
+        if key in items:
+            items[key] = {**items[key], **value}
+    elif op == 'delete':
+        items.pop(key, None)
+
+class SessionState:
+    """进程内存储中一个会话的快照和增量日志"""
+
+    __slots__ = ('seq', 'log', 'sections', 'sites')
+
+    def __init__(self, delta_log_size: int):
+        self.seq = 0
+        self.sites = 0
+        self.log = deque(maxlen=delta_log_size)
+        self.sections: Dict[str, Dict[str, Any]] = {section: {} for section in STATE_SECTIONS}
+
+class SessionStore:
+    """会话存储接口
+
+    会话信息为字典：session_id、session_type、created_at、course_id、teacher_id、
+    student_ids（列表）和 participants（用户ID -> 参与者信息）
+    """
+
+    def create_session(self, session_id: str, info: Dict[str, Any]) -> bool:
+        """创建会话，已存在时返回 False"""
+        raise NotImplementedError
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """获取会话信息（副本）"""
+        raise NotImplementedError
+
+    def update_session(self, session_id: str, **fields):
+        """更新会话字段"""
+        raise NotImplementedError
+
+    def delete_session(self, session_id: str):
+        """删除会话"""
+        raise NotImplementedError
+
+    def list_sessions(self) -> Dict[str, Dict[str, Any]]:
+        """全部会话"""
+        raise NotImplementedError
+
+    def count_sessions(self) -> int:
+        """会话数量"""
+        raise NotImplementedError
+
+    def add_participant(self, session_id: str, participant: Dict[str, Any]) -> bool:
+        """添加参与者（学生同时记入 student_ids），已在会话中时返回 False"""
+        raise NotImplementedError
+
+    def remove_participant(self, session_id: str, user_id: int) -> int:
+        """移除参与者，返回剩余参与者数"""
+        raise NotImplementedError
+
+    def touch_participants(self, entries: List[Tuple[str, int]], timestamp: Optional[float] = None):
+        """刷新参与者的心跳时间，entries 为 [(会话ID, 用户ID)]（只刷新仍在会话中的参与者）"""
+        raise NotImplementedError
+
+    def stale_participants(self, cutoff: float) -> List[Tuple[str, int]]:
+        """心跳时间早于 cutoff 的参与者 [(会话ID, 用户ID)]"""
+        raise NotImplementedError
+
+    def claim_course_session(self, course_key: CourseKey, session_id: str) -> str:
+        """登记课程对应的会话，已有会话时不覆盖，返回最终登记的会话ID"""
+        raise NotImplementedError
+
+    def get_course_session(self, course_key: CourseKey) -> Optional[str]:
+        raise NotImplementedError
+
+    def release_course_session(self, course_key: CourseKey, session_id: str):
+        """会话结束时删除课程索引（只删除指向该会话的索引）"""
+        raise NotImplementedError
+
+    def set_user_session(self, user_id: int, session_id: str):
+        raise NotImplementedError
+
+    def get_user_session(self, user_id: int) -> Optional[str]:
+        raise NotImplementedError
+
+    def release_user_session(self, user_id: int, session_id: str):
+        """用户离开会话时删除记录（只删除指向该会话的记录）"""
+        raise NotImplementedError
+
+    def add_connection(self, user_id: int) -> int:
+        """用户连接数加一，返回当前连接数"""
+        raise NotImplementedError
+
+    def remove_connection(self, user_id: int) -> int:
+        """用户连接数减一，返回剩余连接数"""
+        raise NotImplementedError
+
+    def reset_connections(self, user_id: int):
+        """清除用户的连接数（连接已全部丢失时）"""
+        raise NotImplementedError
+
+    def apply_event(self, session_id: str, event: str, data: Dict[str, Any],
+                    changes: Optional[List[StateChange]] = None) -> int:
+        """记录一条会话事件：分配递增序号、追加到增量日志并按 changes 更新快照，返回序号"""
+        raise NotImplementedError
+
+    def seed_state(self, session_id: str, section: str, items: Dict[str, Any]):
+        """初始化快照的某一部分（如课程已有的标注），不分配序号"""
+        raise NotImplementedError
+
+    def deltas_since(self, session_id: str, seq: int) -> Optional[List[Dict[str, Any]]]:
+        """序号 seq 之后的增量 [{'seq', 'event', 'data'}]，日志中已没有这些增量时返回 None"""
+        raise NotImplementedError
+
+    def get_snapshot(self, session_id: str) -> Dict[str, Any]:
+        """会话快照：{'seq', 'content', 'annotations', 'progress', 'text', 'dictionaries'}"""
+        raise NotImplementedError
+
+    def allocate_site_id(self, session_id: str) -> int:
+        """为会话中的一个连接分配共享文本的站点编号（会话内唯一，从 1 开始）"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """存储的统计信息（会话数、连接用户数等）"""
+        raise NotImplementedError
+
+class MemorySessionStore(SessionStore):
+    """进程内会话存储"""
+
+    def __init__(self, delta_log_size: int = DELTA_LOG_SIZE):
+        self._lock = threading.RLock()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._states: Dict[str, SessionState] = {}
+        self._delta_log_size = delta_log_size
+        self._course_sessions: Dict[CourseKey, str] = {}
+        self._user_sessions: Dict[int, str] = {}
+        self._connections: Dict[int, int] = {}
+        # 参与者心跳时间：会话ID -> {用户ID: 时间戳}
+        self._presence: Dict[str, Dict[int, float]] = {}
+
+    @staticmethod
+    def _copy(info: Dict[str, Any]) -> Dict[str, Any]:
+        return {**info, 'student_ids': list(info['student_ids']), 'participants': dict(info['participants'])}
+
+    def create_session(self, session_id, info):
+        with self._lock:
+            if session_id in self._sessions:
+                return False
+            self._sessions[session_id] = {**info, 'student_ids': [], 'participants': {}}
+            self._states[session_id] = SessionState(self._delta_log_size)
+            self._presence[session_id] = {}
+            return True
+
+    def get_session(self, session_id):
+        with self._lock:
+            info = self._sessions.get(session_id)
+            return self._copy(info) if info else None
+
+    def update_session(self, session_id, **fields):
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions[session_id].update(fields)
+
+    def delete_session(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._states.pop(session_id, None)
+            self._presence.pop(session_id, None)
+
+    def list_sessions(self):
+        with self._lock:
+            return {session_id: self._copy(info) for session_id, info in self._sessions.items()}
+
+    def count_sessions(self):
+        return len(self._sessions)
+
+    def add_participant(self, session_id, participant):
+        with self._lock:
+            info = self._sessions.get(session_id)
+            if info is None:
+                return False
+            self._presence[session_id][participant['user_id']] = time.time()
+            if participant['user_id'] in info['participants']:
+                return False
+            info['participants'][participant['user_id']] = participant
+            if participant['user_type'] == 'student' and participant['user_id'] not in info['student_ids']:
+                info['student_ids'].append(participant['user_id'])
+            return True
+
+    def remove_participant(self, session_id, user_id):
+        with self._lock:
+            info = self._sessions.get(session_id)
+            if info is None:
+                return 0
+            info['participants'].pop(user_id, None)
+            self._presence[session_id].pop(user_id, None)
+            return len(info['participants'])
+
+    def touch_participants(self, entries, timestamp=None):
+        timestamp = timestamp or time.time()
+        with self._lock:
+            for session_id, user_id in entries:
+                presence = self._presence.get(session_id)
+                if presence is not None and user_id in presence:
+                    presence[user_id] = timestamp
+
+    def stale_participants(self, cutoff):
+        with self._lock:
+            return [
+                (session_id, user_id)
+                for session_id, presence in self._presence.items()
+                for user_id, timestamp in presence.items()
+                if timestamp < cutoff
+            ]
+
+    def claim_course_session(self, course_key, session_id):
+        with self._lock:
+            return self._course_sessions.setdefault(course_key, session_id)
+
+    def get_course_session(self, course_key):
+        return self._course_sessions.get(course_key)
+
+    def release_course_session(self, course_key, session_id):
+        with self._lock:
+            if self._course_sessions.get(course_key) == session_id:
+                del self._course_sessions[course_key]
+
+    def set_user_session(self, user_id, session_id):
+        with self._lock:
+            self._user_sessions[user_id] = session_id
+
+    def get_user_session(self, user_id):
+        return self._user_sessions.get(user_id)
+
+    def release_user_session(self, user_id, session_id):
+        with self._lock:
+            if self._user_sessions.get(user_id) == session_id:
+                del self._user_sessions[user_id]
+
+    def add_connection(self, user_id):
+        with self._lock:
+            self._connections[user_id] = self._connections.get(user_id, 0) + 1
+            return self._connections[user_id]
+
+    def remove_connection(self, user_id):
+        with self._lock:
+            count = self._connections.get(user_id, 0) - 1
+            if count > 0:
+                self._connections[user_id] = count
+            else:
+                self._connections.pop(user_id, None)
+            return max(count, 0)
+
+    def reset_connections(self, user_id):
+        with self._lock:
+            self._connections.pop(user_id, None)
+
+    def apply_event(self, session_id, event, data, changes=None):
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                return 0
+            state.seq += 1
+            state.log.append({'seq': state.seq, 'event': event, 'data': data})
+            for change in changes or ():
+                _apply_change(state.sections, change)
+            return state.seq
+
+    def seed_state(self, session_id, section, items):
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is not None:
+                state.sections[section].update(items)
+
+    def deltas_since(self, session_id, seq):
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None or seq > state.seq:
+                return None
+            if seq == state.seq:
+                return []
+            if not state.log or state.log[0]['seq'] > seq + 1:
+                return None
+            return [entry for entry in state.log if entry['seq'] > seq]
+
+    def get_snapshot(self, session_id):
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                return {'seq': 0, 'content': None, 'annotations': [], 'progress': {}, 'text': [], 'dictionaries': {}}
+            return {
+                'seq': state.seq,
+                'content': state.sections['content'].get('current'),
+                'annotations': list(state.sections['annotations'].values()),
+                'progress': dict(state.sections['progress']),
+                'text': list(state.sections['text'].values()),
+                'dictionaries': dict(state.sections['dictionaries'])
+            }
+
+    def allocate_site_id(self, session_id):
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                return 0
+            state.sites += 1
+            return state.sites
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'sessions': len(self._sessions),
+                'participants': sum(len(info['participants']) for info in self._sessions.values()),
+                'connected_users': len(self._connections),
+                'log_entries': sum(len(state.log) for state in self._states.values()),
+                'state_items': sum(
+                    len(items) for state in self._states.values() for items in state.sections.values()
+                )
+            }
+
+class RedisSessionStore(SessionStore):
+    """Redis 会话存储
+
+    键结构（prefix 默认为 sync）：
+    - {prefix}:sessions                     所有会话ID的集合
+    - {prefix}:session:{id}                 会话字段（哈希，值为 JSON）
+    - {prefix}:session:{id}:participants    参与者（哈希，用户ID -> JSON）
+    - {prefix}:session:{id}:students        学生ID（有序集合，按加入顺序）
+    - {prefix}:session:{id}:presence        参与者心跳时间（有序集合，分数为时间戳）
+    - {prefix}:course:{teacher}:{course}    课程对应的会话ID
+    - {prefix}:user:{id}                    用户当前会话ID
+    - {prefix}:connections                  用户连接数（哈希）
+    - {prefix}:session:{id}:seq             会话事件序号
+    - {prefix}:session:{id}:log             增量日志（列表，元素为 "序号:JSON"）
+    - {prefix}:session:{id}:state:{part}    快照的各部分（哈希，值为 JSON）
+    - {prefix}:session:{id}:sites           已分配的共享文本站点编号
+    """
+
+    # 会话字段中需要保存的部分（参与者和学生单独存储）
+    SESSION_FIELDS = ('session_id', 'session_type', 'created_at', 'course_id', 'teacher_id')
+
+    # 原子地分配序号、追加增量日志并更新快照
+    # ARGV[3] 为变更列表 [[部分, 键, 操作, 值的JSON], ...]，ARGV[4] 为快照键前缀
+    # 会话已结束（KEYS[3] 会话哈希不存在）时返回 0，避免迟到的事件重新创建已删除的键
+    APPLY_EVENT_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return 0
+end
+local seq = redis.call('INCR', KEYS[1])
+redis.call('RPUSH', KEYS[2], seq .. ':' .. ARGV[1])
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+for _, change in ipairs(cjson.decode(ARGV[3])) do
+    local key = ARGV[4] .. change[1]
+    if change[3] == 'set' then
+        redis.call('HSET', key, change[2], change[4])
+    elseif change[3] == 'delete' then
+        redis.call('HDEL', key, change[2])
+    elseif change[3] == 'merge' then
+        local current = redis.call('HGET', key, change[2])
+        if current then
+            local merged = cjson.decode(current)
+            for field, value in pairs(cjson.decode(change[4])) do
+                merged[field] = value
+            end
+            redis.call('HSET', key, change[2], cjson.encode(merged))
+        end
+    end
+end
+return seq
+"""
+
+    SEED_STATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[2], unpack(ARGV))
+return 1
+"""
+
+    def __init__(self, url: str, prefix: str = 'sync', delta_log_size: int = DELTA_LOG_SIZE):
+        if redis is None:
+            raise RuntimeError('使用 Redis 会话存储需要安装 redis 包')
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        self._delta_log_size = delta_log_size
+        self._apply_event = self._redis.register_script(self.APPLY_EVENT_SCRIPT)
+        self._seed_state = self._redis.register_script(self.SEED_STATE_SCRIPT)
+
+    def _key(self, *parts) -> str:
+        return ':'.join([self._prefix, *map(str, parts)])
+
+    def create_session(self, session_id, info):
+        key = self._key('session', session_id)
+        if not self._redis.hsetnx(key, 'session_id', json.dumps(session_id)):
+            return False
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={field: json.dumps(info.get(field)) for field in self.SESSION_FIELDS})
+        pipe.sadd(self._key('sessions'), session_id)
+        pipe.execute()
+        return True
+
+    def get_session(self, session_id):
+        key = self._key('session', session_id)
+        pipe = self._redis.pipeline()
+        pipe.hgetall(key)
+        pipe.hgetall(self._key('session', session_id, 'participants'))
+        pipe.zrange(self._key('session', session_id, 'students'), 0, -1)
+        fields, participants, students = pipe.execute()
+        if not fields:
+            return None
+        info = {field: json.loads(value) for field, value in fields.items()}
+        info['participants'] = {int(user_id): json.loads(value) for user_id, value in participants.items()}
+        info['student_ids'] = [int(user_id) for user_id in students]
+        return info
+
+    def update_session(self, session_id, **fields):
+        key = self._key('session', session_id)
+        if self._redis.exists(key):
+            self._redis.hset(key, mapping={field: json.dumps(value) for field, value in fields.items()})
+
+    def delete_session(self, session_id):
+        pipe = self._redis.pipeline()
+        pipe.delete(
+            self._key('session', session_id),
+            self._key('session', session_id, 'participants'),
+            self._key('session', session_id, 'students'),
+            self._key('session', session_id, 'presence'),
+            self._key('session', session_id, 'seq'),
+            self._key('session', session_id, 'log'),
+            self._key('session', session_id, 'sites'),
+            *(self._key('session', session_id, 'state', section) for section in STATE_SECTIONS)
+        )
+        pipe.srem(self._key('sessions'), session_id)
+        pipe.execute()
+
+    def list_sessions(self):
+        sessions = {}
+        for session_id in self._redis.smembers(self._key('sessions')):
+            info = self.get_session(session_id)
+            if info:
+                sessions[session_id] = info
+        return sessions
+
+    def count_sessions(self):
+        return self._redis.scard(self._key('sessions'))
+
+    def add_participant(self, session_id, participant):
+        if not self._redis.exists(self._key('session', session_id)):
+            return False
+        user_id = participant['user_id']
+        self._redis.zadd(self._key('session', session_id, 'presence'), {user_id: time.time()})
+        added = self._redis.hsetnx(
+            self._key('session', session_id, 'participants'), user_id, json.dumps(participant, ensure_ascii=False)
+        )
+        if added and participant['user_type'] == 'student':
+            students_key = self._key('session', session_id, 'students')
+            self._redis.zadd(students_key, {user_id: self._redis.zcard(students_key)}, nx=True)
+        return bool(added)
+
+    def remove_participant(self, session_id, user_id):
+        participants_key = self._key('session', session_id, 'participants')
+        pipe = self._redis.pipeline()
+        pipe.hdel(participants_key, user_id)
+        pipe.zrem(self._key('session', session_id, 'presence'), user_id)
+        pipe.hlen(participants_key)
+        return pipe.execute()[2]
+
+    def touch_participants(self, entries, timestamp=None):
+        timestamp = timestamp or time.time()
+        pipe = self._redis.pipeline()
+        for session_id, user_id in entries:
+            # xx：只刷新仍在会话中的参与者
+            pipe.zadd(self._key('session', session_id, 'presence'), {user_id: timestamp}, xx=True)
+        pipe.execute()
+
+    def stale_participants(self, cutoff):
+        session_ids = list(self._redis.smembers(self._key('sessions')))
+        pipe = self._redis.pipeline()
+        for session_id in session_ids:
+            pipe.zrangebyscore(self._key('session', session_id, 'presence'), '-inf', f'({cutoff}')
+        return [
+            (session_id, int(user_id))
+            for session_id, user_ids in zip(session_ids, pipe.execute())
+            for user_id in user_ids
+        ]
+
+    def claim_course_session(self, course_key, session_id):
+        key = self._key('course', *course_key)
+        if self._redis.set(key, session_id, nx=True):
+            return session_id
+        return self._redis.get(key) or session_id
+
+    def get_course_session(self, course_key):
+        return self._redis.get(self._key('course', *course_key))
+
+    def release_course_session(self, course_key, session_id):
+        key = self._key('course', *course_key)
+        if self._redis.get(key) == session_id:
+            self._redis.delete(key)
+
+    def set_user_session(self, user_id, session_id):
+        self._redis.set(self._key('user', user_id), session_id)
+
+    def get_user_session(self, user_id):
+        return self._redis.get(self._key('user', user_id))
+
+    def release_user_session(self, user_id, session_id):
+        key = self._key('user', user_id)
+        if self._redis.get(key) == session_id:
+            self._redis.delete(key)
+
+    def add_connection(self, user_id):
+        return self._redis.hincrby(self._key('connections'), user_id, 1)
+
+    def remove_connection(self, user_id):
+        key = self._key('connections')
+        count = self._redis.hincrby(key, user_id, -1)
+        if count <= 0:
+            self._redis.hdel(key, user_id)
+        return max(count, 0)
+
+    def reset_connections(self, user_id):
+        self._redis.hdel(self._key('connections'), user_id)
+
+    def apply_event(self, session_id, event, data, changes=None):
+        return self._apply_event(
+            keys=[
+                self._key('session', session_id, 'seq'),
+                self._key('session', session_id, 'log'),
+                self._key('session', session_id)
+            ],
+            args=[
+                json.dumps({'event': event, 'data': data}, ensure_ascii=False),
+                self._delta_log_size,
+                json.dumps([
+                    [section, key, op, json.dumps(value, ensure_ascii=False)]
+                    for section, key, op, value in changes or ()
+                ], ensure_ascii=False),
+                self._key('session', session_id, 'state', '')
+            ]
+        )
+
+    def seed_state(self, session_id, section, items):
+        if items:
+            self._seed_state(
+                keys=[self._key('session', session_id), self._key('session', session_id, 'state', section)],
+                args=[part for key, value in items.items() for part in (key, json.dumps(value, ensure_ascii=False))]
+            )
+
+    def deltas_since(self, session_id, seq):
+        pipe = self._redis.pipeline()
+        pipe.get(self._key('session', session_id, 'seq'))
+        pipe.lrange(self._key('session', session_id, 'log'), 0, -1)
+        current, entries = pipe.execute()
+        current = int(current or 0)
+        if seq > current:
+            return None
+        if seq == current:
+            return []
+
+        deltas = []
+        for entry in entries:
+            entry_seq, payload = entry.split(':', 1)
+            if int(entry_seq) > seq:
+                deltas.append({'seq': int(entry_seq), **json.loads(payload)})
+        if not deltas or deltas[0]['seq'] > seq + 1:
+            return None
+        return deltas
+
+    def get_snapshot(self, session_id):
+        pipe = self._redis.pipeline()
+        pipe.get(self._key('session', session_id, 'seq'))
+        for section in STATE_SECTIONS:
+            pipe.hgetall(self._key('session', session_id, 'state', section))
+        seq, content, annotations, progress, text, dictionaries = pipe.execute()
+        current = content.get('current')
+        return {
+            'seq': int(seq or 0),
+            'content': json.loads(current) if current else None,
+            'annotations': [json.loads(value) for value in annotations.values()],
+            'progress': {key: json.loads(value) for key, value in progress.items()},
+            'text': [json.loads(value) for value in text.values()],
+            'dictionaries': {key: json.loads(value) for key, value in dictionaries.items()}
+        }
+
+    def allocate_site_id(self, session_id):
+        return self._redis.incr(self._key('session', session_id, 'sites'))
+
+    def stats(self):
+        pipe = self._redis.pipeline()
+        pipe.scard(self._key('sessions'))
+        pipe.hlen(self._key('connections'))
+        sessions, connected_users = pipe.execute()
+        return {'backend': 'redis', 'sessions': sessions, 'connected_users': connected_users}
+
+def create_session_store(url: Optional[str] = None, delta_log_size: int = DELTA_LOG_SIZE) -> SessionStore:
+    """根据配置创建会话存储：未配置或 memory:// 使用进程内存储，redis:// 使用 Redis"""
+    if not url or url.startswith('memory://'):
+        return MemorySessionStore(delta_log_size=delta_log_size)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisSessionStore(url, delta_log_size=delta_log_size)
+    raise ValueError(f'不支持的会话存储: {url}')
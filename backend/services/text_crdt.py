@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享文本 CRDT（RGA）
+课堂中多人同时编辑同一段文本、同时在文本上做标注时，各端直接在本地修改并广播
+更新，不需要服务器加锁或排序，所有副本按同样的规则合并后得到相同的文本：
+
+- 每个字符有全局唯一的ID (计数器, 站点)，计数器为 Lamport 时钟，站点为连接分配的编号
+- 插入记录“插在哪个字符之后”（origin），并发插入到同一位置时按ID从大到小排列
+- 删除只做标记（墓碑），因此标注锚点引用的字符ID始终可以解析为当前位置
+- 更新可以重复、乱序到达：重复的操作直接忽略，依赖的字符尚未到达的操作先挂起
+
+更新的二进制编码（整数均为无符号 varint）：
+    插入  0x01 站点 计数器 origin站点 origin计数器 字节数 UTF-8文本
+          连续输入的多个字符合并为一条，第 k 个字符的ID为 (计数器+k, 站点)
+    删除  0x02 站点 计数器 个数
+          删除同一站点连续计数器的若干字符
+origin 为 (0, 0) 表示文本开头
+"""
+from typing import Dict, List, Optional, Tuple
+
+# 字符ID：(计数器, 站点)，元组比较即为并发插入时的排列顺序
+CharId = Tuple[int, int]
+
+ROOT: CharId = (0, 0)
+
+OP_INSERT = 1
+OP_DELETE = 2
+
+class CRDTDecodeError(ValueError):
+    """更新数据格式错误"""
+
+class CRDTPendingLimitError(CRDTDecodeError):
+    """更新会使挂起的操作超过上限"""
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise CRDTDecodeError('更新数据不完整')
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise CRDTDecodeError('整数超出范围')
+
+def encode_insert(char_id: CharId, origin: CharId, text: str) -> bytes:
+    """编码一条插入：text 的第一个字符ID为 char_id，插在 origin 之后"""
+    out = bytearray([OP_INSERT])
+    body = text.encode('utf-8')
+    for value in (char_id[1], char_id[0], origin[1], origin[0], len(body)):
+        _write_varint(out, value)
+    out += body
+    return bytes(out)
+
+def encode_delete(char_id: CharId, count: int = 1) -> bytes:
+    """编码一条删除：同一站点从 char_id 开始连续 count 个字符"""
+    out = bytearray([OP_DELETE])
+    for value in (char_id[1], char_id[0], count):
+        _write_varint(out, value)
+    return bytes(out)
+
+def decode_update(data: bytes) -> List[tuple]:
+    """解码更新为操作列表：('insert', 起始ID, origin, 文本) 或 ('delete', 起始ID, 个数)"""
+    ops = []
+    pos = 0
+    while pos < len(data):
+        kind = data[pos]
+        pos += 1
+        if kind == OP_INSERT:
+            site, pos = _read_varint(data, pos)
+            counter, pos = _read_varint(data, pos)
+            origin_site, pos = _read_varint(data, pos)
+            origin_counter, pos = _read_varint(data, pos)
+            size, pos = _read_varint(data, pos)
+            if pos + size > len(data):
+                raise CRDTDecodeError('更新数据不完整')
+            try:
+                text = data[pos:pos + size].decode('utf-8')
+            except UnicodeDecodeError:
+                raise CRDTDecodeError('文本不是有效的 UTF-8')
+            pos += size
+            if not site or not counter or not text:
+                raise CRDTDecodeError('插入操作缺少字符ID或文本')
+            ops.append(('insert', (counter, site), (origin_counter, origin_site), text))
+        elif kind == OP_DELETE:
+            site, pos = _read_varint(data, pos)
+            counter, pos = _read_varint(data, pos)
+            count, pos = _read_varint(data, pos)
+            if not site or not counter:
+                raise CRDTDecodeError('删除操作缺少字符ID')
+            ops.append(('delete', (counter, site), count))
+        else:
+            raise CRDTDecodeError(f'未知的操作类型: {kind}')
+    return ops
+
+def format_char_id(char_id: CharId) -> str:
+    """字符ID的文本形式 "站点:计数器"，用于标注锚点"""
+    return f'{char_id[1]}:{char_id[0]}'
+
+def parse_char_id(value) -> Optional[CharId]:
+    try:
+        site, counter = str(value).split(':')
+        return int(counter), int(site)
+    except (TypeError, ValueError):
+        return None
+
+class _Char:
+    __slots__ = ('id', 'value', 'deleted')
+
+    def __init__(self, char_id: CharId, value: str):
+        self.id = char_id
+        self.value = value
+        self.deleted = False
+
+class TextDocument:
+    """RGA 文本副本"""
+
+    def __init__(self):
+        # 按文本顺序排列的全部字符（含已删除的墓碑）
+        self._chars: List[_Char] = []
+        self._by_id: Dict[CharId, _Char] = {}
+        # 依赖尚未到达而挂起的操作
+        self._pending: List[tuple] = []
+        # Lamport 时钟：见过的最大计数器
+        self.clock = 0
+
+    # ==================== 读取 ====================
+
+    @property
+    def text(self) -> str:
+        return ''.join(char.value for char in self._chars if not char.deleted)
+
+    def __len__(self):
+        return sum(1 for char in self._chars if not char.deleted)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def _index(self, char_id: CharId) -> int:
+        return self._chars.index(self._by_id[char_id])
+
+    def _visible_id(self, offset: int) -> CharId:
+        """当前文本中第 offset 个字符的ID"""
+        seen = 0
+        for char in self._chars:
+            if not char.deleted:
+                if seen == offset:
+                    return char.id
+                seen += 1
+        raise IndexError(f'位置超出文本长度: {offset}')
+
+    def anchor_at(self, offset: int) -> str:
+        """当前文本中第 offset 个字符的锚点（标注起止位置引用字符ID，不受其他人编辑影响）"""
+        return format_char_id(self._visible_id(offset))
+
+    def offset_of(self, anchor) -> Optional[int]:
+        """锚点字符当前的位置；字符已被删除时为其原位置（之后第一个未删除字符的位置）"""
+        char_id = parse_char_id(anchor)
+        if char_id is None or char_id not in self._by_id:
+            return None
+        offset = 0
+        for char in self._chars:
+            if char.id == char_id:
+                return offset
+            if not char.deleted:
+                offset += 1
+        return None
+
+    # ==================== 合并远程更新 ====================
+
+    def _integrate_insert(self, char_id: CharId, origin: CharId, text: str) -> Optional[tuple]:
+        """插入一段文本，返回因依赖未到达而剩余的操作"""
+        for k, value in enumerate(text):
+            current = (char_id[0] + k, char_id[1])
+            current_origin = origin if k == 0 else (current[0] - 1, current[1])
+            if current in self._by_id:
+                continue
+            if current_origin != ROOT and current_origin not in self._by_id:
+                return ('insert', current, current_origin, text[k:])
+
+            # 从 origin 之后开始，跳过ID更大的字符（并发插入到同一位置、ID更大的排在前面；
+            # 它们之后插入的字符ID只会更大，因此整棵子树一起被跳过）
+            i = 0 if current_origin == ROOT else self._index(current_origin) + 1
+            while i < len(self._chars) and self._chars[i].id > current:
+                i += 1
+            char = _Char(current, value)
+            self._chars.insert(i, char)
+            self._by_id[current] = char
+            self.clock = max(self.clock, current[0])
+        return None
+
+    def _integrate_delete(self, char_id: CharId, count: int) -> Optional[tuple]:
+        """删除连续的字符，返回尚未到达的字符对应的操作"""
+        for k in range(count):
+            current = (char_id[0] + k, char_id[1])
+            char = self._by_id.get(current)
+            if char is None:
+                return ('delete', current, count - k)
+            char.deleted = True
+            self.clock = max(self.clock, current[0])
+        return None
+
+    def _integrate(self, op: tuple) -> Optional[tuple]:
+        if op[0] == 'insert':
+            return self._integrate_insert(op[1], op[2], op[3])
+        return self._integrate_delete(op[1], op[2])
+
+    def _count_blocked(self, ops: List[tuple]) -> int:
+        """合并这些操作时因依赖未到达而会挂起的操作数（不修改副本）"""
+        arrived = set()
+
+        def known(char_id: CharId) -> bool:
+            return char_id == ROOT or char_id in self._by_id or char_id in arrived
+
+        blocked = 0
+        for op in ops:
+            if op[0] == 'insert':
+                _, char_id, origin, text = op
+                if not known(origin):
+                    blocked += 1
+                    continue
+                arrived.update((char_id[0] + k, char_id[1]) for k in range(len(text)))
+            else:
+                _, char_id, count = op
+                if not all(known((char_id[0] + k, char_id[1])) for k in range(count)):
+                    blocked += 1
+        return blocked
+
+    def apply(self, update: bytes, max_pending: Optional[int] = None) -> List[tuple]:
+        """合并一条更新（可重复、可乱序），返回解码后的操作；格式错误时抛出 CRDTDecodeError
+
+        给出 max_pending 时，合并后挂起的操作会超过该数的更新整条拒绝（不修改副本），
+        抛出 CRDTPendingLimitError。挂起的操作在每次合并后都要重试，不加限制时引用
+        不存在字符的更新会让之后的每次合并越来越慢
+        """
+        ops = decode_update(update)
+        if max_pending is not None:
+            blocked = self._count_blocked(ops)
+            if blocked and len(self._pending) + blocked > max_pending:
+                raise CRDTPendingLimitError(f'挂起的操作过多（上限 {max_pending}）')
+        for op in ops:
+            remaining = self._integrate(op)
+            if remaining:
+                self._pending.append(remaining)
+            elif self._pending:
+                self._retry_pending()
+        return ops
+
+    def _retry_pending(self):
+        """有新字符到达后重试挂起的操作，直到没有进展"""
+        progressed = True
+        while progressed and self._pending:
+            progressed = False
+            pending, self._pending = self._pending, []
+            for op in pending:
+                remaining = self._integrate(op)
+                if remaining != op:
+                    progressed = True
+                if remaining:
+                    self._pending.append(remaining)
+
+    # ==================== 本地编辑（生成更新） ====================
+
+    def insert(self, offset: int, text: str, site: int) -> bytes:
+        """在当前文本的 offset 处插入 text，返回需要广播的更新"""
+        origin = ROOT if offset == 0 else self._visible_id(offset - 1)
+        char_id = (self.clock + 1, site)
+        update = encode_insert(char_id, origin, text)
+        self.apply(update)
+        return update
+
+    def delete(self, offset: int, length: int = 1) -> bytes:
+        """删除当前文本 offset 处的 length 个字符，返回需要广播的更新"""
+        ids = [self._visible_id(offset + k) for k in range(length)]
+        out = bytearray()
+        start = 0
+        for k in range(1, len(ids) + 1):
+            # 同一站点连续计数器的字符合并为一条删除
+            if k == len(ids) or ids[k] != (ids[k - 1][0] + 1, ids[k - 1][1]):
+                out += encode_delete(ids[start], k - start)
+                start = k
+        update = bytes(out)
+        self.apply(update)
+        return update
+
+    # ==================== 完整状态 ====================
+
+    def encode_state(self) -> bytes:
+        """把整个副本（含墓碑）编码为一条更新，合并到空副本即可还原"""
+        # 按文本顺序把字符切成若干段：同一站点、计数器连续且紧挨着的字符为一段，
+        # 每段插在前一个字符之后，依次合并到空副本时总是追加在末尾，顺序不变
+        runs: List[Tuple[CharId, CharId, List[str]]] = []
+        previous = ROOT
+        for char in self._chars:
+            if runs and char.id == (previous[0] + 1, previous[1]):
+                runs[-1][2].append(char.value)
+            else:
+                runs.append((char.id, previous, [char.value]))
+            previous = char.id
+
+        out = bytearray()
+        for start, origin, values in runs:
+            out += encode_insert(start, origin, ''.join(values))
+        for char in self._chars:
+            if char.deleted:
+                out += encode_delete(char.id)
+        return bytes(out)
+
+    @classmethod
+    def from_updates(cls, updates: List[bytes]) -> 'TextDocument':
+        """由若干更新（如快照中的完整状态和后续更新）构建副本"""
+        document = cls()
+        for update in updates:
+            document.apply(update)
+        return document
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import ConfirmDialog from '../../common/ConfirmDialog';
+import { fetchAllPages } from '../../../config/api';
 import './CourseManagement.css';
 
 const CourseManagement = ({ user, onUpdate }) => {
@@ -43,13 +44,7 @@ const CourseManagement = ({ user, onUpdate }) => {
         if (value) queryParams.append(key, value);
       });
 
-      const response = await fetch(`/api/admin/course-bookings?${queryParams}`);
-      if (response.ok) {
-        const data = await response.json();
-        if (data.success) {
-          setBookings(data.bookings || []);
-        }
-      }
+      setBookings(await fetchAllPages(`/api/admin/course-bookings?${queryParams}`, 'bookings'));
     } catch (error) {
       console.error('获取课程预约失败:', error);
     } finally {
@@ -60,22 +55,12 @@ const CourseManagement = ({ user, onUpdate }) => {
   const fetchUsers = async () => {
     try {
       // 获取学生
-      const studentsResponse = await fetch('/api/admin/users?user_type=student');
-      if (studentsResponse.ok) {
-        const studentsData = await studentsResponse.json();
-        if (studentsData.success) {
-          setUsers(prev => ({ ...prev, students: studentsData.users || [] }));
-        }
-      }
+      const students = await fetchAllPages('/api/admin/users?user_type=student', 'users');
+      setUsers(prev => ({ ...prev, students }));
 
       // 获取教师
-      const teachersResponse = await fetch('/api/admin/users?user_type=teacher');
-      if (teachersResponse.ok) {
-        const teachersData = await teachersResponse.json();
-        if (teachersData.success) {
-          setUsers(prev => ({ ...prev, teachers: teachersData.users || [] }));
-        }
-      }
+      const teachers = await fetchAllPages('/api/admin/users?user_type=teacher', 'users');
+      setUsers(prev => ({ ...prev, teachers }));
     } catch (error) {
       console.error('获取用户列表失败:', error);
     }
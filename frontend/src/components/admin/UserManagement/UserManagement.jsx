@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import ConfirmDialog from '../../common/ConfirmDialog';
+import { fetchAllPages } from '../../../config/api';
 import './UserManagement.css';
 
 const UserManagement = ({ user, onUpdate }) => {
@@ -35,13 +36,7 @@ const UserManagement = ({ user, onUpdate }) => {
         if (value) queryParams.append(key, value);
       });
 
-      const response = await fetch(`/api/admin/users?${queryParams}`);
-      if (response.ok) {
-        const data = await response.json();
-        if (data.success) {
-          setUsers(data.users || []);
-        }
-      }
+      setUsers(await fetchAllPages(`/api/admin/users?${queryParams}`, 'users'));
     } catch (error) {
       console.error('获取用户列表失败:', error);
     } finally {
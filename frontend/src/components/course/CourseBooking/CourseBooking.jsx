@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import ConfirmDialog from '../../common/ConfirmDialog';
+import { fetchAllPages } from '../../../config/api';
 import './CourseBooking.css';
 
 const CourseBooking = ({ user, onBookingUpdate }) => {
@@ -56,13 +57,7 @@ const CourseBooking = ({ user, onBookingUpdate }) => {
         url += `?${params.toString()}`;
       }
 
-      const response = await fetch(url);
-      if (response.ok) {
-        const data = await response.json();
-        if (data.success) {
-          setBookings(data.bookings || []);
-        }
-      }
+      setBookings(await fetchAllPages(url, 'bookings'));
     } catch (error) {
       console.error('获取预约失败:', error);
       showNotification('获取预约失败', 'error');
@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from 'react';
+import { fetchAllPages } from '../../../config/api';
 import './CourseBookingHome.css';
 
 const CourseBookingHome = ({ user, onSwitchUser, onLogout }) => {
@@ -18,21 +19,16 @@ const CourseBookingHome = ({ user, onSwitchUser, onLogout }) => {
   const fetchUpcomingBookings = async () => {
     try {
       setLoading(true);
-      const response = await fetch(`/api/student/${user.id}/bookings?status=scheduled`);
-      if (response.ok) {
-        const data = await response.json();
-        if (data.success) {
-          // 只显示未来7天的预约
-          const now = new Date();
-          const upcoming = data.bookings.filter(booking => {
-            const bookingDate = new Date(booking.scheduled_time);
-            const diffTime = bookingDate.getTime() - now.getTime();
-            const diffDays = diffTime / (1000 * 60 * 60 * 24);
-            return diffDays >= 0 && diffDays <= 7;
-          });
-          setUpcomingBookings(upcoming.slice(0, 3)); // 只显示3个
-        }
-      }
+      const bookings = await fetchAllPages(`/api/student/${user.id}/bookings?status=scheduled`, 'bookings');
+      // 只显示未来7天的预约
+      const now = new Date();
+      const upcoming = bookings.filter(booking => {
+        const bookingDate = new Date(booking.scheduled_time);
+        const diffTime = bookingDate.getTime() - now.getTime();
+        const diffDays = diffTime / (1000 * 60 * 60 * 24);
+        return diffDays >= 0 && diffDays <= 7;
+      });
+      setUpcomingBookings(upcoming.slice(0, 3)); // 只显示3个
     } catch (error) {
       console.error('获取即将到来的预约失败:', error);
     } finally {
@@ -42,13 +38,8 @@ const CourseBookingHome = ({ user, onSwitchUser, onLogout }) => {
 
   const fetchRecentBookings = async () => {
     try {
-      const response = await fetch(`/api/student/${user.id}/bookings?status=completed`);
-      if (response.ok) {
-        const data = await response.json();
-        if (data.success) {
-          setRecentBookings(data.bookings.slice(0, 5)); // 只显示5个
-        }
-      }
+      const bookings = await fetchAllPages(`/api/student/${user.id}/bookings?status=completed`, 'bookings');
+      setRecentBookings(bookings.slice(0, 5)); // 只显示5个
     } catch (error) {
       console.error('获取最近预约失败:', error);
     }
@@ -1,4 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
+import { fetchAllPages } from '../../config/api';
 import './TeacherTeachingConsole.css';
 
 const TeacherTeachingConsole = ({ teacherId }) => {
@@ -32,11 +33,7 @@ const TeacherTeachingConsole = ({ teacherId }) => {
     setLoading(true);
     try {
       const today = new Date().toISOString().split('T')[0];
-      const response = await fetch(`/api/teacher/${teacherId}/courses?date=${today}`);
-      if (response.ok) {
-        const data = await response.json();
-        setTodayCourses(data.courses || []);
-      }
+      setTodayCourses(await fetchAllPages(`/api/teacher/${teacherId}/courses?date=${today}`, 'courses'));
     } catch (error) {
       console.error('获取今日课程失败:', error);
     } finally {
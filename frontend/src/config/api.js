@@ -117,6 +117,28 @@ export const apiDelete = (url) => apiRequest(url, {
   method: 'DELETE',
 });
 
+// 分页列表：按 pagination.next_cursor 依次请求，返回所有页中 listKey 字段合并后的列表
+export const fetchAllPages = async (url, listKey, pageSize = 200) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const params = new URLSearchParams({ limit: pageSize });
+    if (cursor) params.append('cursor', cursor);
+    const separator = url.endsWith('?') ? '' : (url.includes('?') ? '&' : '?');
+    const response = await fetch(`${url}${separator}${params}`);
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const data = await response.json();
+    if (!data.success) {
+      throw new Error(data.error || '请求失败');
+    }
+    items.push(...(data[listKey] || []));
+    cursor = data.pagination?.next_cursor;
+  } while (cursor);
+  return items;
+};
+
 // 健康检查
 export const checkApiHealth = async () => {
   try {